@@ -0,0 +1,525 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.settlement import CHAIN_RPC_URL, GAMEPOOL_ADDRESS, WEB3_AVAILABLE, Web3
+from app.storage import STATE, StateBackend
+
+
+CHAIN_INDEX_ENABLED = os.getenv("CHAIN_INDEX_ENABLED", "0") != "0"
+CHAIN_INDEX_BACKEND = os.getenv("CHAIN_INDEX_BACKEND", "memory")
+CHAIN_INDEX_SQLITE_PATH = os.getenv("CHAIN_INDEX_SQLITE_PATH", "chain_index.db")
+CHAIN_INDEX_START_BLOCK = int(os.getenv("CHAIN_INDEX_START_BLOCK", "0"))
+CHAIN_INDEX_POLL_SECONDS = float(os.getenv("CHAIN_INDEX_POLL_SECONDS", "2"))
+CHAIN_INDEX_BLOCK_RANGE = int(os.getenv("CHAIN_INDEX_BLOCK_RANGE", "2000"))
+# Blocks to trail the head by so a shallow reorg cannot undo indexed events;
+# zero suits a local Hardhat node.
+CHAIN_INDEX_CONFIRMATIONS = int(os.getenv("CHAIN_INDEX_CONFIRMATIONS", "0"))
+
+DEPOSIT_REQUIRED = os.getenv("DEPOSIT_REQUIRED", "0") != "0"
+# Entry fee: each game a wallet enters draws this much from its deposits.
+DEPOSIT_MIN_WEI = int(os.getenv("DEPOSIT_MIN_WEI", str(10**16)))
+# How long a join waits for the indexer to catch up with a fresh deposit.
+DEPOSIT_JOIN_WAIT_SECONDS = float(os.getenv("DEPOSIT_JOIN_WAIT_SECONDS", "3"))
+
+DEPOSITED = "Deposited"
+PAYOUT = "Payout"
+EVENT_SIGNATURES = {
+    DEPOSITED: "Deposited(address,uint256)",
+    PAYOUT: "Payout(address,uint256)",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class ChainEvent:
+    kind: str
+    address: str
+    amount_wei: int
+    block: int
+
+
+class Web3LogSource:
+    def __init__(
+        self, rpc_url: str = CHAIN_RPC_URL, contract_address: str = GAMEPOOL_ADDRESS
+    ) -> None:
+        self._w3 = Web3(Web3.HTTPProvider(rpc_url, request_kwargs={"timeout": 30}))
+        self._contract_address = Web3.to_checksum_address(contract_address)
+        self._kinds = {
+            Web3.keccak(text=signature).hex().removeprefix("0x"): kind
+            for kind, signature in EVENT_SIGNATURES.items()
+        }
+
+    async def head(self) -> int:
+        return await asyncio.to_thread(lambda: self._w3.eth.block_number)
+
+    async def events(self, from_block: int, to_block: int) -> List[ChainEvent]:
+        logs = await asyncio.to_thread(
+            self._w3.eth.get_logs,
+            {
+                "address": self._contract_address,
+                "fromBlock": from_block,
+                "toBlock": to_block,
+                "topics": [["0x" + topic for topic in self._kinds]],
+            },
+        )
+        events: List[ChainEvent] = []
+        for log in logs:
+            topics = [bytes(topic).hex() for topic in log["topics"]]
+            kind = self._kinds.get(topics[0].removeprefix("0x"))
+            if kind is None or len(topics) < 2:
+                continue
+            # Both events are (address indexed, uint256): the address is the
+            # low 20 bytes of topic 1 and the amount is the whole data word.
+            events.append(
+                ChainEvent(
+                    kind=kind,
+                    address="0x" + topics[1].removeprefix("0x")[-40:],
+                    amount_wei=int.from_bytes(bytes(log["data"]), "big"),
+                    block=int(log["blockNumber"]),
+                )
+            )
+        return events
+
+
+Claims = Dict[str, Dict[str, int]]
+
+CLAIMS_NAMESPACE = "chain_claims"
+CLAIMS_INDEX_KEY = "_index"
+
+
+class IndexStore:
+    # Balances and the cursor are rebuilt by replaying the chain, but entry
+    # claims exist only off-chain, so even this store keeps them in the
+    # configured StateBackend; otherwise a restart would let a paid entry be
+    # claimed again.
+    name = "memory"
+
+    def __init__(self, state: Optional[StateBackend] = None) -> None:
+        self.state = state if state is not None else STATE
+        self._claims: Claims = {}
+
+    async def load(self) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+        return CHAIN_INDEX_START_BLOCK - 1, {}
+
+    async def load_claims(self) -> Claims:
+        index = await self.state.get(CLAIMS_NAMESPACE, CLAIMS_INDEX_KEY) or {}
+        claims: Claims = {}
+        for address in index.get("addresses", []):
+            record = await self.state.get(CLAIMS_NAMESPACE, address) or {}
+            claims[address] = {key: int(fee) for key, fee in record.items()}
+        self._claims = {address: dict(entries) for address, entries in claims.items()}
+        return claims
+
+    async def reload_claims(self, address: str) -> Dict[str, int]:
+        # Claims other shards made for this wallet since we last looked.
+        record = await self.state.reload(CLAIMS_NAMESPACE, address)
+        if record:
+            entries = self._claims.setdefault(address, {})
+            for key, fee in record.items():
+                entries.setdefault(key, int(fee))
+        return dict(self._claims.get(address, {}))
+
+    async def save(
+        self, last_block: int, changed: Dict[str, Tuple[int, int]]
+    ) -> None:
+        return None
+
+    async def save_claim(self, address: str, entry_key: str, fee_wei: int) -> None:
+        # Records are written from the local mirror rather than read-modify-
+        # write, so concurrent claims for one wallet cannot drop each other.
+        new_address = address not in self._claims
+        entries = self._claims.setdefault(address, {})
+        entries[entry_key] = fee_wei
+        await self.state.put(
+            CLAIMS_NAMESPACE, address, {key: str(fee) for key, fee in entries.items()}
+        )
+        if new_address:
+            # Other shards add wallets too, so extend the stored index.
+            index = await self.state.reload(CLAIMS_NAMESPACE, CLAIMS_INDEX_KEY) or {}
+            addresses = set(index.get("addresses", [])) | {address}
+            await self.state.put(
+                CLAIMS_NAMESPACE, CLAIMS_INDEX_KEY, {"addresses": sorted(addresses)}
+            )
+        # Written through rather than behind so other shards see the spend.
+        await self.state.flush()
+
+    async def close(self) -> None:
+        return None
+
+
+class SqliteIndexStore(IndexStore):
+    name = "sqlite"
+
+    def __init__(self, path: str = CHAIN_INDEX_SQLITE_PATH) -> None:
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Wei amounts overflow SQLite integers, so they are stored as text.
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chain_balances ("
+            "address TEXT PRIMARY KEY, deposited TEXT NOT NULL, paid TEXT NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chain_cursor ("
+            "id INTEGER PRIMARY KEY CHECK (id = 0), last_block INTEGER NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chain_claims ("
+            "address TEXT NOT NULL, entry_key TEXT NOT NULL, fee TEXT NOT NULL, "
+            "PRIMARY KEY (address, entry_key))"
+        )
+        conn.commit()
+        return conn
+
+    def _read_all(self) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+        with self._lock:
+            conn = self._conn
+            assert conn is not None
+            row = conn.execute("SELECT last_block FROM chain_cursor").fetchone()
+            rows = conn.execute(
+                "SELECT address, deposited, paid FROM chain_balances"
+            ).fetchall()
+        last_block = row[0] if row else CHAIN_INDEX_START_BLOCK - 1
+        return last_block, {
+            address: (int(deposited), int(paid)) for address, deposited, paid in rows
+        }
+
+    async def load(self) -> Tuple[int, Dict[str, Tuple[int, int]]]:
+        if self._conn is None:
+            self._conn = await asyncio.to_thread(self._connect)
+        return await asyncio.to_thread(self._read_all)
+
+    def _read_claims(self) -> Claims:
+        with self._lock:
+            conn = self._conn
+            assert conn is not None
+            rows = conn.execute(
+                "SELECT address, entry_key, fee FROM chain_claims"
+            ).fetchall()
+        claims: Claims = {}
+        for address, entry_key, fee in rows:
+            claims.setdefault(address, {})[entry_key] = int(fee)
+        return claims
+
+    async def load_claims(self) -> Claims:
+        if self._conn is None:
+            self._conn = await asyncio.to_thread(self._connect)
+        return await asyncio.to_thread(self._read_claims)
+
+    def _read_address_claims(self, address: str) -> Dict[str, int]:
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                return {}
+            rows = conn.execute(
+                "SELECT entry_key, fee FROM chain_claims WHERE address = ?", (address,)
+            ).fetchall()
+        return {entry_key: int(fee) for entry_key, fee in rows}
+
+    async def reload_claims(self, address: str) -> Dict[str, int]:
+        return await asyncio.to_thread(self._read_address_claims, address)
+
+    def _write(self, last_block: int, changed: Dict[str, Tuple[int, int]]) -> None:
+        with self._lock:
+            conn = self._conn
+            assert conn is not None
+            # Balances and cursor commit together, so a restart never
+            # replays or skips a block.
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO chain_balances (address, deposited, paid) "
+                    "VALUES (?, ?, ?)",
+                    [
+                        (address, str(deposited), str(paid))
+                        for address, (deposited, paid) in changed.items()
+                    ],
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO chain_cursor (id, last_block) VALUES (0, ?)",
+                    (last_block,),
+                )
+
+    async def save(
+        self, last_block: int, changed: Dict[str, Tuple[int, int]]
+    ) -> None:
+        if self._conn is not None:
+            await asyncio.to_thread(self._write, last_block, changed)
+
+    def _write_claim(self, address: str, entry_key: str, fee_wei: int) -> None:
+        with self._lock:
+            conn = self._conn
+            assert conn is not None
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO chain_claims (address, entry_key, fee) "
+                    "VALUES (?, ?, ?)",
+                    (address, entry_key, str(fee_wei)),
+                )
+
+    async def save_claim(self, address: str, entry_key: str, fee_wei: int) -> None:
+        if self._conn is not None:
+            await asyncio.to_thread(self._write_claim, address, entry_key, fee_wei)
+
+    async def close(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            await asyncio.to_thread(conn.close)
+
+
+def create_index_store(kind: str = CHAIN_INDEX_BACKEND) -> IndexStore:
+    if kind == "sqlite":
+        return SqliteIndexStore()
+    return IndexStore()
+
+
+class ChainIndexer:
+    # Tails GamePool events into memory. Every read (join gating, /pool,
+    # room snapshots) is a dict lookup; only the poller talks to the node.
+    # Deposits are credit: each game a wallet enters claims one entry fee
+    # from it, once per game however often the player rejoins.
+    def __init__(
+        self,
+        source: Optional[Web3LogSource] = None,
+        store: Optional[IndexStore] = None,
+        poll_seconds: float = CHAIN_INDEX_POLL_SECONDS,
+    ) -> None:
+        self.source = source
+        self.store = store or IndexStore()
+        self.poll_seconds = max(0.1, poll_seconds)
+        self.last_block = CHAIN_INDEX_START_BLOCK - 1
+        self.head = 0
+        self._balances: Dict[str, Tuple[int, int]] = {}
+        self._claims: Claims = {}
+        self._claimed: Dict[str, int] = {}
+        self.total_deposited = 0
+        self.total_paid = 0
+        self.version = 0
+        self._summary: Optional[dict] = None
+        self._summary_version = -1
+        self._wakeup: Optional[asyncio.Event] = None
+        self._polled: Optional[asyncio.Future] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.poll_failures = 0
+        self.events_indexed = 0
+        self.entries_claimed = 0
+        self.entries_refused = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.source is not None
+
+    async def start(self) -> None:
+        if self._worker is not None or not self.enabled:
+            return
+        self.last_block, self._balances = await self.store.load()
+        self._claims = await self.store.load_claims()
+        self._claimed = {
+            address: sum(claims.values()) for address, claims in self._claims.items()
+        }
+        self.total_deposited = sum(dep for dep, _ in self._balances.values())
+        self.total_paid = sum(paid for _, paid in self._balances.values())
+        self.version += 1
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.create_task(self._run_worker())
+
+    async def stop(self) -> None:
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        await self.store.close()
+        self._wakeup = None
+
+    def deposited(self, address: str) -> int:
+        return self._balances.get(address.lower(), (0, 0))[0]
+
+    def available(self, address: str) -> int:
+        # Deposited credit not yet spent on game entries.
+        address = address.lower()
+        return self.deposited(address) - self._claimed.get(address, 0)
+
+    def has_deposit(self, address: Optional[str], min_wei: int = DEPOSIT_MIN_WEI) -> bool:
+        return address is not None and self.available(address) >= max(1, min_wei)
+
+    def has_entry(self, address: str, entry_key: str) -> bool:
+        return entry_key in self._claims.get(address.lower(), {})
+
+    def entry_fee(self, address: str, entry_key: str) -> int:
+        return self._claims.get(address.lower(), {}).get(entry_key, 0)
+
+    async def claim_entry(
+        self, address: str, entry_key: str, fee_wei: int = DEPOSIT_MIN_WEI
+    ) -> bool:
+        # Idempotent per (address, game): rejoining the same game is free.
+        address = address.lower()
+        claims = self._claims.get(address)
+        if claims is not None and entry_key in claims:
+            return True
+        # Other shards spend the same deposits; fold in what they claimed.
+        # Only two claims for one wallet racing on two shards in the same
+        # instant can still both pass.
+        for key, fee in (await self.store.reload_claims(address)).items():
+            claims = self._claims.setdefault(address, {})
+            if key not in claims:
+                claims[key] = fee
+                self._claimed[address] = self._claimed.get(address, 0) + fee
+        claims = self._claims.get(address)
+        if claims is not None and entry_key in claims:
+            return True
+        fee_wei = max(1, fee_wei)
+        if self.available(address) < fee_wei:
+            self.entries_refused += 1
+            return False
+        # Recorded before the await so a concurrent claim sees the spend.
+        self._claims.setdefault(address, {})[entry_key] = fee_wei
+        self._claimed[address] = self._claimed.get(address, 0) + fee_wei
+        self.entries_claimed += 1
+        self.version += 1
+        await self.store.save_claim(address, entry_key, fee_wei)
+        return True
+
+    async def wait_for_deposit(
+        self,
+        address: Optional[str],
+        min_wei: int = DEPOSIT_MIN_WEI,
+        timeout: float = DEPOSIT_JOIN_WAIT_SECONDS,
+    ) -> bool:
+        # A miss may just be a deposit newer than the last poll. Waiters
+        # share the next poll instead of each querying the node.
+        if address is None:
+            return False
+        if self.has_deposit(address, min_wei):
+            return True
+        if self._wakeup is None:
+            return False
+        if self._polled is None or self._polled.done():
+            self._polled = asyncio.get_running_loop().create_future()
+        polled = self._polled
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(polled), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.has_deposit(address, min_wei)
+
+    def player(self, address: str) -> dict:
+        deposited, paid = self._balances.get(address.lower(), (0, 0))
+        available = self.available(address)
+        return {
+            "address": address.lower(),
+            "depositedWei": str(deposited),
+            "paidWei": str(paid),
+            "availableWei": str(available),
+            "entryFeeWei": str(DEPOSIT_MIN_WEI),
+            "eligible": available >= max(1, DEPOSIT_MIN_WEI),
+            "lastBlock": self.last_block,
+        }
+
+    def summary(self) -> dict:
+        # Rebuilt only when the index changes; room snapshots embed it.
+        if self._summary is None or self._summary_version != self.version:
+            self._summary = {
+                "enabled": self.enabled,
+                "totalDepositedWei": str(self.total_deposited),
+                "totalPaidWei": str(self.total_paid),
+                "potWei": str(self.total_deposited - self.total_paid),
+                "depositors": sum(1 for dep, _ in self._balances.values() if dep),
+                "entryFeeWei": str(DEPOSIT_MIN_WEI),
+                "entriesClaimed": sum(len(claims) for claims in self._claims.values()),
+                "lastBlock": self.last_block,
+            }
+            self._summary_version = self.version
+        return self._summary
+
+    def _apply(self, events: List[ChainEvent]) -> Dict[str, Tuple[int, int]]:
+        changed: Dict[str, Tuple[int, int]] = {}
+        for event in events:
+            address = event.address.lower()
+            deposited, paid = self._balances.get(address, (0, 0))
+            if event.kind == DEPOSITED:
+                deposited += event.amount_wei
+                self.total_deposited += event.amount_wei
+            else:
+                paid += event.amount_wei
+                self.total_paid += event.amount_wei
+            self._balances[address] = changed[address] = (deposited, paid)
+        return changed
+
+    async def poll(self) -> int:
+        source = self.source
+        assert source is not None
+        self.head = await source.head()
+        target = self.head - CHAIN_INDEX_CONFIRMATIONS
+        indexed = 0
+        while self.last_block < target:
+            start = self.last_block + 1
+            end = min(target, start + max(1, CHAIN_INDEX_BLOCK_RANGE) - 1)
+            events = await source.events(start, end)
+            changed = self._apply(events)
+            await self.store.save(end, changed)
+            self.last_block = end
+            indexed += len(events)
+            self.version += 1
+        self.events_indexed += indexed
+        return indexed
+
+    async def _run_worker(self) -> None:
+        wakeup = self._wakeup
+        assert wakeup is not None
+        while True:
+            # Waiters that arrive mid-poll get the next one, which is sure to
+            # see blocks mined before they asked.
+            polled, self._polled = self._polled, None
+            try:
+                await self.poll()
+                self.polls += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # The node being down only makes the index stale.
+                self.poll_failures += 1
+            if polled is not None and not polled.done():
+                polled.set_result(None)
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self._worker is not None,
+            "backend": self.store.name,
+            "head": self.head,
+            "lastBlock": self.last_block,
+            "lagBlocks": max(0, self.head - self.last_block) if self.enabled else 0,
+            "addresses": len(self._balances),
+            "entriesClaimed": self.entries_claimed,
+            "entriesRefused": self.entries_refused,
+            "polls": self.polls,
+            "pollFailures": self.poll_failures,
+            "eventsIndexed": self.events_indexed,
+        }
+
+
+def create_log_source() -> Optional[Web3LogSource]:
+    if not CHAIN_INDEX_ENABLED or not WEB3_AVAILABLE:
+        return None
+    return Web3LogSource()
+
+
+CHAIN_INDEX = ChainIndexer(create_log_source(), create_index_store())
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import random
+from typing import Dict, Iterator, Optional
+
+
+ScoreKey = tuple[int, int, str]
+
+_MAX_LEVEL = 16
+
+
+class _Node:
+    __slots__ = ("key", "forward")
+
+    def __init__(self, key: Optional[ScoreKey], level: int) -> None:
+        self.key = key
+        self.forward: list[Optional[_Node]] = [None] * level
+
+
+class _SkipList:
+    # Expected O(log n) insert and remove, O(k) walk from the front.
+    def __init__(self) -> None:
+        self._head = _Node(None, _MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._random = random.Random()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < _MAX_LEVEL and self._random.random() < 0.5:
+            level += 1
+        return level
+
+    def _predecessors(self, key: ScoreKey) -> list[_Node]:
+        update = [self._head] * _MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            nxt = node.forward[i]
+            while nxt is not None and nxt.key < key:  # type: ignore[operator]
+                node = nxt
+                nxt = node.forward[i]
+            update[i] = node
+        return update
+
+    def insert(self, key: ScoreKey) -> None:
+        update = self._predecessors(key)
+        level = self._random_level()
+        if level > self._level:
+            self._level = level
+        node = _Node(key, level)
+        for i in range(level):
+            node.forward[i] = update[i].forward[i]
+            update[i].forward[i] = node
+        self._size += 1
+
+    def remove(self, key: ScoreKey) -> bool:
+        update = self._predecessors(key)
+        node = update[0].forward[0]
+        if node is None or node.key != key:
+            return False
+        for i in range(len(node.forward)):
+            if update[i].forward[i] is not node:
+                break
+            update[i].forward[i] = node.forward[i]
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def __iter__(self) -> Iterator[ScoreKey]:
+        node = self._head.forward[0]
+        while node is not None:
+            yield node.key  # type: ignore[misc]
+            node = node.forward[0]
+
+    def first(self) -> Optional[ScoreKey]:
+        node = self._head.forward[0]
+        return node.key if node is not None else None
+
+    def clear(self) -> None:
+        self._head = _Node(None, _MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+
+class ScoreIndex:
+    # Sorted by (-score, join order) so ties resolve to the earliest joiner,
+    # matching the old max() over insertion-ordered dicts.
+    def __init__(self) -> None:
+        self._keys = _SkipList()
+        self._by_player: Dict[str, ScoreKey] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, player_id: str) -> bool:
+        return player_id in self._by_player
+
+    def update(self, player_id: str, score: int, order: int) -> None:
+        self.remove(player_id)
+        key = (-score, order, player_id)
+        self._keys.insert(key)
+        self._by_player[player_id] = key
+
+    def remove(self, player_id: str) -> None:
+        key = self._by_player.pop(player_id, None)
+        if key is not None:
+            self._keys.remove(key)
+
+    def top(self) -> Optional[str]:
+        key = self._keys.first()
+        return key[2] if key is not None else None
+
+    def top_k(self, k: int) -> list[tuple[str, int]]:
+        ranked: list[tuple[str, int]] = []
+        if k <= 0:
+            return ranked
+        for neg_score, _, player_id in self._keys:
+            ranked.append((player_id, -neg_score))
+            if len(ranked) >= k:
+                break
+        return ranked
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._by_player.clear()
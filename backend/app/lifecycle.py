@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import os
+import resource
+import time
+from typing import Any, Dict, Iterable, MutableMapping
+
+from app.scheduler import GAME_CLOCK, TimerHandle
+from app.storage import STATE
+
+
+ROOM_IDLE_TTL_SECONDS = float(os.getenv("ROOM_IDLE_TTL_SECONDS", "600"))
+ROOM_FINISHED_TTL_SECONDS = float(os.getenv("ROOM_FINISHED_TTL_SECONDS", "120"))
+ROOM_MAX_COUNT = int(os.getenv("ROOM_MAX_COUNT", "1000"))
+ROOM_REAP_INTERVAL_SECONDS = float(os.getenv("ROOM_REAP_INTERVAL_SECONDS", "15"))
+
+ROOM_IDLE = "idle"
+ROOM_ACTIVE = "active"
+ROOM_FINISHED = "finished"
+
+
+def room_status(room: Any) -> str:
+    if room.game_over:
+        return ROOM_FINISHED
+    if room.started_at is not None:
+        return ROOM_ACTIVE
+    return ROOM_IDLE
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as handle:
+            pages = int(handle.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is the peak, in KiB on Linux.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class RoomLifecycleManager:
+    def __init__(
+        self,
+        rooms: MutableMapping[str, Any],
+        pinned: Iterable[str] = ("arena",),
+        idle_ttl: float = ROOM_IDLE_TTL_SECONDS,
+        finished_ttl: float = ROOM_FINISHED_TTL_SECONDS,
+        max_rooms: int = ROOM_MAX_COUNT,
+        interval: float = ROOM_REAP_INTERVAL_SECONDS,
+    ) -> None:
+        self.rooms = rooms
+        self.pinned = set(pinned)
+        self.idle_ttl = idle_ttl
+        self.finished_ttl = finished_ttl
+        self.max_rooms = max(1, max_rooms)
+        self.interval = interval
+        self.evicted_expired = 0
+        self.evicted_lru = 0
+        self.finished_on_evict = 0
+        self._tick: TimerHandle | None = None
+
+    def start(self) -> None:
+        if self._tick is None:
+            self._tick = GAME_CLOCK.call_every(self.interval, self.reap)
+
+    def stop(self) -> None:
+        GAME_CLOCK.cancel(self._tick)
+        self._tick = None
+
+    def _evictable(self, room_id: str, room: Any) -> bool:
+        return room_id not in self.pinned and not room.connections
+
+    def _expired(self, room: Any, now: float) -> bool:
+        status = room_status(room)
+        idle_for = now - room.last_activity
+        if status == ROOM_FINISHED:
+            return idle_for >= self.finished_ttl
+        if status == ROOM_IDLE:
+            return idle_for >= self.idle_ttl
+        # Active rooms with nobody connected are abandoned games.
+        return idle_for >= self.idle_ttl + room.duration_seconds
+
+    async def evict(self, room_id: str) -> None:
+        room = self.rooms.pop(room_id, None)
+        if room is None:
+            return
+        if room_status(room) == ROOM_ACTIVE:
+            # An abandoned game still ends properly: its result is recorded
+            # and its paid entrants are settled rather than silently dropped.
+            await room.finish_game("evicted")
+            self.finished_on_evict += 1
+        room.close()
+        await STATE.put("room", room_id, room.to_record())
+
+    async def reap(self) -> list[str]:
+        now = time.monotonic()
+        expired = [
+            room_id
+            for room_id, room in list(self.rooms.items())
+            if self._evictable(room_id, room) and self._expired(room, now)
+        ]
+        for room_id in expired:
+            await self.evict(room_id)
+        self.evicted_expired += len(expired)
+        return expired + await self.enforce_capacity()
+
+    async def enforce_capacity(self, reserve: int = 0) -> list[str]:
+        overflow = len(self.rooms) + reserve - self.max_rooms
+        if overflow <= 0:
+            return []
+        candidates = sorted(
+            (
+                (room.last_activity, room_id)
+                for room_id, room in self.rooms.items()
+                if self._evictable(room_id, room)
+            )
+        )
+        evicted = [room_id for _, room_id in candidates[:overflow]]
+        for room_id in evicted:
+            await self.evict(room_id)
+        self.evicted_lru += len(evicted)
+        return evicted
+
+    def stats(self) -> dict:
+        by_status: Dict[str, int] = {ROOM_IDLE: 0, ROOM_ACTIVE: 0, ROOM_FINISHED: 0}
+        players = 0
+        connections = 0
+        for room in self.rooms.values():
+            by_status[room_status(room)] += 1
+            players += len(room.players)
+            connections += len(room.connections)
+        return {
+            "rooms": len(self.rooms),
+            "maxRooms": self.max_rooms,
+            "byStatus": by_status,
+            "players": players,
+            "connections": connections,
+            "evictedExpired": self.evicted_expired,
+            "evictedLru": self.evicted_lru,
+            "finishedOnEvict": self.finished_on_evict,
+            "rssBytes": _rss_bytes(),
+        }
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import os
+import re
+import unicodedata
 import uuid
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.cache import TTLCache
+from app.llm_client import LLM_CLIENT, HttpChatAgent, estimate_tokens
+from app.resilience import LLM_GUARD, LlmUnavailable
 
 try:
     from spoon_ai.chat import ChatBot
@@ -78,13 +85,17 @@ else:
 
 _AGENT: Optional[ArenaLlmAgent] = None
 
+# "spoon" goes through the spoon_ai ChatBot; "http" talks to an
+# OpenAI-compatible endpoint over the client manager's connection pool.
+LLM_TRANSPORT = os.getenv("LLM_TRANSPORT", "spoon")
+
 
 def _get_agent() -> Optional[ArenaLlmAgent]:
     global _AGENT
     if _AGENT is not None:
         return _AGENT
 
-    if not SPOON_AVAILABLE:
+    if not SPOON_AVAILABLE and LLM_TRANSPORT != "http":
         return None
 
     api_key = os.getenv("OPENAI_API_KEY")
@@ -92,6 +103,16 @@ def _get_agent() -> Optional[ArenaLlmAgent]:
         return None
 
     model_name = os.getenv("SPOON_LLM_MODEL", "gpt-4o-mini")
+    if LLM_TRANSPORT == "http":
+        _AGENT = HttpChatAgent(  # type: ignore[assignment]
+            LLM_CLIENT,
+            base_url=os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+            api_key=api_key,
+            model=model_name,
+            system_prompt=SYSTEM_PROMPT,
+        )
+        return _AGENT
+
     _AGENT = ArenaLlmAgent(
         llm=ChatBot(
             llm_provider="openai",
@@ -101,6 +122,30 @@ def _get_agent() -> Optional[ArenaLlmAgent]:
     return _AGENT
 
 
+def llm_configured() -> bool:
+    return _get_agent() is not None
+
+
+MAX_BATCH_SIZE = int(os.getenv("LLM_QUESTION_BATCH_SIZE", "10"))
+
+
+async def _run_agent(
+    agent: ArenaLlmAgent, op: str, prompt: str, room_id: Optional[str]
+) -> str:
+    cost = estimate_tokens(prompt)
+
+    async def attempt() -> str:
+        # Hedges and retries are admitted one by one, so duplicates count
+        # against the global and per-room caps like any other call.
+        async with LLM_CLIENT.limit(room_id, cost):
+            return await agent.run(prompt)
+
+    return await LLM_GUARD.call(op, attempt)
+
+
+_WORD_PATTERN = re.compile(r"^[A-Za-z][A-Za-z'-]*$")
+
+
 def _extract_json(text: str) -> Dict[str, Any]:
     start = text.find("{")
     end = text.rfind("}")
@@ -110,46 +155,242 @@ def _extract_json(text: str) -> Dict[str, Any]:
     return json.loads(payload)
 
 
-async def generate_question(
-    player_id: str,
+def _extract_json_array(text: str) -> List[Any]:
+    start = text.find("[")
+    end = text.rfind("]")
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start : end + 1])
+        except ValueError:
+            data = None
+        if isinstance(data, list):
+            return data
+    data = _extract_json(text)
+    for key in ("questions", "items"):
+        if isinstance(data.get(key), list):
+            return data[key]
+    return [data]
+
+
+def question_from_item(
+    item: Any, difficulty: int, topic: str
+) -> Optional[LlmQuestion]:
+    if not isinstance(item, dict):
+        return None
+    answer = str(item.get("answer") or "").strip()
+    prompt = str(item.get("prompt") or "").strip()
+    if not prompt or not _WORD_PATTERN.match(answer):
+        return None
+    try:
+        level = int(item.get("difficulty") or difficulty)
+    except (TypeError, ValueError):
+        level = difficulty
+    return LlmQuestion(
+        id=str(item.get("id") or f"q_{uuid.uuid4().hex[:8]}"),
+        prompt=prompt,
+        answer=answer.lower(),
+        difficulty=max(1, min(5, level)),
+        topic=str(item.get("topic") or topic),
+    )
+
+
+async def generate_questions(
     difficulty: int,
     topic: str = "basic_vocab",
-) -> Optional[LlmQuestion]:
+    count: int = 5,
+    player_id: str = "pool",
+    room_id: Optional[str] = None,
+) -> List[LlmQuestion]:
     agent = _get_agent()
-    if agent is None:
-        return None
+    if agent is None or count <= 0:
+        return []
+    count = min(count, MAX_BATCH_SIZE)
 
     prompt = f"""
-Generate a single English spelling question for a Chinese learner.
-Return JSON with keys: id, prompt, answer, difficulty, topic.
+Generate {count} distinct English spelling questions for a Chinese learner.
+Return a JSON array of {count} objects with keys: id, prompt, answer, difficulty, topic.
 Constraints:
 - prompt must be Chinese like "拼写: 生存"
 - answer must be a single English word
+- every answer must be different
 - difficulty is integer 1-5
 - topic is a short token
 Player: {player_id}
 Difficulty: {difficulty}
 Topic: {topic}
 """
-    response = await agent.run(prompt)
-    data = _extract_json(response)
-    return LlmQuestion(
-        id=str(data.get("id") or f"q_{uuid.uuid4().hex[:8]}"),
-        prompt=str(data.get("prompt") or "拼写: 生存"),
-        answer=str(data.get("answer") or "survival"),
-        difficulty=int(data.get("difficulty") or difficulty),
-        topic=str(data.get("topic") or topic),
+    try:
+        response = await _run_agent(agent, "generate_question", prompt, room_id)
+        items = _extract_json_array(response)
+    except (LlmUnavailable, ValueError):
+        return []
+    questions: List[LlmQuestion] = []
+    seen_ids: set[str] = set()
+    seen_answers: set[str] = set()
+    seen_prompts: set[str] = set()
+    for item in items:
+        question = question_from_item(item, difficulty, topic)
+        if question is None:
+            continue
+        if question.answer in seen_answers or question.prompt in seen_prompts:
+            continue
+        if question.id in seen_ids:
+            question.id = f"q_{uuid.uuid4().hex[:8]}"
+        seen_ids.add(question.id)
+        seen_answers.add(question.answer)
+        seen_prompts.add(question.prompt)
+        questions.append(question)
+        if len(questions) >= count:
+            break
+    return questions
+
+
+async def generate_question(
+    player_id: str,
+    difficulty: int,
+    topic: str = "basic_vocab",
+    room_id: Optional[str] = None,
+) -> Optional[LlmQuestion]:
+    questions = await generate_questions(
+        difficulty, topic=topic, count=1, player_id=player_id, room_id=room_id
     )
+    return questions[0] if questions else None
+
+
+_JUDGE_CACHE: TTLCache[JudgeResult] = TTLCache(
+    max_size=int(os.getenv("JUDGE_CACHE_SIZE", "4096")),
+    ttl_seconds=float(os.getenv("JUDGE_CACHE_TTL_SECONDS", "3600")),
+)
+_JUDGE_IN_FLIGHT: Dict[Tuple[str, str], "asyncio.Task[JudgeResult]"] = {}
+
+_ANSWER_CHARSET = re.compile(r"^[a-z' -]+$")
+
+
+def _normalize_answer(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).strip().lower()
+    text = " ".join(text.split())
+    return text.strip("\"'.,!?;:")
+
+
+def _typo_tolerance(length: int) -> int:
+    if length <= 4:
+        return 0
+    if length <= 8:
+        return 1
+    return 2
+
+
+def _damerau_levenshtein(a: str, b: str, max_distance: int) -> int:
+    # Optimal string alignment distance; returns max_distance + 1 as soon as
+    # every cell in a row exceeds the bound.
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev_prev: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(prev[j] + 1, current[j - 1] + 1, prev[j - 1] + cost)
+            if (
+                i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                value = min(value, prev_prev[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        prev_prev, prev = prev, current
+    return min(prev[-1], max_distance + 1)
+
+
+def local_judge(question: LlmQuestion, user_answer: str) -> Optional[JudgeResult]:
+    expected = _normalize_answer(question.answer)
+    given = _normalize_answer(user_answer)
+    if given == expected:
+        return JudgeResult(
+            correct=True, confidence=1.0, reason="exact match", normalized_answer=given
+        )
+    if not given:
+        return JudgeResult(
+            correct=False, confidence=1.0, reason="empty answer", normalized_answer=given
+        )
+    if not _ANSWER_CHARSET.match(given):
+        return JudgeResult(
+            correct=False,
+            confidence=1.0,
+            reason="answer is not an English word",
+            normalized_answer=given,
+        )
+    tolerance = _typo_tolerance(len(expected))
+    distance = _damerau_levenshtein(given, expected, tolerance + 1)
+    if distance <= tolerance:
+        return JudgeResult(
+            correct=True,
+            confidence=0.9,
+            reason=f"minor typo ({distance} edit)",
+            normalized_answer=given,
+        )
+    if distance > tolerance + 1:
+        return JudgeResult(
+            correct=False,
+            confidence=0.95,
+            reason="spelling differs too much",
+            normalized_answer=given,
+        )
+    # One edit beyond the tolerance: let the model decide.
+    return None
 
 
 async def judge_answer(
     question: LlmQuestion,
     user_answer: str,
+    room_id: Optional[str] = None,
 ) -> Optional[JudgeResult]:
+    local = local_judge(question, user_answer)
+    if local is not None:
+        return local
+
+    key = (_normalize_answer(question.answer), _normalize_answer(user_answer))
+    cached = _JUDGE_CACHE.get(key)
+    if cached is not None:
+        return cached
+
     agent = _get_agent()
     if agent is None:
         return None
 
+    # Identical submissions racing each other share a single model call.
+    task = _JUDGE_IN_FLIGHT.get(key)
+    if task is None:
+        task = asyncio.create_task(
+            _judge_with_llm(agent, question, user_answer, room_id)
+        )
+        _JUDGE_IN_FLIGHT[key] = task
+        task.add_done_callback(lambda _task: _JUDGE_IN_FLIGHT.pop(key, None))
+    try:
+        result = await asyncio.shield(task)
+    except (LlmUnavailable, ValueError):
+        # The caller falls back to an exact match.
+        return None
+    _JUDGE_CACHE.set(key, result)
+    return result
+
+
+def judge_cache_stats() -> dict:
+    return {**_JUDGE_CACHE.stats(), "inFlight": len(_JUDGE_IN_FLIGHT)}
+
+
+async def _judge_with_llm(
+    agent: ArenaLlmAgent,
+    question: LlmQuestion,
+    user_answer: str,
+    room_id: Optional[str] = None,
+) -> JudgeResult:
     prompt = f"""
 You are judging a spelling answer.
 Return JSON with keys: correct, confidence, reason, normalized_answer.
@@ -161,7 +402,7 @@ Rules:
 - confidence is 0-1
 - normalized_answer is lowercased answer
 """
-    response = await agent.run(prompt)
+    response = await _run_agent(agent, "judge_answer", prompt, room_id)
     data = _extract_json(response)
     return JudgeResult(
         correct=bool(data.get("correct")),
@@ -171,18 +412,26 @@ Rules:
     )
 
 
-async def generate_report(wrong_words: List[str], score: Optional[int]) -> str:
+def fallback_report(wrong_words: List[str]) -> str:
+    mistakes = "、".join(wrong_words) if wrong_words else "暂无"
+    return (
+        "同学，你做得已经很不错了，先给自己一点肯定。\n"
+        f"这次答题里出错的词有：{mistakes}。\n"
+        "建议你先把这些词做成卡片，每天少量多次复习，"
+        "再用拼写+造句的方式巩固。\n"
+        "学习是长跑，不是短刺。请记得照顾自己，热爱生命，"
+        "不要被内卷压垮。"
+    )
+
+
+async def generate_model_report(
+    wrong_words: List[str], score: Optional[int], room_id: Optional[str] = None
+) -> Optional[str]:
+    # None when the model is unavailable or answers unusably, so callers can
+    # tell a real report from the canned one (and avoid caching the latter).
     agent = _get_agent()
     if agent is None:
-        mistakes = "、".join(wrong_words) if wrong_words else "暂无"
-        return (
-            "同学，你做得已经很不错了，先给自己一点肯定。\n"
-            f"这次答题里出错的词有：{mistakes}。\n"
-            "建议你先把这些词做成卡片，每天少量多次复习，"
-            "再用拼写+造句的方式巩固。\n"
-            "学习是长跑，不是短刺。请记得照顾自己，热爱生命，"
-            "不要被内卷压垮。"
-        )
+        return None
 
     wrong_list = ", ".join(wrong_words) if wrong_words else "none"
     score_text = str(score) if score is not None else "unknown"
@@ -198,6 +447,20 @@ Keep the text within 100 Chinese characters.
 User score: {score_text}
 Wrong words: {wrong_list}
 """
-    response = await agent.run(prompt)
-    data = _extract_json(response)
-    return str(data.get("text") or "")
+    try:
+        response = await _run_agent(agent, "generate_report", prompt, room_id)
+        data = _extract_json(response)
+    except (LlmUnavailable, ValueError):
+        return None
+    return str(data.get("text") or "") or None
+
+
+async def generate_report(
+    wrong_words: List[str], score: Optional[int], room_id: Optional[str] = None
+) -> str:
+    text = await generate_model_report(wrong_words, score, room_id=room_id)
+    return text or fallback_report(wrong_words)
+
+
+def llm_stats() -> dict:
+    return {**LLM_GUARD.stats(), "client": LLM_CLIENT.stats()}
@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+from app.resilience import (
+    LatencyTracker,
+    LlmOverloaded,
+    LlmUnavailable,
+    mark_admitted,
+    mark_queued,
+)
+from app.scheduler import GAME_CLOCK, TimerHandle
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except Exception:  # pragma: no cover - optional dependency guard
+    HTTPX_AVAILABLE = False
+
+
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+LLM_ROOM_MAX_IN_FLIGHT = int(os.getenv("LLM_ROOM_MAX_IN_FLIGHT", "2"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_ROOM_TOKENS_PER_MINUTE = float(os.getenv("LLM_ROOM_TOKENS_PER_MINUTE", "0"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10"))
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "300"))
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "16"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "8"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "30"))
+LLM_HTTP_TIMEOUT_SECONDS = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "30"))
+
+GLOBAL_LANE = "global"
+
+
+def estimate_tokens(prompt: str) -> int:
+    # Roughly four characters per token plus the expected completion.
+    return len(prompt) // 4 + LLM_EXPECTED_OUTPUT_TOKENS
+
+
+class TokenBucket:
+    def __init__(self, tokens_per_minute: float) -> None:
+        self.rate = tokens_per_minute / 60.0
+        self.capacity = tokens_per_minute
+        self.tokens = tokens_per_minute
+        self.updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.rate <= 0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, cost: float, now: float) -> float:
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def consume(self, cost: float) -> None:
+        if not self.unlimited:
+            self.tokens -= min(cost, self.capacity)
+
+
+class _Waiter:
+    __slots__ = ("lane", "cost", "future", "enqueued_at")
+
+    def __init__(self, lane: str, cost: int, future: asyncio.Future) -> None:
+        self.lane = lane
+        self.cost = cost
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LlmClientManager:
+    # Admission control for every model call. Requests queue per lane (one
+    # lane per room) and lanes are served round-robin, so a burst of joins
+    # in one room cannot starve the others; grants respect a global and a
+    # per-lane concurrency cap and tokens-per-minute budget.
+    def __init__(
+        self,
+        max_in_flight: int = LLM_MAX_IN_FLIGHT,
+        lane_max_in_flight: int = LLM_ROOM_MAX_IN_FLIGHT,
+        tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+        lane_tokens_per_minute: float = LLM_ROOM_TOKENS_PER_MINUTE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT_SECONDS,
+    ) -> None:
+        self.max_in_flight = max(1, max_in_flight)
+        self.lane_max_in_flight = max(1, lane_max_in_flight)
+        self.lane_tokens_per_minute = lane_tokens_per_minute
+        self.queue_timeout = queue_timeout
+        self._bucket = TokenBucket(tokens_per_minute)
+        self._lane_buckets: Dict[str, TokenBucket] = {}
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._in_flight = 0
+        self._lane_in_flight: Dict[str, int] = {}
+        self._retry: TimerHandle | None = None
+        self._http: Any = None
+        self.granted = 0
+        self.queue_timeouts = 0
+        self.wait_seconds = LatencyTracker()
+        self.total_wait_seconds = 0.0
+
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def http_client(self) -> Any:
+        # One keep-alive pool shared by every request to the provider.
+        if self._http is None and HTTPX_AVAILABLE:
+            self._http = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+                    keepalive_expiry=LLM_HTTP_KEEPALIVE_SECONDS,
+                ),
+                timeout=LLM_HTTP_TIMEOUT_SECONDS,
+            )
+        return self._http
+
+    async def close(self) -> None:
+        GAME_CLOCK.cancel(self._retry)
+        self._retry = None
+        if self._http is not None:
+            client, self._http = self._http, None
+            await client.aclose()
+
+    @asynccontextmanager
+    async def limit(self, room_id: Optional[str], cost: int) -> AsyncIterator[None]:
+        lane = room_id or GLOBAL_LANE
+        await self._acquire(lane, cost)
+        try:
+            yield
+        finally:
+            self._release(lane)
+
+    async def _acquire(self, lane: str, cost: int) -> None:
+        mark_queued()
+        waiter = _Waiter(lane, cost, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(lane, deque()).append(waiter)
+        self._dispatch()
+        try:
+            done, _ = await asyncio.wait(
+                (waiter.future,), timeout=self.queue_timeout or None
+            )
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        if not done:
+            self._abandon(waiter)
+            self.queue_timeouts += 1
+            raise LlmOverloaded(
+                f"queued for more than {self.queue_timeout}s on lane {lane}"
+            )
+        mark_admitted()
+        waited = time.monotonic() - waiter.enqueued_at
+        self.wait_seconds.record(waited)
+        self.total_wait_seconds += waited
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        if waiter.future.done():
+            # Granted while we were giving up: hand the slot back.
+            self._release(waiter.lane)
+            return
+        waiter.future.cancel()
+        queue = self._queues.get(waiter.lane)
+        if queue is not None:
+            try:
+                queue.remove(waiter)
+            except ValueError:
+                pass
+            if not queue:
+                del self._queues[waiter.lane]
+
+    def _release(self, lane: str) -> None:
+        self._in_flight -= 1
+        remaining = self._lane_in_flight.get(lane, 1) - 1
+        if remaining > 0:
+            self._lane_in_flight[lane] = remaining
+        else:
+            self._lane_in_flight.pop(lane, None)
+            bucket = self._lane_buckets.get(lane)
+            # Forget idle lanes once their budget has fully refilled.
+            if (
+                bucket is not None
+                and lane not in self._queues
+                and bucket.delay(bucket.capacity, time.monotonic()) == 0
+            ):
+                del self._lane_buckets[lane]
+        self._dispatch()
+
+    def _lane_bucket(self, lane: str) -> TokenBucket:
+        bucket = self._lane_buckets.get(lane)
+        if bucket is None:
+            bucket = self._lane_buckets[lane] = TokenBucket(self.lane_tokens_per_minute)
+        return bucket
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        retry_in: Optional[float] = None
+        progress = True
+        while progress and self._queues and self._in_flight < self.max_in_flight:
+            progress = False
+            for lane in list(self._queues):
+                if self._in_flight >= self.max_in_flight:
+                    break
+                if self._lane_in_flight.get(lane, 0) >= self.lane_max_in_flight:
+                    continue
+                queue = self._queues[lane]
+                waiter = queue[0]
+                lane_bucket = self._lane_bucket(lane)
+                delay = max(
+                    self._bucket.delay(waiter.cost, now),
+                    lane_bucket.delay(waiter.cost, now),
+                )
+                if delay > 0:
+                    retry_in = delay if retry_in is None else min(retry_in, delay)
+                    continue
+                queue.popleft()
+                self._bucket.consume(waiter.cost)
+                lane_bucket.consume(waiter.cost)
+                self._in_flight += 1
+                self._lane_in_flight[lane] = self._lane_in_flight.get(lane, 0) + 1
+                self.granted += 1
+                waiter.future.set_result(None)
+                progress = True
+                # Served lanes go to the back of the rotation.
+                if queue:
+                    self._queues.move_to_end(lane)
+                else:
+                    del self._queues[lane]
+        if retry_in is not None:
+            self._schedule_retry(now + retry_in)
+
+    def _schedule_retry(self, deadline: float) -> None:
+        if self._retry is not None and not self._retry.cancelled:
+            if self._retry.deadline <= deadline:
+                return
+            GAME_CLOCK.cancel(self._retry)
+        self._retry = GAME_CLOCK.call_at(deadline, self._on_retry)
+
+    def _on_retry(self) -> None:
+        self._retry = None
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "inFlight": self._in_flight,
+            "maxInFlight": self.max_in_flight,
+            "queueDepth": self.queue_depth(),
+            "queuedLanes": {lane: len(queue) for lane, queue in self._queues.items()},
+            "granted": self.granted,
+            "queueTimeouts": self.queue_timeouts,
+            "avgWaitSeconds": (
+                self.total_wait_seconds / self.granted if self.granted else 0.0
+            ),
+            "p95WaitSeconds": self.wait_seconds.percentile(0.95),
+            "tokensAvailable": (
+                None if self._bucket.unlimited else round(self._bucket.tokens, 1)
+            ),
+            "httpPooled": self._http is not None,
+        }
+
+
+class HttpChatAgent:
+    # OpenAI-compatible chat completions over the shared connection pool.
+    def __init__(
+        self,
+        manager: LlmClientManager,
+        base_url: str,
+        api_key: str,
+        model: str,
+        system_prompt: str,
+    ) -> None:
+        self.manager = manager
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.headers = {"Authorization": f"Bearer {api_key}"}
+        self.model = model
+        self.system_prompt = system_prompt
+
+    async def run(self, prompt: str) -> str:
+        client = self.manager.http_client()
+        if client is None:
+            raise LlmUnavailable("httpx is not installed")
+        response = await client.post(
+            self.url,
+            headers=self.headers,
+            json={
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+            },
+        )
+        response.raise_for_status()
+        data = response.json()
+        return str(data["choices"][0]["message"].get("content") or "")
+
+
+LLM_CLIENT = LlmClientManager()
@@ -2,21 +2,73 @@ from __future__ import annotations
 
 import asyncio
 import json
+import os
 import random
+import sys
 import time
-from dataclasses import dataclass
-from typing import Dict, Optional
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, RedirectResponse
 from pydantic import BaseModel
 
+from app.chain_index import CHAIN_INDEX, DEPOSIT_REQUIRED
+from app.codec import dumps
+from app.leaderboard import ScoreIndex
+from app.lifecycle import RoomLifecycleManager, room_status
 from app.llm_agent import (
     LlmQuestion,
-    generate_question,
     judge_answer,
-    generate_report,
+    judge_cache_stats,
+    llm_stats,
 )
+from app.llm_client import LLM_CLIENT
+from app.metrics import (
+    BROADCAST_RECIPIENTS,
+    BROADCAST_SECONDS,
+    LOOP_LAG,
+    QUESTION_PREFETCH,
+    REGISTRY,
+    SUBMIT_STAGE_SECONDS,
+)
+from app.outbound import PRIORITY_LOW, OutboundConnection, priority_for
+from app.protocol import (
+    JSON_FRAMING,
+    ClientMessage,
+    DepositRequired,
+    Framing,
+    JoinMessage,
+    ProtocolError,
+    ReportMessage,
+    ResyncMessage,
+    SubmitMessage,
+    WalletUnverified,
+    error_event,
+    is_address,
+    negotiate,
+    question_event,
+)
+from app.question_bank import BUILTIN_QUESTIONS, QUESTION_BANK, BankCursor
+from app.question_pool import QUESTION_CACHE, generate_unique_questions
+from app.reports import REPORT_QUEUE, STATUS_DONE
+from app.scheduler import GAME_CLOCK, TimerHandle
+from app.settlement import (
+    SETTLEMENT,
+    SETTLEMENT_FORWARD_PATH,
+    SETTLEMENT_OWNER_KEY,
+    SETTLEMENT_SIGNATURE_HEADER,
+    GameResult,
+    compute_payouts,
+)
+from app.seen import SeenSet, new_seen_set
+from app.sharding import get_coordinator
+from app.storage import STATE
+from app.wallet_auth import WALLET_AUTH
 
 app = FastAPI(title="Roulette LLM Arena API")
 
@@ -29,110 +81,285 @@ app.add_middleware(
 )
 
 
-QUESTION_POOL = [
-    LlmQuestion(id="q1", prompt="拼写: 机会", answer="chance", difficulty=1, topic="basic"),
-    LlmQuestion(id="q2", prompt="拼写: 危险", answer="danger", difficulty=1, topic="basic"),
-    LlmQuestion(id="q3", prompt="拼写: 生存", answer="survival", difficulty=1, topic="basic"),
-]
+QUESTION_POOL_ENABLED = os.getenv("QUESTION_POOL_ENABLED", "1") != "0"
+BROADCAST_TICK_SECONDS = float(os.getenv("ROOM_BROADCAST_TICK_SECONDS", "0.1"))
+ANSWER_TIMEOUT_SECONDS = float(os.getenv("ANSWER_TIMEOUT_SECONDS", "0"))
+
+# Serve every question from the offline bank with no LLM round trip; off by
+# default so generated questions stay the norm and the bank is the fallback.
+QUESTION_BANK_FIRST = os.getenv("QUESTION_BANK_FIRST", "0") != "0"
 
+_STAGE_JUDGE = SUBMIT_STAGE_SECONDS.labels("judge")
+_STAGE_APPLY = SUBMIT_STAGE_SECONDS.labels("apply")
+_STAGE_NEXT_QUESTION = SUBMIT_STAGE_SECONDS.labels("next_question")
+_STAGE_TOTAL = SUBMIT_STAGE_SECONDS.labels("total")
 
-@dataclass
+
+@dataclass(slots=True)
 class PlayerState:
     score: int = 0
     alive: bool = True
     correct_streak: int = 0
     difficulty: int = 1
+    join_order: int = 0
+    question_index: int = 0
+    last_question: Optional[LlmQuestion] = None
+    question_queue: Deque[LlmQuestion] = field(default_factory=deque)
+    bank_cursor: BankCursor = field(default_factory=BankCursor)
+    seen: SeenSet = field(default_factory=new_seen_set)
+    answer_deadline: Optional[TimerHandle] = None
+    payout_address: Optional[str] = None
+
+
+class _Reserved:
+    # Words a player was asked plus those queued for them. Queued words are
+    # only marked seen once served, so dropping the queue does not burn them.
+    __slots__ = ("seen", "queue")
+
+    def __init__(self, seen: SeenSet, queue: Deque[LlmQuestion]) -> None:
+        self.seen = seen
+        self.queue = queue
+
+    def __contains__(self, word: object) -> bool:
+        if word in self.seen:
+            return True
+        if not isinstance(word, str):
+            return False
+        word = word.lower()
+        return any(question.answer.lower() == word for question in self.queue)
 
 
 class RoomState:
     def __init__(self, room_id: str, duration_seconds: int = 180) -> None:
         self.room_id = room_id
         self.players: Dict[str, PlayerState] = {}
-        self.current_question_index: Dict[str, int] = {}
-        self.last_question: Dict[str, LlmQuestion] = {}
-        self.question_queue: Dict[str, list[LlmQuestion]] = {}
-        self.connections: set[WebSocket] = set()
+        self.connections: set[OutboundConnection] = set()
         self.duration_seconds = duration_seconds
         self.started_at: float | None = None
+        self.game_id: str | None = None
+        # Wallets that paid an entry this game, mapped to their player id.
+        self.entrants: Dict[str, str] = {}
         self.game_over: bool = False
         self.winner_id: str | None = None
-        self.timer_task: asyncio.Task | None = None
+        self.timer_handle: TimerHandle | None = None
+        self.last_activity = time.monotonic()
+        self.state_seq = 0
+        self._dirty_players: set[str] = set()
+        self.flush_handle: TimerHandle | None = None
+        self._last_flush = 0.0
+        self.alive_count = 0
+        self._join_counter = 0
+        self._scores = ScoreIndex()
+        self._alive_scores = ScoreIndex()
+        # Per-turn locks and in-flight prefetches live here rather than on
+        # every PlayerState; entries exist only while a player is active.
+        self._turn_locks: Dict[str, asyncio.Lock] = {}
+        self._prefetch: Dict[str, tuple[int, asyncio.Task]] = {}
+        # Prefetches queue on their own LLM lane so they never hold the
+        # slots this room's judge calls need.
+        self._prefetch_lane = f"{room_id}:prefetch"
+
+    @property
+    def dead_count(self) -> int:
+        return len(self.players) - self.alive_count
+
+    def _ensure_player(self, player_id: str) -> PlayerState:
+        player = self.players.get(player_id)
+        if player is None:
+            # Interned ids share one string object across the room's indexes.
+            player_id = sys.intern(player_id)
+            self._join_counter += 1
+            player = PlayerState(join_order=self._join_counter)
+            self.players[player_id] = player
+            self.alive_count += 1
+            self._scores.update(player_id, 0, player.join_order)
+            self._alive_scores.update(player_id, 0, player.join_order)
+        return player
+
+    def _index_score(self, player_id: str, player: PlayerState) -> None:
+        self._scores.update(player_id, player.score, player.join_order)
+        if player.alive:
+            self._alive_scores.update(player_id, player.score, player.join_order)
+
+    def top_k(self, k: int) -> list[dict]:
+        return [
+            {"id": player_id, "score": score, "alive": self.players[player_id].alive}
+            for player_id, score in self._scores.top_k(k)
+        ]
+
+    def turn_lock(self, player_id: str) -> asyncio.Lock:
+        lock = self._turn_locks.get(player_id)
+        if lock is None:
+            lock = self._turn_locks[player_id] = asyncio.Lock()
+        return lock
+
+    def _cancel_prefetch(self, player_id: str) -> None:
+        entry = self._prefetch.pop(player_id, None)
+        if entry is not None:
+            entry[1].cancel()
+            QUESTION_PREFETCH.labels("discarded").inc()
+
+    def touch(self) -> None:
+        self.last_activity = time.monotonic()
 
     def join(self, player_id: str) -> None:
+        self.touch()
         if player_id not in self.players:
-            self.players[player_id] = PlayerState()
-        else:
-            self.players[player_id].score = 0
-            self.players[player_id].alive = True
-            self.players[player_id].correct_streak = 0
-            self.players[player_id].difficulty = 1
-        self.current_question_index[player_id] = 0
-        self.last_question.pop(player_id, None)
-        self.question_queue.pop(player_id, None)
+            self._ensure_player(player_id)
+            return
+        player = self.players[player_id]
+        if not player.alive:
+            self.alive_count += 1
+        player.score = 0
+        player.alive = True
+        player.correct_streak = 0
+        player.difficulty = 1
+        player.question_index = 0
+        player.last_question = None
+        player.question_queue.clear()
+        self._cancel_prefetch(player_id)
+        self._index_score(player_id, player)
+
+    async def _gather_questions(
+        self,
+        player_id: str,
+        player: PlayerState,
+        difficulty: int,
+        count: int,
+        lane: Optional[str] = None,
+    ) -> list[LlmQuestion]:
+        difficulty = max(1, min(5, difficulty))
+        seen = _Reserved(player.seen, player.question_queue)
+        questions = await generate_unique_questions(
+            player_id,
+            difficulty,
+            count,
+            exclude=player.question_queue,
+            room_id=lane or self.room_id,
+            seen=seen,
+        )
+        picked = {question.answer for question in questions}
+        while len(questions) < count:
+            candidate = QUESTION_BANK.sample(
+                difficulty, player.bank_cursor, exclude=seen
+            )
+            if candidate is None or candidate.answer in seen:
+                break
+            if candidate.answer in picked:
+                break
+            picked.add(candidate.answer)
+            questions.append(candidate)
+        return questions
+
+    def _enqueue(self, player: PlayerState, questions: list[LlmQuestion]) -> None:
+        reserved = _Reserved(player.seen, player.question_queue)
+        for question in questions:
+            if question.answer in reserved:
+                continue
+            player.question_queue.append(question)
 
     async def _fill_question_queue(
         self, player_id: str, desired_count: int = 3
     ) -> None:
-        queue = self.question_queue.setdefault(player_id, [])
+        player = self._ensure_player(player_id)
+        missing = desired_count - len(player.question_queue)
+        if missing > 0:
+            self._enqueue(
+                player,
+                await self._gather_questions(
+                    player_id, player, player.difficulty, missing
+                ),
+            )
+
+    def _needs_refill(self, player: PlayerState, difficulty: int) -> bool:
+        # Only the LLM refill path is slow; pool and bank lookups are instant.
+        if QUESTION_BANK_FIRST or QUESTION_CACHE.running:
+            return False
+        if difficulty != player.difficulty:
+            return True
+        return not player.question_queue
+
+    def prefetch_next(self, player_id: str) -> None:
+        # Start one refill batch so it overlaps judging: at the next level
+        # when a correct answer would raise the difficulty, otherwise at the
+        # current one. At most one batch per player is in flight; a batch
+        # for a level not reached yet is kept for when the player gets there.
         player = self.players.get(player_id)
         if player is None:
-            player = PlayerState()
-            self.players[player_id] = player
-        difficulty = max(1, min(5, player.difficulty))
-        last_question = self.last_question.get(player_id)
-
-        attempts = 0
-        while len(queue) < desired_count and attempts < 12:
-            attempts += 1
-            candidate = await generate_question(player_id, difficulty)
-            if candidate is None:
-                break
-            if last_question and (
-                candidate.id == last_question.id
-                or candidate.prompt == last_question.prompt
-            ):
-                continue
-            if any(
-                existing.id == candidate.id or existing.prompt == candidate.prompt
-                for existing in queue
-            ):
-                continue
-            queue.append(candidate)
-
-        if len(queue) < desired_count:
-            idx = self.current_question_index.get(player_id, 0)
-            for offset in range(1, len(QUESTION_POOL) + 1):
-                candidate = QUESTION_POOL[(idx + offset) % len(QUESTION_POOL)]
-                if last_question and candidate.id == last_question.id:
-                    continue
-                if any(existing.id == candidate.id for existing in queue):
-                    continue
-                queue.append(candidate)
-                if len(queue) >= desired_count:
-                    break
+            return
+        level = player.difficulty
+        if player.correct_streak + 1 >= 3 and level < 5:
+            level += 1
+        entry = self._prefetch.get(player_id)
+        if entry is not None and entry[0] == level:
+            return
+        if not self._needs_refill(player, level):
+            return
+        self._cancel_prefetch(player_id)
+        self._prefetch[player_id] = (
+            level,
+            asyncio.create_task(
+                self._gather_questions(
+                    player_id, player, level, 3, lane=self._prefetch_lane
+                )
+            ),
+        )
+        QUESTION_PREFETCH.labels("started").inc()
+
+    async def _take_prefetched(self, player_id: str, player: PlayerState) -> None:
+        entry = self._prefetch.get(player_id)
+        if entry is None or entry[0] > player.difficulty:
+            return
+        level, task = self._prefetch.pop(player_id)
+        if level < player.difficulty:
+            task.cancel()
+            QUESTION_PREFETCH.labels("discarded").inc()
+            return
+        try:
+            questions = await task
+        except Exception:
+            questions = []
+        QUESTION_PREFETCH.labels("used" if questions else "empty").inc()
+        self._enqueue(player, questions)
+
+    def _fallback_question(self, player: PlayerState) -> LlmQuestion:
+        question = QUESTION_BANK.sample(
+            player.difficulty, player.bank_cursor, exclude=player.seen
+        )
+        if question is None:
+            question = BUILTIN_QUESTIONS[player.question_index % len(BUILTIN_QUESTIONS)]
+        return question
 
     async def next_question(self, player_id: str) -> LlmQuestion:
-        idx = self.current_question_index.get(player_id, 0)
-        queue = self.question_queue.get(player_id, [])
-        if not queue:
-            await self._fill_question_queue(player_id, desired_count=3)
-            queue = self.question_queue.get(player_id, [])
-        if queue:
-            question = queue.pop(0)
+        player = self._ensure_player(player_id)
+        idx = player.question_index
+        queue = player.question_queue
+        if not queue and QUESTION_BANK_FIRST:
+            question = self._fallback_question(player)
+        elif not queue and QUESTION_CACHE.running:
+            pooled = QUESTION_CACHE.take(player.difficulty, seen=player.seen)
+            question = pooled or self._fallback_question(player)
         else:
-            question = QUESTION_POOL[idx % len(QUESTION_POOL)]
-        self.current_question_index[player_id] = idx + 1
-        self.last_question[player_id] = question
+            if not queue and player_id in self._prefetch:
+                await self._take_prefetched(player_id, player)
+            if not queue:
+                await self._fill_question_queue(player_id, desired_count=3)
+            if queue:
+                question = queue.popleft()
+            else:
+                question = self._fallback_question(player)
+        player.question_index = idx + 1
+        player.last_question = question
+        player.seen.add(question.answer)
         return question
 
     def apply_answer(self, player_id: str, correct: bool) -> tuple[int, bool, int]:
-        player = self.players.get(player_id)
-        if player is None:
-            player = PlayerState()
-            self.players[player_id] = player
+        player = self._ensure_player(player_id)
+        self.touch()
         difficulty_increased = False
         if correct:
             player.score += 10
+            self._index_score(player_id, player)
             player.correct_streak += 1
             if player.correct_streak >= 3:
                 if player.difficulty < 5:
@@ -145,16 +372,21 @@ class RoomState:
 
     def mark_dead(self, player_id: str) -> None:
         player = self.players.get(player_id)
-        if player:
+        if player and player.alive:
             player.alive = False
+            self._cancel_prefetch(player_id)
+            self.alive_count -= 1
+            self._alive_scores.remove(player_id)
 
-    def connect(self, websocket: WebSocket) -> None:
-        self.connections.add(websocket)
+    def connect(self, conn: OutboundConnection) -> None:
+        self.touch()
+        self.connections.add(conn)
 
-    def disconnect(self, websocket: WebSocket) -> None:
-        self.connections.discard(websocket)
+    def disconnect(self, conn: OutboundConnection) -> None:
+        self.touch()
+        self.connections.discard(conn)
 
-    def snapshot(self) -> dict:
+    def _clock(self) -> dict:
         now_epoch = time.time()
         if self.started_at is None:
             time_left = self.duration_seconds
@@ -163,71 +395,198 @@ class RoomState:
             elapsed = max(0.0, time.monotonic() - self.started_at)
             time_left = max(0, self.duration_seconds - int(elapsed))
             started_at_epoch = now_epoch - elapsed
-        players = [
-            {"id": player_id, "score": state.score, "alive": state.alive}
-            for player_id, state in self.players.items()
-        ]
-        alive_count = sum(1 for entry in players if entry["alive"])
-        dead_count = len(players) - alive_count
         return {
-            "players": players,
-            "aliveCount": alive_count,
-            "deadCount": dead_count,
             "timeLeft": time_left,
             "durationSeconds": self.duration_seconds,
             "serverNowMs": int(now_epoch * 1000),
             "startedAtMs": int(started_at_epoch * 1000) if started_at_epoch else None,
         }
 
+    def _player_entry(self, player_id: str) -> dict:
+        state = self.players[player_id]
+        return {"id": player_id, "score": state.score, "alive": state.alive}
+
+    def snapshot(self) -> dict:
+        snapshot = {
+            "seq": self.state_seq,
+            "players": [self._player_entry(player_id) for player_id in self.players],
+            "aliveCount": self.alive_count,
+            "deadCount": self.dead_count,
+            **self._clock(),
+        }
+        if CHAIN_INDEX.enabled:
+            snapshot["pool"] = CHAIN_INDEX.summary()
+        return snapshot
+
+    def delta(self) -> dict:
+        changed = [
+            self._player_entry(player_id)
+            for player_id in self._dirty_players
+            if player_id in self.players
+        ]
+        self._dirty_players.clear()
+        self.state_seq += 1
+        return {
+            "seq": self.state_seq,
+            "players": changed,
+            "aliveCount": self.alive_count,
+            "deadCount": self.dead_count,
+            **self._clock(),
+        }
+
+    def mark_changed(self, player_id: str | None = None) -> None:
+        if player_id is not None:
+            self._dirty_players.add(player_id)
+        if self.flush_handle is None:
+            # Coalesce every change made during a tick into one delta frame.
+            self.flush_handle = GAME_CLOCK.call_at(
+                max(time.monotonic(), self._last_flush + BROADCAST_TICK_SECONDS),
+                self._flush_changes,
+            )
+
+    async def _flush_changes(self) -> None:
+        self.flush_handle = None
+        self._last_flush = time.monotonic()
+        if not self.connections:
+            self._dirty_players.clear()
+            return
+        await self.broadcast(
+            {
+                "type": "room_delta",
+                "payload": {"roomId": self.room_id, **self.delta()},
+            }
+        )
+
+    def arm_answer_deadline(
+        self, player_id: str, callback: Callable[[], Awaitable[None]]
+    ) -> None:
+        player = self.players.get(player_id)
+        if player is None or ANSWER_TIMEOUT_SECONDS <= 0:
+            return
+        GAME_CLOCK.cancel(player.answer_deadline)
+        player.answer_deadline = GAME_CLOCK.call_later(ANSWER_TIMEOUT_SECONDS, callback)
+
+    def cancel_answer_deadline(self, player_id: str) -> None:
+        player = self.players.get(player_id)
+        if player is not None:
+            GAME_CLOCK.cancel(player.answer_deadline)
+            player.answer_deadline = None
+
     async def broadcast(self, event: dict) -> None:
-        disconnected: list[WebSocket] = []
-        for conn in self.connections:
-            try:
-                await conn.send_text(json.dumps(event))
-            except Exception:
-                disconnected.append(conn)
-        for conn in disconnected:
-            self.connections.discard(conn)
+        if not self.connections:
+            return
+        # Encode once per framing; each connection's writer task does the send.
+        started = time.perf_counter()
+        encoded: Dict[Framing, str | bytes] = {}
+        priority = priority_for(event.get("type"))
+        for conn in list(self.connections):
+            message = encoded.get(conn.framing)
+            if message is None:
+                message = encoded[conn.framing] = conn.framing.encode(event)
+            if not conn.send(message, priority):
+                self.connections.discard(conn)
+        BROADCAST_SECONDS.observe(time.perf_counter() - started)
+        BROADCAST_RECIPIENTS.inc(len(self.connections))
+
+    def snapshot_message(self, framing: Framing = JSON_FRAMING) -> str | bytes:
+        return framing.encode(
+            {"type": "room", "payload": {"roomId": self.room_id, **self.snapshot()}}
+        )
+
+    def _cancel_timers(self) -> None:
+        for handle in (self.timer_handle, self.flush_handle):
+            GAME_CLOCK.cancel(handle)
+        self.timer_handle = None
+        self.flush_handle = None
+        for player in self.players.values():
+            GAME_CLOCK.cancel(player.answer_deadline)
+            player.answer_deadline = None
+        for player_id in list(self._prefetch):
+            self._cancel_prefetch(player_id)
 
     def reset(self) -> None:
+        self._cancel_timers()
         self.players.clear()
-        self.current_question_index.clear()
-        self.last_question.clear()
+        self._turn_locks.clear()
         self.started_at = None
+        self.game_id = None
+        self.entrants.clear()
         self.game_over = False
         self.winner_id = None
-        if self.timer_task:
-            self.timer_task.cancel()
-            self.timer_task = None
+        self._dirty_players.clear()
+        self.alive_count = 0
+        self._scores.clear()
+        self._alive_scores.clear()
+
+    def close(self) -> None:
+        self._cancel_timers()
+
+    def to_record(self) -> dict:
+        return {
+            "room_id": self.room_id,
+            "duration_seconds": self.duration_seconds,
+            "game_id": self.game_id,
+            "game_over": self.game_over,
+            "winner_id": self.winner_id,
+            "players": [
+                {
+                    "id": player_id,
+                    "score": state.score,
+                    "alive": state.alive,
+                    "difficulty": state.difficulty,
+                    "address": state.payout_address,
+                }
+                for player_id, state in self.players.items()
+            ],
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "RoomState":
+        room = cls(record["room_id"], duration_seconds=record["duration_seconds"])
+        room.game_id = record.get("game_id")
+        for entry in record.get("players", []):
+            player = room._ensure_player(entry["id"])
+            player.score = entry.get("score", 0)
+            player.difficulty = entry.get("difficulty", 1)
+            address = player.payout_address = entry.get("address")
+            if (
+                address is not None
+                and room.game_id is not None
+                and CHAIN_INDEX.has_entry(address, room.entry_key())
+            ):
+                room.entrants[address] = entry["id"]
+            room._index_score(entry["id"], player)
+            if not entry.get("alive", True):
+                room.mark_dead(entry["id"])
+        room.game_over = bool(record.get("game_over"))
+        room.winner_id = record.get("winner_id")
+        return room
 
     def start_timer(self) -> None:
         if self.started_at is not None or self.game_over:
             return
         self.started_at = time.monotonic()
-        self.timer_task = asyncio.create_task(self._run_timer())
+        self.entry_key()
+        self.timer_handle = GAME_CLOCK.call_at(
+            self.started_at + self.duration_seconds, self.finish_game, "timeout"
+        )
 
-    async def _run_timer(self) -> None:
-        try:
-            await asyncio.sleep(self.duration_seconds)
-            await self.finish_game(reason="timeout")
-        except asyncio.CancelledError:
-            return
+    def entry_key(self) -> str:
+        # Names this round for entry fees; fixed by the first paid join so
+        # everyone entering before the start pays into the same game.
+        if self.game_id is None:
+            self.game_id = uuid.uuid4().hex[:12]
+        return f"{self.room_id}:{self.game_id}"
 
     async def finish_game(self, reason: str) -> None:
         if self.game_over:
             return
         self.game_over = True
-        alive_players = [
-            (player_id, state)
-            for player_id, state in self.players.items()
-            if state.alive
-        ]
-        candidates = alive_players if alive_players else list(self.players.items())
-        if candidates:
-            winner_id = max(candidates, key=lambda item: item[1].score)[0]
-        else:
-            winner_id = None
+        self.touch()
+        self._cancel_timers()
+        winner_id = self._alive_scores.top() or self._scores.top()
         self.winner_id = winner_id
+        # Clients hear the result first; persistence and payout follow.
         await self.broadcast(
             {
                 "type": "game_over",
@@ -239,22 +598,123 @@ class RoomState:
                 },
             }
         )
+        SETTLEMENT.submit_later(self.game_result())
+        await STATE.put("room", self.room_id, self.to_record())
+
+    def game_result(self) -> GameResult:
+        # Only players whose wallet paid into this game rank for a prize, and
+        # the prize comes out of what their entries collected.
+        key = self.entry_key()
+        paid = {player_id: address for address, player_id in self.entrants.items()}
+        ranked = [
+            player_id
+            for player_id, _ in self._scores.top_k(len(self.players))
+            if player_id in paid
+        ]
+        if self.winner_id in paid:
+            ranked.remove(self.winner_id)
+            ranked.insert(0, self.winner_id)
+        collected = sum(CHAIN_INDEX.entry_fee(address, key) for address in self.entrants)
+        return GameResult(
+            key=key,
+            room_id=self.room_id,
+            payouts=compute_payouts(
+                [(player_id, paid[player_id]) for player_id in ranked], collected
+            ),
+        )
 
     async def maybe_finish_last_alive(self) -> None:
         if self.game_over:
             return
-        alive_count = sum(1 for state in self.players.values() if state.alive)
-        if alive_count <= 1 and self.players:
+        if self.alive_count <= 1 and self.players:
             await self.finish_game(reason="last_alive")
 
 
 ROOMS: Dict[str, RoomState] = {"arena": RoomState("arena")}
-SUMMARY_BY_PLAYER: dict[str, SummaryPayload] = {}
+LIFECYCLE = RoomLifecycleManager(ROOMS, pinned=("arena",))
+
+
+async def _add_room(room: RoomState) -> RoomState:
+    await LIFECYCLE.enforce_capacity(reserve=1)
+    ROOMS[room.room_id] = room
+    return room
+
+
+async def _restore_room(room_id: str) -> RoomState | None:
+    record = await STATE.get("room", room_id)
+    if record is None:
+        return None
+    return await _add_room(RoomState.from_record(record))
+
+
+def _rooms_by_status() -> list[tuple[dict, float]]:
+    counts: Dict[str, int] = {}
+    for room in ROOMS.values():
+        status = room_status(room)
+        counts[status] = counts.get(status, 0) + 1
+    return [({"status": status}, count) for status, count in counts.items()]
+
+
+REGISTRY.gauge("arena_rooms", "Rooms held in memory by status.", _rooms_by_status)
+REGISTRY.gauge(
+    "arena_room_connections",
+    "Open WebSocket connections per room (rooms with none are omitted).",
+    lambda: [
+        ({"room": room_id}, len(room.connections))
+        for room_id, room in ROOMS.items()
+        if room.connections
+    ],
+)
+REGISTRY.gauge(
+    "arena_outbound_queued_messages",
+    "Messages waiting in per-connection outbound queues.",
+    lambda: sum(len(conn) for room in ROOMS.values() for conn in room.connections),
+)
+REGISTRY.gauge(
+    "arena_llm_queue_depth",
+    "LLM calls waiting for admission.",
+    lambda: LLM_CLIENT.queue_depth(),
+)
+REGISTRY.gauge(
+    "arena_llm_in_flight", "LLM calls currently admitted.", lambda: LLM_CLIENT.stats()["inFlight"]
+)
+REGISTRY.gauge(
+    "arena_question_pool_size",
+    "Prefetched questions per difficulty level.",
+    lambda: [
+        ({"level": str(level)}, len(bucket))
+        for level, bucket in QUESTION_CACHE.buckets.items()
+    ],
+)
+REGISTRY.gauge(
+    "arena_game_clock_scheduled", "Timers pending on the game clock.", lambda: len(GAME_CLOCK)
+)
+REGISTRY.gauge(
+    "arena_report_queue_depth",
+    "Report jobs waiting for a worker.",
+    lambda: REPORT_QUEUE.stats()["queued"],
+)
+REGISTRY.gauge(
+    "arena_settlement_queued_games",
+    "Finished games waiting to be batched for payout.",
+    lambda: SETTLEMENT.stats()["queuedGames"],
+)
+REGISTRY.gauge(
+    "arena_chain_index_lag_blocks",
+    "Blocks between the chain head and the last indexed block.",
+    lambda: CHAIN_INDEX.stats()["lagBlocks"],
+)
+REGISTRY.gauge(
+    "arena_state_pending_writes",
+    "Writes buffered by the state backend and not yet flushed.",
+    lambda: STATE.stats().get("pending", 0),
+)
 
 
 class ReportRequest(BaseModel):
     wrong_words: list[str] = []
     score: int | None = None
+    room_id: str | None = None
 
 
 class ScoreEntry(BaseModel):
@@ -276,202 +736,508 @@ class RoomCreateRequest(BaseModel):
     reset: bool = True
 
 
+@app.on_event("startup")
+async def start_background_workers() -> None:
+    coordinator = get_coordinator()
+    if coordinator is not None and STATE.name == "memory":
+        # Entry claims, summaries and reward records must be visible to every
+        # shard; a per-process memory backend would let each shard diverge.
+        raise RuntimeError("SHARD_NODES requires a shared STATE_BACKEND (sqlite or redis)")
+    await STATE.start()
+    if coordinator is not None and not coordinator.is_local(SETTLEMENT_OWNER_KEY):
+        SETTLEMENT.forward_to(coordinator.http_url(SETTLEMENT_OWNER_KEY, SETTLEMENT_FORWARD_PATH))
+    await SETTLEMENT.start()
+    await CHAIN_INDEX.start()
+    GAME_CLOCK.start()
+    LIFECYCLE.start()
+    LOOP_LAG.start()
+    REPORT_QUEUE.start()
+    if QUESTION_POOL_ENABLED:
+        QUESTION_CACHE.start()
+
+
+@app.on_event("shutdown")
+async def stop_background_workers() -> None:
+    await QUESTION_CACHE.stop()
+    await REPORT_QUEUE.stop()
+    await LLM_CLIENT.close()
+    LIFECYCLE.stop()
+    LOOP_LAG.stop()
+    await GAME_CLOCK.stop()
+    for room in ROOMS.values():
+        await STATE.put("room", room.room_id, room.to_record())
+    await SETTLEMENT.stop()
+    await CHAIN_INDEX.stop()
+    await STATE.close()
+
+
 @app.get("/health")
 def health() -> dict:
     return {"ok": True}
 
 
-@app.post("/match")
-def match(player_id: str) -> dict:
+@app.get("/stats")
+def stats() -> dict:
+    return {
+        "questionPool": QUESTION_CACHE.stats(),
+        "questionBank": QUESTION_BANK.stats(),
+        "judgeCache": judge_cache_stats(),
+        "llm": llm_stats(),
+        "reports": REPORT_QUEUE.stats(),
+        "settlement": SETTLEMENT.stats(),
+        "chainIndex": CHAIN_INDEX.stats(),
+        "walletAuth": WALLET_AUTH.stats(),
+        "state": STATE.stats(),
+        "rooms": LIFECYCLE.stats(),
+        "clock": GAME_CLOCK.stats(),
+    }
+
+
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+def _shard_redirect(room_id: str, http_request: Request) -> RedirectResponse | None:
+    coordinator = get_coordinator()
+    if coordinator is None or coordinator.is_local(room_id):
+        return None
+    path = http_request.url.path
+    if http_request.url.query:
+        path = f"{path}?{http_request.url.query}"
+    url = coordinator.http_url(room_id, path)
+    return RedirectResponse(url, status_code=307) if url else None
+
+
+@app.get("/shards/{room_id}")
+def shard_for_room(room_id: str) -> dict:
+    coordinator = get_coordinator()
+    if coordinator is None:
+        return {"room_id": room_id, "shard_id": None, "local": True}
+    node = coordinator.owner(room_id)
+    return {
+        "room_id": room_id,
+        "shard_id": node.shard_id if node else None,
+        "local": coordinator.is_local(room_id),
+        "http_url": coordinator.http_url(room_id, ""),
+        "ws_url": coordinator.ws_url(room_id),
+    }
+
+
+@app.post("/match", response_model=None)
+def match(player_id: str, http_request: Request) -> dict | RedirectResponse:
+    redirect = _shard_redirect("arena", http_request)
+    if redirect is not None:
+        return redirect
     room = ROOMS["arena"]
     room.join(player_id)
     return {"room_id": "arena", "players": list(room.players.keys())}
 
 
-@app.post("/rooms/{room_id}")
-def create_room(room_id: str, request: RoomCreateRequest | None = None) -> dict:
-    room = ROOMS.get(room_id)
+@app.post("/rooms/{room_id}", response_model=None)
+async def create_room(
+    room_id: str, http_request: Request, request: RoomCreateRequest | None = None
+) -> dict | RedirectResponse:
+    redirect = _shard_redirect(room_id, http_request)
+    if redirect is not None:
+        return redirect
+    room = ROOMS.get(room_id) or await _restore_room(room_id)
     if room is None:
         if request and request.duration_seconds:
             room = RoomState(room_id, duration_seconds=request.duration_seconds)
         else:
             room = RoomState(room_id)
-        ROOMS[room_id] = room
+        await _add_room(room)
     if request is None or request.reset:
         if not room.connections:
             room.reset()
     return {"ok": True, "room_id": room_id}
 
 
-@app.post("/rooms/{room_id}/reset")
-def reset_room(room_id: str) -> dict:
+@app.get("/rooms/{room_id}/leaderboard", response_model=None)
+def leaderboard(
+    room_id: str, http_request: Request, k: int = 10
+) -> dict | RedirectResponse:
+    redirect = _shard_redirect(room_id, http_request)
+    if redirect is not None:
+        return redirect
+    room = ROOMS.get(room_id)
+    if room is None:
+        return {"ok": False}
+    return {"ok": True, "room_id": room_id, "top": room.top_k(max(0, k))}
+
+
+@app.post("/rooms/{room_id}/reset", response_model=None)
+async def reset_room(room_id: str, http_request: Request) -> dict | RedirectResponse:
+    redirect = _shard_redirect(room_id, http_request)
+    if redirect is not None:
+        return redirect
     room = ROOMS.get(room_id)
     if room is None:
-        ROOMS[room_id] = RoomState(room_id)
+        await _add_room(RoomState(room_id))
     else:
         room.reset()
     return {"ok": True, "room_id": room_id}
 
 
-@app.post("/report")
-async def report(request: ReportRequest) -> dict:
-    text = await generate_report(request.wrong_words, request.score)
-    return {"text": text}
+@app.post("/report", response_model=None)
+async def report(request: ReportRequest, http_request: Request) -> dict | RedirectResponse:
+    # Returns at once; poll GET /report/{jobId}?room_id=... or listen on the
+    # room socket. Jobs live on the shard that owns the room.
+    redirect = _shard_redirect(request.room_id or "arena", http_request)
+    if redirect is not None:
+        return redirect
+    job = REPORT_QUEUE.submit(request.wrong_words, request.score, request.room_id)
+    return job.to_payload()
+
+
+@app.get("/report/{job_id}", response_model=None)
+async def report_status(
+    job_id: str, http_request: Request, room_id: str | None = None
+) -> dict | RedirectResponse:
+    redirect = _shard_redirect(room_id or "arena", http_request)
+    if redirect is not None:
+        return redirect
+    job = REPORT_QUEUE.get(job_id)
+    if job is None:
+        return {"ok": False}
+    return job.to_payload()
 
 
-@app.get("/reward")
-def reward() -> dict:
-    return {"amount": "0.8 ETH"}
+@app.get("/reward", response_model=None)
+async def reward(
+    http_request: Request, player_id: str | None = None, room_id: str | None = None
+) -> dict | RedirectResponse:
+    # The payout computed for the player's last finished game and where its
+    # settlement stands. The settlement owner shard records every reward;
+    # with settlement off they stay on the shard that ran the game.
+    route_key = SETTLEMENT_OWNER_KEY if SETTLEMENT.enabled else room_id or "arena"
+    redirect = _shard_redirect(route_key, http_request)
+    if redirect is not None:
+        return redirect
+    if player_id is None:
+        return {"ok": False}
+    entry = await SETTLEMENT.reward(player_id)
+    if entry is None:
+        return {"ok": False}
+    return entry
 
 
-@app.post("/summary")
-def save_summary(payload: SummaryPayload) -> dict:
-    SUMMARY_BY_PLAYER[payload.player_id] = payload
+@app.post(SETTLEMENT_FORWARD_PATH)
+async def settlement_games(http_request: Request, response: Response) -> dict:
+    # Shards that do not own the settlement sender hand finished games here.
+    body = await http_request.body()
+    if not SETTLEMENT.accepts(body, http_request.headers.get(SETTLEMENT_SIGNATURE_HEADER)):
+        response.status_code = 403
+        return {"ok": False, "error": "not the settlement owner or bad signature"}
+    await SETTLEMENT.accept_forwarded(json.loads(body))
     return {"ok": True}
 
 
-@app.get("/summary/{player_id}")
-def get_summary(player_id: str) -> SummaryPayload | dict:
-    summary = SUMMARY_BY_PLAYER.get(player_id)
+def _pool_cache_headers(response: Response) -> None:
+    # Served from the in-memory index, which only changes once per poll.
+    response.headers["Cache-Control"] = f"public, max-age={int(CHAIN_INDEX.poll_seconds)}"
+
+
+@app.get("/pool")
+def pool(response: Response) -> dict:
+    _pool_cache_headers(response)
+    return CHAIN_INDEX.summary()
+
+
+@app.post("/pool/challenge/{address}")
+def pool_challenge(address: str) -> dict:
+    # Sign the returned message with the wallet and send it with the join.
+    if not is_address(address):
+        return {"ok": False, "error": "invalid address"}
+    nonce, message = WALLET_AUTH.issue(address)
+    return {
+        "ok": True,
+        "address": address.lower(),
+        "nonce": nonce,
+        "message": message,
+        "expiresIn": WALLET_AUTH.ttl_seconds,
+    }
+
+
+@app.get("/pool/{address}")
+def pool_player(address: str, response: Response) -> dict:
+    _pool_cache_headers(response)
+    return CHAIN_INDEX.player(address)
+
+
+def _summary_key(player_id: str) -> str:
+    # Summaries are per player, so they are pinned to a shard by player id.
+    return f"player:{player_id}"
+
+
+@app.post("/summary", response_model=None)
+async def save_summary(
+    payload: SummaryPayload, http_request: Request
+) -> dict | RedirectResponse:
+    redirect = _shard_redirect(_summary_key(payload.player_id), http_request)
+    if redirect is not None:
+        return redirect
+    await STATE.put("summary", payload.player_id, payload.model_dump())
+    return {"ok": True}
+
+
+@app.get("/summary/{player_id}", response_model=None)
+async def get_summary(
+    player_id: str, http_request: Request
+) -> SummaryPayload | dict | RedirectResponse:
+    redirect = _shard_redirect(_summary_key(player_id), http_request)
+    if redirect is not None:
+        return redirect
+    summary = await STATE.get("summary", player_id)
     if summary is None:
         return {"ok": False}
-    return summary
+    return SummaryPayload(**summary)
+
+
+async def _send_question(
+    room: RoomState, conn: OutboundConnection, player_id: str, question: LlmQuestion
+) -> None:
+    conn.send_event(question_event(question))
+
+    async def expire() -> None:
+        # An unanswered question counts as a wrong (empty) answer.
+        await _handle_submit(
+            room, conn, player_id, "", question.id, require_current=True
+        )
+
+    room.arm_answer_deadline(player_id, expire)
+
+
+async def _handle_submit(
+    room: RoomState,
+    conn: OutboundConnection,
+    player_id: str,
+    answer: str,
+    question_id: str,
+    require_current: bool = False,
+) -> None:
+    player_state = room.players.get(player_id)
+    if player_state is None:
+        return
+    async with room.turn_lock(player_id):
+        if room.game_over or not player_state.alive:
+            return
+        expected: Optional[LlmQuestion] = player_state.last_question
+        if require_current and (expected is None or expected.id != question_id):
+            return
+        if expected is None or expected.id != question_id:
+            expected = QUESTION_BANK.get(question_id)
+
+        started = time.perf_counter()
+        room.prefetch_next(player_id)
+        correct = False
+        if expected is not None:
+            result = await judge_answer(expected, answer, room_id=room.room_id)
+            if result is not None:
+                correct = result.correct
+            else:
+                correct = answer.strip().lower() == expected.answer.lower()
+        judged = time.perf_counter()
+        _STAGE_JUDGE.observe(judged - started)
+        total_score, difficulty_increased, new_difficulty = room.apply_answer(
+            player_id, correct
+        )
+        _STAGE_APPLY.observe(time.perf_counter() - judged)
+        conn.send_event(
+            {
+                "type": "result",
+                "payload": {
+                    "correct": correct,
+                    "scoreDelta": 10 if correct else 0,
+                    "totalScore": total_score,
+                },
+            }
+        )
+        if difficulty_increased:
+            # Queued words were never marked seen, so they can come up again.
+            player_state.question_queue.clear()
+            conn.send_event(
+                {
+                    "type": "notice",
+                    "payload": {"message": f"Difficulty increased to {new_difficulty}."},
+                }
+            )
+
+        if not correct:
+            survived = random.random() > 0.5
+            outcome = "alive" if survived else "dead"
+            message = "LUCKY! You survived." if survived else "YOU DIED."
+            conn.send_event(
+                {"type": "trigger", "payload": {"outcome": outcome, "message": message}}
+            )
+            if not survived:
+                room.mark_dead(player_id)
+                room.mark_changed(player_id)
+                await room.maybe_finish_last_alive()
+                _STAGE_TOTAL.observe(time.perf_counter() - started)
+                return
+
+        fetch_started = time.perf_counter()
+        question = await room.next_question(player_id)
+        _STAGE_NEXT_QUESTION.observe(time.perf_counter() - fetch_started)
+        await _send_question(room, conn, player_id, question)
+        room.mark_changed(player_id)
+        await room.maybe_finish_last_alive()
+        _STAGE_TOTAL.observe(time.perf_counter() - started)
+
+
+class ClientSession:
+    def __init__(self, room: RoomState, conn: OutboundConnection) -> None:
+        self.room = room
+        self.conn = conn
+        self.player_id = "unknown"
+
+    def _verified_address(self, message: JoinMessage) -> Optional[str]:
+        # An address alone is public; only a signed challenge ties the join
+        # to the wallet that deposited and will be paid.
+        if message.address is None or message.signature is None:
+            return None
+        if not WALLET_AUTH.verify(message.address, message.nonce, message.signature):
+            return None
+        return message.address.lower()
+
+    async def _claim_entry(self, address: Optional[str], player_id: str) -> bool:
+        room = self.room
+        if not CHAIN_INDEX.enabled:
+            # Fail closed: without an indexer no deposit can be proven, and
+            # letting everyone in free would defeat DEPOSIT_REQUIRED.
+            self.conn.send_event(
+                error_event(DepositRequired("deposits cannot be verified right now"))
+            )
+            return False
+        if address is None:
+            self.conn.send_event(
+                error_event(WalletUnverified("join requires a signed wallet challenge"))
+            )
+            return False
+        owner = room.entrants.get(address)
+        if owner is not None and owner != player_id:
+            self.conn.send_event(
+                error_event(DepositRequired("this wallet already entered this game"))
+            )
+            return False
+        entry_key = room.entry_key()
+        if not CHAIN_INDEX.has_entry(address, entry_key):
+            if not (
+                await CHAIN_INDEX.wait_for_deposit(address)
+                and await CHAIN_INDEX.claim_entry(address, entry_key)
+            ):
+                self.conn.send_event(
+                    error_event(DepositRequired("join requires a GamePool deposit"))
+                )
+                return False
+        room.entrants[address] = player_id
+        return True
+
+    async def on_join(self, message: JoinMessage) -> None:
+        room = self.room
+        address = self._verified_address(message)
+        if DEPOSIT_REQUIRED and not room.game_over:
+            if not await self._claim_entry(address, message.player_id):
+                return
+        self.player_id = message.player_id
+        room.join(self.player_id)
+        if address is not None:
+            room.players[self.player_id].payout_address = address
+        room.start_timer()
+        question = await room.next_question(self.player_id)
+        await _send_question(room, self.conn, self.player_id, question)
+        self.conn.send(room.snapshot_message(self.conn.framing), PRIORITY_LOW)
+        room.mark_changed(self.player_id)
+        if room.game_over:
+            self.conn.send_event(
+                {
+                    "type": "game_over",
+                    "payload": {
+                        "winnerId": room.winner_id,
+                        "reason": "ended",
+                        "roomId": room.room_id,
+                        **room.snapshot(),
+                    },
+                }
+            )
+
+    async def on_resync(self, _message: ResyncMessage) -> None:
+        self.conn.send(self.room.snapshot_message(self.conn.framing), PRIORITY_LOW)
+
+    async def on_report(self, message: ReportMessage) -> None:
+        conn = self.conn
+        job = REPORT_QUEUE.submit(
+            message.wrong_words,
+            message.score,
+            room_id=self.room.room_id,
+            listener=lambda done: conn.send_event(done.to_event()),
+        )
+        if job.status != STATUS_DONE:
+            conn.send_event(job.to_event())
+
+    async def on_submit(self, message: SubmitMessage) -> None:
+        self.room.cancel_answer_deadline(self.player_id)
+        await _handle_submit(
+            self.room, self.conn, self.player_id, message.answer, message.question_id
+        )
+
+    async def dispatch(self, message: ClientMessage) -> None:
+        await _HANDLERS[type(message)](self, message)
+
+
+_HANDLERS: Dict[type, Callable[[ClientSession, Any], Awaitable[None]]] = {
+    JoinMessage: ClientSession.on_join,
+    ResyncMessage: ClientSession.on_resync,
+    SubmitMessage: ClientSession.on_submit,
+    ReportMessage: ClientSession.on_report,
+}
 
 
 @app.websocket("/ws/{room_id}")
 async def websocket_endpoint(websocket: WebSocket, room_id: str) -> None:
-    await websocket.accept()
-    room = ROOMS.get(room_id)
+    framing = negotiate(websocket.scope.get("subprotocols") or ())
+    await websocket.accept(subprotocol=framing.subprotocol)
+    coordinator = get_coordinator()
+    if coordinator is not None and not coordinator.is_local(room_id):
+        # Sticky routing: every socket for a room lands on its owning shard.
+        await websocket.send_text(
+            dumps({"type": "redirect", "payload": {"url": coordinator.ws_url(room_id)}})
+        )
+        await websocket.close(code=4307)
+        return
+    room = ROOMS.get(room_id) or await _restore_room(room_id)
     if room is None:
         await websocket.close(code=1008)
         return
 
-    player_id = "unknown"
-    room.connect(websocket)
+    conn = OutboundConnection(
+        websocket, snapshot=partial(room.snapshot_message, framing), framing=framing
+    )
+    conn.start()
+    room.connect(conn)
+    session = ClientSession(room, conn)
     try:
         while True:
-            message = await websocket.receive_text()
-            payload = json.loads(message)
-            msg_type = payload.get("type")
-
-            if msg_type == "join":
-                player_id = payload["payload"]["playerId"]
-                room.join(player_id)
-                room.start_timer()
-                question = await room.next_question(player_id)
-                await websocket.send_text(
-                    json.dumps({"type": "question", "payload": question.__dict__})
-                )
-                await room.broadcast(
-                    {
-                        "type": "room",
-                        "payload": {"roomId": room_id, **room.snapshot()},
-                    }
-                )
-                if room.game_over:
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "type": "game_over",
-                                "payload": {
-                                    "winnerId": room.winner_id,
-                                    "reason": "ended",
-                                    "roomId": room_id,
-                                    **room.snapshot(),
-                                },
-                            }
-                        )
-                    )
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                return
+            data = frame.get("bytes")
+            if data is None:
+                data = frame.get("text") or ""
+            try:
+                message = framing.decode(data)
+            except ProtocolError as exc:
+                # A bad frame is the client's problem, not the connection's.
+                conn.send_event(error_event(exc))
                 continue
-
-            if msg_type == "submit":
-                if room.game_over:
-                    continue
-                answer = payload["payload"]["answer"]
-                question_id = payload["payload"]["questionId"]
-                player_state = room.players.get(player_id)
-                if player_state is None or not player_state.alive:
-                    continue
-                expected: Optional[LlmQuestion] = room.last_question.get(player_id)
-                if expected is None or expected.id != question_id:
-                    expected = next(
-                        (q for q in QUESTION_POOL if q.id == question_id), None
-                    )
-
-                correct = False
-                if expected is not None:
-                    result = await judge_answer(expected, answer)
-                    if result is not None:
-                        correct = result.correct
-                    else:
-                        correct = (
-                            answer.strip().lower() == expected.answer.lower()
-                        )
-                total_score, difficulty_increased, new_difficulty = room.apply_answer(
-                    player_id, correct
-                )
-                await websocket.send_text(
-                    json.dumps(
-                        {
-                            "type": "result",
-                            "payload": {
-                                "correct": correct,
-                                "scoreDelta": 10 if correct else 0,
-                                "totalScore": total_score,
-                            },
-                        }
-                    )
-                )
-                if difficulty_increased:
-                    room.question_queue[player_id] = []
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "type": "notice",
-                                "payload": {
-                                    "message": (
-                                        f"Difficulty increased to {new_difficulty}."
-                                    )
-                                },
-                            }
-                        )
-                    )
-
-                if not correct:
-                    survived = random.random() > 0.5
-                    outcome = "alive" if survived else "dead"
-                    message = "LUCKY! You survived." if survived else "YOU DIED."
-                    await websocket.send_text(
-                        json.dumps(
-                            {
-                                "type": "trigger",
-                                "payload": {"outcome": outcome, "message": message},
-                            }
-                        )
-                    )
-                    if not survived:
-                        room.mark_dead(player_id)
-                        await room.broadcast(
-                            {
-                                "type": "room",
-                                "payload": {"roomId": room_id, **room.snapshot()},
-                            }
-                        )
-                        await room.maybe_finish_last_alive()
-                        continue
-
-                question = await room.next_question(player_id)
-                await websocket.send_text(
-                    json.dumps({"type": "question", "payload": question.__dict__})
-                )
-                await room.broadcast(
-                    {
-                        "type": "room",
-                        "payload": {"roomId": room_id, **room.snapshot()},
-                    }
-                )
-                await room.maybe_finish_last_alive()
+            await session.dispatch(message)
     except WebSocketDisconnect:
         return
     finally:
-        room.disconnect(websocket)
+        room.cancel_answer_deadline(session.player_id)
+        room.disconnect(conn)
+        await conn.close()
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import math
+import os
+import time
+from bisect import bisect_left
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+from app.scheduler import GAME_CLOCK, TimerHandle
+
+
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("METRICS_LOOP_LAG_INTERVAL_SECONDS", "0.5"))
+
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+LLM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 15.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items())
+    return "{" + inner + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(labels)
+        self._children: Dict[LabelValues, Any] = {}
+
+    def _key(self, args: tuple, kwargs: dict) -> LabelValues:
+        if kwargs:
+            return tuple(str(kwargs[name]) for name in self.label_names)
+        return tuple(str(value) for value in args)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self) -> None:
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def labels(self, *args: str, **kwargs: str) -> _CounterChild:
+        key = self._key(args, kwargs)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = _CounterChild()
+        return child
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, child in self._children.items():
+            labels = _format_labels(dict(zip(self.label_names, key)))
+            lines.append(f"{self.name}{labels} {_format_value(child.value)}")
+        return lines
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # One bisect and three adds; cumulative counts are built at scrape time.
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def labels(self, *args: str, **kwargs: str) -> _HistogramChild:
+        key = self._key(args, kwargs)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = _HistogramChild(self.buckets)
+        return child
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, child in self._children.items():
+            base = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                labels = _format_labels({**base, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(base)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+GaugeValue = Union[float, Iterable[Sample]]
+M = TypeVar("M", bound=_Metric)
+
+
+class Gauge(_Metric):
+    # Read at scrape time from a callback, so nothing runs on the hot path.
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        read: Callable[[], GaugeValue],
+        labels: Sequence[str] = (),
+    ) -> None:
+        super().__init__(name, help_text, labels)
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        value = self.read()
+        samples: Iterable[Sample] = (
+            [({}, value)] if isinstance(value, (int, float)) else value
+        )
+        for labels, sample in samples:
+            lines.append(f"{self.name}{_format_labels(labels)} {_format_value(sample)}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: M) -> M:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def gauge(
+        self,
+        name: str,
+        help_text: str,
+        read: Callable[[], GaugeValue],
+        labels: Sequence[str] = (),
+    ) -> Gauge:
+        return self.register(Gauge(name, help_text, read, labels))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # One broken gauge callback must not take down the scrape.
+                continue
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+SUBMIT_STAGE_SECONDS = REGISTRY.histogram(
+    "arena_submit_stage_seconds",
+    "Time spent in each stage of handling a submit.",
+    labels=("stage",),
+)
+BROADCAST_SECONDS = REGISTRY.histogram(
+    "arena_broadcast_seconds", "Time to encode and enqueue one room broadcast."
+)
+BROADCAST_RECIPIENTS = REGISTRY.counter(
+    "arena_broadcast_recipients_total", "Messages enqueued by room broadcasts."
+)
+QUESTION_PREFETCH = REGISTRY.counter(
+    "arena_question_prefetch_total",
+    "Speculative next-question refills by outcome.",
+    labels=("outcome",),
+)
+LLM_CALL_SECONDS = REGISTRY.histogram(
+    "arena_llm_call_seconds",
+    "End-to-end LLM call latency per operation, including hedges and retries.",
+    labels=("op",),
+    buckets=LLM_BUCKETS,
+)
+LLM_CALLS = REGISTRY.counter(
+    "arena_llm_calls_total", "LLM calls per operation and outcome.", labels=("op", "outcome")
+)
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "arena_event_loop_lag_seconds",
+    "How late the game clock fired a periodic probe.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+class LoopLagMonitor:
+    # Schedules a probe on the game clock and measures how late it fires; a
+    # busy event loop shows up as lag before it shows up as slow turns.
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_SECONDS) -> None:
+        self.interval = interval
+        self.last_lag = 0.0
+        self._handle: Optional[TimerHandle] = None
+
+    def start(self) -> None:
+        if self._handle is None:
+            self._schedule()
+
+    def stop(self) -> None:
+        GAME_CLOCK.cancel(self._handle)
+        self._handle = None
+
+    def _schedule(self) -> None:
+        self._handle = GAME_CLOCK.call_later(self.interval, self._probe)
+
+    def _probe(self) -> None:
+        handle = self._handle
+        if handle is None:
+            return
+        self.last_lag = max(0.0, time.monotonic() - handle.deadline)
+        EVENT_LOOP_LAG_SECONDS.observe(self.last_lag)
+        self._schedule()
+
+
+LOOP_LAG = LoopLagMonitor()
+REGISTRY.gauge(
+    "arena_event_loop_lag_last_seconds",
+    "Lag measured by the most recent event-loop probe.",
+    lambda: LOOP_LAG.last_lag,
+)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional
+
+from app.protocol import JSON_FRAMING, Framing
+
+
+PRIORITY_HIGH = 0
+PRIORITY_LOW = 1
+
+SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "2"))
+OUTBOUND_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "64"))
+OUTBOUND_LOW_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_LOW_QUEUE_SIZE", "4"))
+OUTBOUND_OVERFLOW_GRACE_SECONDS = float(
+    os.getenv("WS_OUTBOUND_OVERFLOW_GRACE_SECONDS", "5")
+)
+
+# Room state frames can be coalesced; everything else is a turn event the
+# player must see in order.
+LOW_PRIORITY_TYPES = frozenset({"room", "room_delta"})
+
+
+def priority_for(event_type: Optional[str]) -> int:
+    return PRIORITY_LOW if event_type in LOW_PRIORITY_TYPES else PRIORITY_HIGH
+
+
+class OutboundConnection:
+    def __init__(
+        self,
+        websocket: Any,
+        snapshot: Optional[Callable[[], str | bytes]] = None,
+        framing: Framing = JSON_FRAMING,
+        max_size: int = OUTBOUND_QUEUE_SIZE,
+        max_low: int = OUTBOUND_LOW_QUEUE_SIZE,
+        overflow_grace: float = OUTBOUND_OVERFLOW_GRACE_SECONDS,
+    ) -> None:
+        self.websocket = websocket
+        self.snapshot = snapshot
+        self.framing = framing
+        self.max_size = max(1, max_size)
+        self.max_low = max(1, max_low)
+        self.overflow_grace = overflow_grace
+        self._high: Deque[str | bytes] = deque()
+        self._low: Deque[str | bytes] = deque()
+        self._needs_snapshot = False
+        self._ready = asyncio.Event()
+        self._writer: asyncio.Task | None = None
+        self._overflow_since: float | None = None
+        self.closed = False
+        self.sent = 0
+        self.coalesced = 0
+        self.overflows = 0
+
+    def __len__(self) -> int:
+        return len(self._high) + len(self._low) + int(self._needs_snapshot)
+
+    def start(self) -> None:
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._run_writer())
+
+    def send_event(self, event: Dict[str, Any]) -> bool:
+        return self.send(self.framing.encode(event), priority_for(event.get("type")))
+
+    def send(self, message: str | bytes, priority: int = PRIORITY_HIGH) -> bool:
+        if self.closed:
+            return False
+        if priority == PRIORITY_LOW:
+            self._enqueue_low(message)
+        else:
+            if not self._check_capacity():
+                return False
+            self._high.append(message)
+        self._ready.set()
+        return True
+
+    def _enqueue_low(self, message: str | bytes) -> None:
+        if self._needs_snapshot:
+            self.coalesced += 1
+            return
+        if len(self._low) >= self.max_low and self.snapshot is not None:
+            # Too far behind on room updates: drop them and send one fresh
+            # full snapshot when the writer catches up.
+            self.coalesced += len(self._low) + 1
+            self._low.clear()
+            self._needs_snapshot = True
+            return
+        if len(self._low) >= self.max_low:
+            self._low.popleft()
+            self.coalesced += 1
+        self._low.append(message)
+
+    def _check_capacity(self) -> bool:
+        if len(self._high) < self.max_size:
+            self._overflow_since = None
+            return True
+        self.overflows += 1
+        now = time.monotonic()
+        if self._overflow_since is None:
+            self._overflow_since = now
+        if (
+            now - self._overflow_since >= self.overflow_grace
+            or len(self._high) >= self.max_size * 2
+        ):
+            asyncio.create_task(self.close(code=1013))
+            return False
+        return True
+
+    def _next_message(self) -> Optional[str | bytes]:
+        if self._high:
+            return self._high.popleft()
+        if self._needs_snapshot:
+            self._needs_snapshot = False
+            return self.snapshot() if self.snapshot else None
+        if self._low:
+            return self._low.popleft()
+        return None
+
+    async def _run_writer(self) -> None:
+        try:
+            while not self.closed:
+                await self._ready.wait()
+                self._ready.clear()
+                while not self.closed:
+                    message = self._next_message()
+                    if message is None:
+                        break
+                    if isinstance(message, bytes):
+                        send = self.websocket.send_bytes(message)
+                    else:
+                        send = self.websocket.send_text(message)
+                    await asyncio.wait_for(send, SEND_TIMEOUT_SECONDS)
+                    self.sent += 1
+                    if len(self._high) < self.max_size:
+                        self._overflow_since = None
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            await self.close(code=1011)
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._ready.set()
+        writer = self._writer
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "overflows": self.overflows,
+        }
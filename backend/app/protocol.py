@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Optional, Union
+
+from app.codec import dumps, loads
+from app.llm_agent import LlmQuestion
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except Exception:  # pragma: no cover - optional dependency guard
+    msgpack = None  # type: ignore
+    MSGPACK_AVAILABLE = False
+
+
+MAX_PLAYER_ID_LENGTH = 128
+MAX_ANSWER_LENGTH = 128
+MAX_QUESTION_ID_LENGTH = 128
+MAX_REPORT_WORDS = 64
+
+_ADDRESS_PATTERN = re.compile(r"^0x[0-9a-fA-F]{40}$")
+_SIGNATURE_PATTERN = re.compile(r"^0x[0-9a-fA-F]{130}$")
+_NONCE_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def is_address(value: object) -> bool:
+    return isinstance(value, str) and bool(_ADDRESS_PATTERN.match(value))
+
+
+class ProtocolError(Exception):
+    code = "bad_message"
+
+
+class UnknownMessageType(ProtocolError):
+    code = "unknown_type"
+
+
+class DepositRequired(ProtocolError):
+    code = "deposit_required"
+
+
+class WalletUnverified(ProtocolError):
+    code = "wallet_unverified"
+
+
+@dataclass(frozen=True, slots=True)
+class JoinMessage:
+    player_id: str
+    address: Optional[str] = None
+    signature: Optional[str] = None
+    nonce: Optional[str] = None
+
+
+@dataclass(frozen=True, slots=True)
+class SubmitMessage:
+    question_id: str
+    answer: str
+
+
+@dataclass(frozen=True, slots=True)
+class ResyncMessage:
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class ReportMessage:
+    wrong_words: tuple[str, ...]
+    score: Optional[int]
+
+
+ClientMessage = Union[JoinMessage, SubmitMessage, ResyncMessage, ReportMessage]
+
+
+def _string(
+    payload: Dict[str, Any], key: str, max_length: int, allow_empty: bool = False
+) -> str:
+    value = payload.get(key)
+    if not isinstance(value, str) or len(value) > max_length:
+        raise ProtocolError(f"payload.{key} must be a string of at most {max_length} chars")
+    if not value and not allow_empty:
+        raise ProtocolError(f"payload.{key} must not be empty")
+    return value
+
+
+def _parse_join(payload: Dict[str, Any]) -> JoinMessage:
+    address = payload.get("address")
+    if address is not None and not is_address(address):
+        raise ProtocolError("payload.address must be a 0x-prefixed 20-byte hex address")
+    signature = payload.get("signature")
+    if signature is not None and (
+        not isinstance(signature, str) or not _SIGNATURE_PATTERN.match(signature)
+    ):
+        raise ProtocolError("payload.signature must be a 0x-prefixed 65-byte hex signature")
+    if signature is not None and address is None:
+        raise ProtocolError("payload.signature requires payload.address")
+    nonce = payload.get("nonce")
+    if nonce is not None and (not isinstance(nonce, str) or not _NONCE_PATTERN.match(nonce)):
+        raise ProtocolError("payload.nonce must be a 32-char hex challenge nonce")
+    return JoinMessage(
+        player_id=_string(payload, "playerId", MAX_PLAYER_ID_LENGTH),
+        address=address,
+        signature=signature,
+        nonce=nonce,
+    )
+
+
+def _parse_submit(payload: Dict[str, Any]) -> SubmitMessage:
+    return SubmitMessage(
+        question_id=_string(payload, "questionId", MAX_QUESTION_ID_LENGTH),
+        answer=_string(payload, "answer", MAX_ANSWER_LENGTH, allow_empty=True),
+    )
+
+
+def _parse_resync(_payload: Dict[str, Any]) -> ResyncMessage:
+    return ResyncMessage()
+
+
+def _parse_report(payload: Dict[str, Any]) -> ReportMessage:
+    words = payload.get("wrongWords")
+    if words is None:
+        words = []
+    if (
+        not isinstance(words, list)
+        or len(words) > MAX_REPORT_WORDS
+        or not all(
+            isinstance(word, str) and len(word) <= MAX_ANSWER_LENGTH for word in words
+        )
+    ):
+        raise ProtocolError(
+            f"payload.wrongWords must be a list of at most {MAX_REPORT_WORDS} strings"
+        )
+    score = payload.get("score")
+    if score is not None and (not isinstance(score, int) or isinstance(score, bool)):
+        raise ProtocolError("payload.score must be an integer")
+    return ReportMessage(wrong_words=tuple(words), score=score)
+
+
+# New client message types register a parser here and a handler in main.
+PARSERS: Dict[str, Callable[[Dict[str, Any]], ClientMessage]] = {
+    "join": _parse_join,
+    "submit": _parse_submit,
+    "resync": _parse_resync,
+    "report": _parse_report,
+}
+
+
+def parse_message(data: Any) -> ClientMessage:
+    if not isinstance(data, dict):
+        raise ProtocolError("message must be an object")
+    msg_type = data.get("type")
+    parser = PARSERS.get(msg_type) if isinstance(msg_type, str) else None
+    if parser is None:
+        raise UnknownMessageType(f"unknown message type: {msg_type!r}")
+    payload = data.get("payload")
+    if payload is None:
+        payload = {}
+    if not isinstance(payload, dict):
+        raise ProtocolError("payload must be an object")
+    return parser(payload)
+
+
+class Framing:
+    name = "json"
+    subprotocol: Optional[str] = None
+
+    def encode(self, event: Dict[str, Any]) -> str | bytes:
+        return dumps(event)
+
+    def decode(self, data: str | bytes) -> ClientMessage:
+        # Text frames are always JSON, whatever was negotiated.
+        try:
+            raw = loads(data) if isinstance(data, str) else self._decode_binary(data)
+        except ProtocolError:
+            raise
+        except Exception as exc:
+            raise ProtocolError("frame is not valid JSON or MessagePack") from exc
+        return parse_message(raw)
+
+    def _decode_binary(self, data: bytes) -> Any:
+        return loads(data)
+
+
+class MsgpackFraming(Framing):
+    name = "msgpack"
+    subprotocol = "arena.msgpack"
+
+    def encode(self, event: Dict[str, Any]) -> str | bytes:
+        return msgpack.packb(event, use_bin_type=True)
+
+    def _decode_binary(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+class JsonFraming(Framing):
+    subprotocol = "arena.json"
+
+
+JSON_FRAMING = Framing()
+FRAMINGS: Dict[str, Framing] = {"arena.json": JsonFraming()}
+if MSGPACK_AVAILABLE:
+    FRAMINGS["arena.msgpack"] = MsgpackFraming()
+
+
+def negotiate(requested: Iterable[str]) -> Framing:
+    # Clients list subprotocols in preference order; plain JSON otherwise.
+    for name in requested:
+        framing = FRAMINGS.get(name)
+        if framing is not None:
+            return framing
+    return JSON_FRAMING
+
+
+def question_event(question: LlmQuestion) -> Dict[str, Any]:
+    return {
+        "type": "question",
+        "payload": {
+            "id": question.id,
+            "prompt": question.prompt,
+            "answer": question.answer,
+            "difficulty": question.difficulty,
+            "topic": question.topic,
+        },
+    }
+
+
+def error_event(error: ProtocolError) -> Dict[str, Any]:
+    return {"type": "error", "payload": {"code": error.code, "message": str(error)}}
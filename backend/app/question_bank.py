@@ -0,0 +1,271 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+from pathlib import Path
+from typing import Container, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.codec import dumps, loads
+from app.llm_agent import (
+    MAX_BATCH_SIZE,
+    LlmQuestion,
+    generate_questions,
+    question_from_item,
+)
+
+
+QUESTION_BANK_PATH = os.getenv(
+    "QUESTION_BANK_PATH", str(Path(__file__).parent / "data" / "question_bank.jsonl")
+)
+
+MIN_DIFFICULTY = 1
+MAX_DIFFICULTY = 5
+
+# Used only when the bank file is missing, so there is always something to ask.
+BUILTIN_QUESTIONS = [
+    LlmQuestion(id="q1", prompt="拼写: 机会", answer="chance", difficulty=1, topic="basic"),
+    LlmQuestion(id="q2", prompt="拼写: 危险", answer="danger", difficulty=1, topic="basic"),
+    LlmQuestion(id="q3", prompt="拼写: 生存", answer="survival", difficulty=1, topic="basic"),
+]
+
+
+def _coprime_stride(size: int, rng: random.Random) -> int:
+    if size <= 2:
+        return 1
+    while True:
+        stride = rng.randrange(1, size)
+        if math.gcd(stride, size) == 1:
+            return stride
+
+
+class BankCursor:
+    # Walks each (level, topic) list as a random permutation: a random start
+    # plus a stride coprime with the list size visits every entry once before
+    # repeating, with O(1) state per list instead of a shuffled copy.
+    __slots__ = ("_orders",)
+
+    def __init__(self) -> None:
+        self._orders: Dict[Tuple[int, Optional[str]], List[int]] = {}
+
+    def next_index(
+        self, key: Tuple[int, Optional[str]], size: int, rng: random.Random
+    ) -> int:
+        order = self._orders.get(key)
+        if order is None or order[3] != size or order[2] >= size:
+            order = [rng.randrange(size), _coprime_stride(size, rng), 0, size]
+            self._orders[key] = order
+        start, stride, drawn, _ = order
+        order[2] = drawn + 1
+        return (start + drawn * stride) % size
+
+
+class QuestionBank:
+    def __init__(self, questions: Iterable[LlmQuestion] = ()) -> None:
+        self._by_id: Dict[str, LlmQuestion] = {}
+        self._answers: set[str] = set()
+        self._by_level: Dict[int, List[LlmQuestion]] = {}
+        self._by_level_topic: Dict[Tuple[int, str], List[LlmQuestion]] = {}
+        self._rng = random.Random()
+        for question in questions:
+            self.add(question)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[LlmQuestion]:
+        return iter(self._by_id.values())
+
+    def add(self, question: LlmQuestion) -> bool:
+        if question.id in self._by_id or question.answer in self._answers:
+            return False
+        self._by_id[question.id] = question
+        self._answers.add(question.answer)
+        self._by_level.setdefault(question.difficulty, []).append(question)
+        self._by_level_topic.setdefault(
+            (question.difficulty, question.topic), []
+        ).append(question)
+        return True
+
+    def get(self, question_id: str) -> Optional[LlmQuestion]:
+        return self._by_id.get(question_id)
+
+    def has_answer(self, answer: str) -> bool:
+        return answer.lower() in self._answers
+
+    def topics(self, difficulty: int) -> list[str]:
+        return sorted(topic for level, topic in self._by_level_topic if level == difficulty)
+
+    def _levels_near(self, difficulty: int) -> list[int]:
+        return sorted(self._by_level, key=lambda level: (abs(level - difficulty), level))
+
+    def sample(
+        self,
+        difficulty: int,
+        cursor: BankCursor,
+        topic: Optional[str] = None,
+        exclude: Container[str] = (),
+    ) -> Optional[LlmQuestion]:
+        # Nearest populated level first; within a level the cursor never
+        # repeats until the player has seen every entry.
+        fallback: Optional[LlmQuestion] = None
+        for level in self._levels_near(difficulty):
+            candidates = (
+                self._by_level_topic.get((level, topic))
+                if topic is not None
+                else self._by_level[level]
+            )
+            if not candidates:
+                continue
+            for _ in range(len(candidates)):
+                idx = cursor.next_index((level, topic), len(candidates), self._rng)
+                question = candidates[idx]
+                if question.answer not in exclude:
+                    return question
+                fallback = fallback or question
+        if fallback is None and topic is not None:
+            return self.sample(difficulty, cursor, exclude=exclude)
+        return fallback
+
+    @classmethod
+    def load(cls, path: str = QUESTION_BANK_PATH) -> "QuestionBank":
+        try:
+            handle = open(path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return cls(BUILTIN_QUESTIONS)
+        bank = cls()
+        with handle:
+            for line in handle:
+                line = line.strip()
+                if not line:
+                    continue
+                question = question_from_item(loads(line), MIN_DIFFICULTY, "basic")
+                if question is not None:
+                    bank.add(question)
+        return bank if len(bank) else cls(BUILTIN_QUESTIONS)
+
+    def save(self, path: str = QUESTION_BANK_PATH) -> None:
+        ordered = sorted(self._by_id.values(), key=lambda q: (q.difficulty, q.id))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            for question in ordered:
+                handle.write(
+                    dumps(
+                        {
+                            "id": question.id,
+                            "prompt": question.prompt,
+                            "answer": question.answer,
+                            "difficulty": question.difficulty,
+                            "topic": question.topic,
+                        }
+                    )
+                )
+                handle.write("\n")
+        os.replace(tmp_path, path)
+
+    def next_id(self, difficulty: int) -> str:
+        count = len(self._by_level.get(difficulty, ()))
+        while True:
+            count += 1
+            question_id = f"b{difficulty}-{count:03d}"
+            if question_id not in self._by_id:
+                return question_id
+
+    def stats(self) -> dict:
+        return {
+            "questions": len(self),
+            "byLevel": {
+                str(level): len(items) for level, items in sorted(self._by_level.items())
+            },
+        }
+
+
+QUESTION_BANK = QuestionBank.load()
+
+
+def _is_valid_harvest(question: LlmQuestion, level: int) -> bool:
+    if question.difficulty != level:
+        return False
+    # Prompts are Chinese glosses; reject ones that leak the answer.
+    if question.answer in question.prompt.lower():
+        return False
+    return any("一" <= char <= "鿿" for char in question.prompt)
+
+
+async def harvest(
+    bank: QuestionBank,
+    levels: Iterable[int],
+    per_level: int,
+    topic: str = "basic_vocab",
+    max_attempts: int = 10,
+) -> Dict[int, int]:
+    added: Dict[int, int] = {}
+    for level in levels:
+        added[level] = 0
+        attempts = 0
+        while added[level] < per_level and attempts < max_attempts:
+            attempts += 1
+            batch = await generate_questions(
+                level,
+                topic=topic,
+                count=min(MAX_BATCH_SIZE, per_level - added[level]),
+                player_id="harvest",
+            )
+            if not batch:
+                break
+            for question in batch:
+                if not _is_valid_harvest(question, level) or bank.has_answer(
+                    question.answer
+                ):
+                    continue
+                question.id = bank.next_id(level)
+                if bank.add(question):
+                    added[level] += 1
+                if added[level] >= per_level:
+                    break
+    return added
+
+
+def _parse_levels(spec: str) -> list[int]:
+    levels: list[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if "-" in part:
+            low, high = part.split("-", 1)
+            levels.extend(range(int(low), int(high) + 1))
+        elif part:
+            levels.append(int(part))
+    return [level for level in levels if MIN_DIFFICULTY <= level <= MAX_DIFFICULTY]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inspect or grow the offline question bank.")
+    parser.add_argument("--path", default=QUESTION_BANK_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Print question counts per level.")
+    grow = commands.add_parser("harvest", help="Add validated LLM-generated questions.")
+    grow.add_argument("--levels", default="1-5")
+    grow.add_argument("--per-level", type=int, default=20)
+    grow.add_argument("--topic", default="basic_vocab")
+    args = parser.parse_args()
+
+    bank = QuestionBank.load(args.path)
+    if args.command == "stats":
+        print(dumps(bank.stats()))
+        return
+
+    added = asyncio.run(
+        harvest(bank, _parse_levels(args.levels), args.per_level, topic=args.topic)
+    )
+    if not any(added.values()):
+        print("No questions harvested; is the LLM configured?", file=sys.stderr)
+        sys.exit(1)
+    bank.save(args.path)
+    print(dumps({"added": {str(k): v for k, v in added.items()}, **bank.stats()}))
+
+
+if __name__ == "__main__":
+    main()
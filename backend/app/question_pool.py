@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import uuid
+from collections import deque
+from typing import Container, Deque, Dict, Iterable, Optional
+
+from app.llm_agent import (
+    MAX_BATCH_SIZE,
+    LlmQuestion,
+    generate_questions,
+    llm_configured,
+)
+
+
+MIN_DIFFICULTY = 1
+MAX_DIFFICULTY = 5
+
+POOL_LOW_WATERMARK = int(os.getenv("QUESTION_POOL_LOW", "4"))
+POOL_HIGH_WATERMARK = int(os.getenv("QUESTION_POOL_HIGH", "12"))
+POOL_RETRY_SECONDS = float(os.getenv("QUESTION_POOL_RETRY_SECONDS", "5"))
+POOL_MAX_RETRY_SECONDS = float(os.getenv("QUESTION_POOL_MAX_RETRY_SECONDS", "300"))
+
+
+def clamp_difficulty(difficulty: int) -> int:
+    return max(MIN_DIFFICULTY, min(MAX_DIFFICULTY, difficulty))
+
+
+async def generate_unique_questions(
+    player_id: str,
+    difficulty: int,
+    count: int,
+    exclude: Iterable[LlmQuestion] = (),
+    max_attempts: int = 4,
+    room_id: Optional[str] = None,
+    seen: Container[str] = (),
+) -> list[LlmQuestion]:
+    if count <= 0:
+        return []
+    seen_ids: set[str] = set()
+    seen_prompts: set[str] = set()
+    seen_answers: set[str] = set()
+    for question in exclude:
+        seen_ids.add(question.id)
+        seen_prompts.add(question.prompt)
+        seen_answers.add(question.answer.lower())
+
+    results: list[LlmQuestion] = []
+    pending: set[asyncio.Task] = set()
+    requested = 0
+    attempts = 0
+    exhausted = False
+    try:
+        while len(results) < count:
+            # Each call asks for a whole batch; only split across several
+            # concurrent calls when the shortfall exceeds the batch size.
+            while (
+                not exhausted
+                and attempts < max_attempts
+                and requested < count - len(results)
+            ):
+                attempts += 1
+                batch = min(MAX_BATCH_SIZE, count - len(results) - requested)
+                requested += batch
+                task = asyncio.create_task(
+                    generate_questions(
+                        difficulty, count=batch, player_id=player_id, room_id=room_id
+                    )
+                )
+                task.requested = batch  # type: ignore[attr-defined]
+                pending.add(task)
+            if not pending:
+                break
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                requested -= task.requested  # type: ignore[attr-defined]
+                try:
+                    candidates = task.result()
+                except Exception:
+                    candidates = []
+                if not candidates:
+                    # Provider unavailable: stop issuing, let in-flight calls land.
+                    exhausted = True
+                    continue
+                for candidate in candidates:
+                    if (
+                        candidate.prompt in seen_prompts
+                        or candidate.answer.lower() in seen_answers
+                        or candidate.answer in seen
+                    ):
+                        continue
+                    if len(results) >= count:
+                        break
+                    if candidate.id in seen_ids:
+                        candidate.id = f"q_{uuid.uuid4().hex[:8]}"
+                    seen_ids.add(candidate.id)
+                    seen_prompts.add(candidate.prompt)
+                    seen_answers.add(candidate.answer.lower())
+                    results.append(candidate)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return results
+
+
+class QuestionPool:
+    def __init__(
+        self,
+        low_watermark: int = POOL_LOW_WATERMARK,
+        high_watermark: int = POOL_HIGH_WATERMARK,
+    ) -> None:
+        self.low_watermark = max(0, low_watermark)
+        self.high_watermark = max(self.low_watermark + 1, high_watermark)
+        self.buckets: Dict[int, Deque[LlmQuestion]] = {
+            level: deque() for level in range(MIN_DIFFICULTY, MAX_DIFFICULTY + 1)
+        }
+        self._prompts: Dict[int, set[str]] = {
+            level: set() for level in self.buckets
+        }
+        self._wakeups: Dict[int, asyncio.Event] = {}
+        self._workers: list[asyncio.Task] = []
+        self.hits = 0
+        self.misses = 0
+        self.refills = 0
+        self.refill_failures = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        # Without an LLM every refill fails; misses fall through to the bank.
+        if not llm_configured():
+            return
+        for level in self.buckets:
+            self._wakeups[level] = asyncio.Event()
+            self._wakeups[level].set()
+            self._workers.append(asyncio.create_task(self._run_worker(level)))
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        for task in workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._wakeups.clear()
+
+    def take(
+        self, difficulty: int, seen: Container[str] = ()
+    ) -> Optional[LlmQuestion]:
+        level = clamp_difficulty(difficulty)
+        bucket = self.buckets[level]
+        question: Optional[LlmQuestion] = None
+        for _ in range(len(bucket)):
+            candidate = bucket.popleft()
+            if candidate.answer not in seen:
+                question = candidate
+                self._prompts[level].discard(question.prompt)
+                break
+            # Someone else may still need it: rotate it to the back.
+            bucket.append(candidate)
+        if question is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        if len(bucket) < self.low_watermark:
+            self._wake(level)
+        return question
+
+    def put(self, question: LlmQuestion) -> bool:
+        level = clamp_difficulty(question.difficulty)
+        if len(self.buckets[level]) >= self.high_watermark:
+            return False
+        if question.prompt in self._prompts[level]:
+            return False
+        self.buckets[level].append(question)
+        self._prompts[level].add(question.prompt)
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "running": self.running,
+            "lowWatermark": self.low_watermark,
+            "highWatermark": self.high_watermark,
+            "buckets": {str(level): len(bucket) for level, bucket in self.buckets.items()},
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": (self.hits / lookups) if lookups else 0.0,
+            "refills": self.refills,
+            "refillFailures": self.refill_failures,
+        }
+
+    def _wake(self, level: int) -> None:
+        event = self._wakeups.get(level)
+        if event is not None:
+            event.set()
+
+    async def _run_worker(self, level: int) -> None:
+        event = self._wakeups[level]
+        failures = 0
+        while True:
+            await event.wait()
+            event.clear()
+            while len(self.buckets[level]) < self.high_watermark:
+                bucket = self.buckets[level]
+                needed = self.high_watermark - len(bucket)
+                generated = await generate_unique_questions(
+                    "pool", level, needed, exclude=list(bucket)
+                )
+                added = 0
+                for candidate in generated:
+                    candidate.difficulty = level
+                    if self.put(candidate):
+                        added += 1
+                self.refills += added
+                if added:
+                    failures = 0
+                    continue
+                # Nothing generated, or only duplicates of what is pooled:
+                # back off exponentially instead of hammering the LLM.
+                self.refill_failures += 1
+                delay = POOL_RETRY_SECONDS * (2 ** min(failures, 16))
+                failures += 1
+                await asyncio.sleep(min(POOL_MAX_RETRY_SECONDS, delay))
+
+
+QUESTION_CACHE = QuestionPool()
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.cache import TTLCache
+from app.llm_agent import fallback_report, generate_model_report
+
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_QUEUE_SIZE = int(os.getenv("REPORT_QUEUE_SIZE", "1024"))
+REPORT_SCORE_BUCKET = int(os.getenv("REPORT_SCORE_BUCKET", "10"))
+REPORT_CACHE_ENTRIES = int(os.getenv("REPORT_CACHE_ENTRIES", "2048"))
+REPORT_CACHE_TTL_SECONDS = float(os.getenv("REPORT_CACHE_TTL_SECONDS", "3600"))
+REPORT_JOB_ENTRIES = int(os.getenv("REPORT_JOB_ENTRIES", "4096"))
+REPORT_JOB_TTL_SECONDS = float(os.getenv("REPORT_JOB_TTL_SECONDS", "900"))
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+
+ReportKey = Tuple[Tuple[str, ...], Optional[int]]
+
+
+def report_key(wrong_words: Iterable[str], score: Optional[int]) -> ReportKey:
+    # Order and case of the wrong words do not change the report, and scores
+    # within one bucket read the same, so they share a single generation.
+    words = tuple(sorted({word.strip().lower() for word in wrong_words if word.strip()}))
+    if score is None:
+        return words, None
+    bucket = max(1, REPORT_SCORE_BUCKET)
+    return words, (score // bucket) * bucket
+
+
+@dataclass(slots=True)
+class ReportJob:
+    id: str
+    key: ReportKey
+    status: str = STATUS_PENDING
+    text: Optional[str] = None
+    created_at: float = field(default_factory=time.monotonic)
+    room_id: Optional[str] = None
+    listeners: List[Callable[["ReportJob"], None]] = field(default_factory=list)
+
+    def to_payload(self) -> dict:
+        return {
+            "jobId": self.id,
+            "roomId": self.room_id,
+            "status": self.status,
+            "text": self.text,
+        }
+
+    def to_event(self) -> dict:
+        return {"type": "report", "payload": self.to_payload()}
+
+
+class ReportQueue:
+    # A fixed set of workers drains the queue, so a whole room finishing at
+    # once costs at most REPORT_WORKERS concurrent LLM calls instead of one
+    # per player.
+    def __init__(
+        self,
+        workers: int = REPORT_WORKERS,
+        max_queued: int = REPORT_QUEUE_SIZE,
+    ) -> None:
+        self.worker_count = max(1, workers)
+        self.max_queued = max(1, max_queued)
+        self._queue: Optional[asyncio.Queue[ReportJob]] = None
+        self._workers: list[asyncio.Task] = []
+        self._jobs: TTLCache[ReportJob] = TTLCache(
+            REPORT_JOB_ENTRIES, REPORT_JOB_TTL_SECONDS
+        )
+        self._results: TTLCache[str] = TTLCache(
+            REPORT_CACHE_ENTRIES, REPORT_CACHE_TTL_SECONDS
+        )
+        self._pending: Dict[ReportKey, ReportJob] = {}
+        self._overflow: set[asyncio.Task] = set()
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.overflowed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(self.max_queued)
+        for _ in range(self.worker_count):
+            self._workers.append(asyncio.create_task(self._run_worker()))
+
+    async def stop(self) -> None:
+        workers, self._workers = self._workers, []
+        for task in workers:
+            task.cancel()
+        for task in workers:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._queue = None
+
+    def submit(
+        self,
+        wrong_words: Iterable[str],
+        score: Optional[int],
+        room_id: Optional[str] = None,
+        listener: Optional[Callable[[ReportJob], None]] = None,
+    ) -> ReportJob:
+        self.submitted += 1
+        key = report_key(wrong_words, score)
+        job = ReportJob(id=f"r_{uuid.uuid4().hex[:12]}", key=key, room_id=room_id)
+        cached = self._results.get(key)
+        if cached is not None:
+            job.status = STATUS_DONE
+            job.text = cached
+            self._jobs.set(job.id, job)
+            if listener is not None:
+                listener(job)
+            return job
+
+        # Identical requests already queued share that job and its id.
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.deduplicated += 1
+            if listener is not None:
+                pending.listeners.append(listener)
+            return pending
+
+        if listener is not None:
+            job.listeners.append(listener)
+        self._jobs.set(job.id, job)
+        self._pending[key] = job
+        if self._queue is None or self._queue.full():
+            # No workers or a full backlog: run it directly rather than drop it.
+            self.overflowed += 1
+            task = asyncio.create_task(self._complete(job))
+            self._overflow.add(task)
+            task.add_done_callback(self._overflow.discard)
+        else:
+            self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        return self._jobs.get(job_id)
+
+    async def _complete(self, job: ReportJob) -> None:
+        words, bucket = job.key
+        try:
+            text = await generate_model_report(list(words), bucket, room_id=job.room_id)
+        except Exception:
+            text = None
+        finally:
+            self._pending.pop(job.key, None)
+        if text is None:
+            # Never leave a job pending: answer with the canned report, but
+            # do not cache it so the next request tries the model again.
+            self.failed += 1
+            text = fallback_report(list(words))
+        else:
+            self._results.set(job.key, text)
+        job.text = text
+        job.status = STATUS_DONE
+        self.completed += 1
+        listeners, job.listeners = job.listeners, []
+        for listener in listeners:
+            try:
+                listener(job)
+            except Exception:
+                continue
+
+    async def _run_worker(self) -> None:
+        queue = self._queue
+        assert queue is not None
+        while True:
+            job = await queue.get()
+            try:
+                await self._complete(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # _complete already falls back; anything else is a bug in
+                # one job and must not stop the worker.
+                continue
+            finally:
+                queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workers": self.worker_count,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "completed": self.completed,
+            "overflowed": self.overflowed,
+            "failed": self.failed,
+            "jobs": len(self._jobs),
+            "cache": self._results.stats(),
+        }
+
+
+REPORT_QUEUE = ReportQueue()
@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+from app.metrics import LLM_CALL_SECONDS, LLM_CALLS
+
+
+T = TypeVar("T")
+
+LLM_TIMEOUTS = {
+    "generate_question": float(os.getenv("LLM_TIMEOUT_GENERATE_SECONDS", "10")),
+    "judge_answer": float(os.getenv("LLM_TIMEOUT_JUDGE_SECONDS", "3")),
+    "generate_report": float(os.getenv("LLM_TIMEOUT_REPORT_SECONDS", "15")),
+}
+LLM_DEFAULT_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "10"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "1") != "0"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+RETRY_BUDGET_RATIO = float(os.getenv("LLM_RETRY_BUDGET_RATIO", "0.2"))
+RETRY_BUDGET_MAX = float(os.getenv("LLM_RETRY_BUDGET_MAX", "10"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "2"))
+
+
+class LlmUnavailable(Exception):
+    pass
+
+
+class LlmOverloaded(LlmUnavailable):
+    # Admission control turned the call away before it reached the model.
+    # That says nothing about the model's health, so it never feeds the
+    # circuit breaker.
+    pass
+
+
+class _Admission:
+    __slots__ = ("queued", "admitted")
+
+    def __init__(self) -> None:
+        self.queued = False
+        self.admitted = False
+
+    @property
+    def refused(self) -> bool:
+        # Only calls that went through admission control can be refused.
+        return self.queued and not self.admitted
+
+
+# Set per guarded call and inherited by its attempt tasks, so the guard can
+# tell a call that timed out in the admission queue from one the model was
+# slow to answer.
+_ADMISSION: ContextVar[Optional[_Admission]] = ContextVar("llm_admission", default=None)
+
+
+def mark_queued() -> None:
+    admission = _ADMISSION.get()
+    if admission is not None:
+        admission.queued = True
+
+
+def mark_admitted() -> None:
+    admission = _ADMISSION.get()
+    if admission is not None:
+        admission.admitted = True
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200) -> None:
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(fraction * len(ordered)))
+        return ordered[idx]
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        reset_seconds: float = CIRCUIT_RESET_SECONDS,
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = self.HALF_OPEN
+        # Half-open: let exactly one probe through.
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release(self) -> None:
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class RetryBudget:
+    # Every call earns a fraction of a token and every retry or hedge spends
+    # a whole one, so extra load stays a bounded share of normal traffic.
+    def __init__(
+        self, ratio: float = RETRY_BUDGET_RATIO, max_tokens: float = RETRY_BUDGET_MAX
+    ) -> None:
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+
+    def deposit(self) -> None:
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class _OpStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.overloaded = 0
+        self.short_circuits = 0
+        self.hedges = 0
+        self.retries = 0
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker()
+
+
+class ResilientCaller:
+    def __init__(self) -> None:
+        self._ops: Dict[str, _OpStats] = {}
+        self.budget = RetryBudget()
+
+    def _op(self, op: str) -> _OpStats:
+        stats = self._ops.get(op)
+        if stats is None:
+            stats = self._ops[op] = _OpStats()
+        return stats
+
+    async def call(self, op: str, attempt: Callable[[], Awaitable[T]]) -> T:
+        stats = self._op(op)
+        stats.calls += 1
+        if not stats.breaker.allow():
+            stats.short_circuits += 1
+            LLM_CALLS.labels(op, "short_circuit").inc()
+            raise LlmUnavailable(f"{op}: circuit open")
+        self.budget.deposit()
+        timeout = LLM_TIMEOUTS.get(op, LLM_DEFAULT_TIMEOUT_SECONDS)
+        started = time.perf_counter()
+        admission = _Admission()
+        token = _ADMISSION.set(admission)
+        try:
+            result = await asyncio.wait_for(self._attempts(stats, attempt), timeout)
+        except asyncio.TimeoutError:
+            if admission.refused:
+                self._overloaded(op, stats, started)
+                raise LlmOverloaded(f"{op}: not admitted within {timeout}s")
+            stats.timeouts += 1
+            stats.failures += 1
+            stats.breaker.record_failure()
+            self._observe(op, "timeout", started)
+            raise LlmUnavailable(f"{op}: timed out after {timeout}s")
+        except LlmUnavailable as exc:
+            if admission.refused:
+                self._overloaded(op, stats, started)
+                raise LlmOverloaded(str(exc)) from exc
+            stats.failures += 1
+            stats.breaker.record_failure()
+            self._observe(op, "error", started)
+            raise
+        except asyncio.CancelledError:
+            stats.breaker.release()
+            raise
+        finally:
+            _ADMISSION.reset(token)
+        stats.successes += 1
+        stats.breaker.record_success()
+        self._observe(op, "success", started)
+        return result
+
+    def _overloaded(self, op: str, stats: _OpStats, started: float) -> None:
+        # No attempt ever reached the model: shed load, not a model failure.
+        stats.overloaded += 1
+        stats.breaker.release()
+        self._observe(op, "overloaded", started)
+
+    @staticmethod
+    def _observe(op: str, outcome: str, started: float) -> None:
+        LLM_CALL_SECONDS.labels(op).observe(time.perf_counter() - started)
+        LLM_CALLS.labels(op, outcome).inc()
+
+    def _hedge_delay(self, stats: _OpStats) -> Optional[float]:
+        if not LLM_HEDGE_ENABLED or len(stats.latency) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return stats.latency.percentile(LLM_HEDGE_PERCENTILE)
+
+    async def _attempts(self, stats: _OpStats, attempt: Callable[[], Awaitable[T]]) -> T:
+        pending: set[asyncio.Task] = set()
+        started: Dict[asyncio.Task, float] = {}
+        launched = 0
+        last_error: Optional[BaseException] = None
+
+        def launch() -> None:
+            nonlocal launched
+            launched += 1
+            task = asyncio.ensure_future(attempt())
+            started[task] = time.monotonic()
+            pending.add(task)
+
+        launch()
+        try:
+            while pending:
+                hedge_delay = (
+                    self._hedge_delay(stats) if launched < LLM_MAX_ATTEMPTS else None
+                )
+                done, _ = await asyncio.wait(
+                    pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Slower than the usual tail: race a second request.
+                    if self.budget.withdraw():
+                        stats.hedges += 1
+                        launch()
+                    else:
+                        await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        stats.latency.record(time.monotonic() - started[task])
+                        return task.result()
+                    last_error = task.exception()
+                if (
+                    not pending
+                    and launched < LLM_MAX_ATTEMPTS
+                    # Retrying into a full admission queue only adds to it.
+                    and not isinstance(last_error, LlmOverloaded)
+                    and self.budget.withdraw()
+                ):
+                    stats.retries += 1
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise LlmUnavailable(str(last_error) if last_error else "no attempts succeeded")
+
+    def stats(self) -> dict:
+        return {
+            "retryBudget": round(self.budget.tokens, 2),
+            "ops": {
+                op: {
+                    "calls": stats.calls,
+                    "successes": stats.successes,
+                    "failures": stats.failures,
+                    "timeouts": stats.timeouts,
+                    "overloaded": stats.overloaded,
+                    "shortCircuits": stats.short_circuits,
+                    "hedges": stats.hedges,
+                    "retries": stats.retries,
+                    "p95Seconds": stats.latency.percentile(0.95),
+                    "circuit": stats.breaker.state,
+                }
+                for op, stats in self._ops.items()
+            },
+        }
+
+
+LLM_GUARD = ResilientCaller()
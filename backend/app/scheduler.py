@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import inspect
+import time
+from typing import Any, Callable, Optional
+
+
+class TimerHandle:
+    __slots__ = (
+        "deadline",
+        "seq",
+        "callback",
+        "args",
+        "interval",
+        "cancelled",
+        "scheduled",
+    )
+
+    def __init__(
+        self,
+        deadline: float,
+        seq: int,
+        callback: Callable[..., Any],
+        args: tuple,
+        interval: Optional[float] = None,
+    ) -> None:
+        self.deadline = deadline
+        self.seq = seq
+        self.callback = callback
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+        self.scheduled = True
+
+    def __lt__(self, other: "TimerHandle") -> bool:
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+
+class GameClock:
+    # One task drives every room deadline, answer timeout and periodic tick.
+    # Cancellation is lazy: cancelled handles are skipped when they surface
+    # and the heap is compacted once they outnumber the live ones.
+    def __init__(self) -> None:
+        self._heap: list[TimerHandle] = []
+        self._seq = 0
+        self._cancelled = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._callbacks: set[asyncio.Task] = set()
+        self.fired = 0
+        self.errors = 0
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._cancelled
+
+    def call_at(
+        self, deadline: float, callback: Callable[..., Any], *args: Any
+    ) -> TimerHandle:
+        return self._push(deadline, callback, args, None)
+
+    def call_later(
+        self, delay: float, callback: Callable[..., Any], *args: Any
+    ) -> TimerHandle:
+        return self._push(time.monotonic() + max(0.0, delay), callback, args, None)
+
+    def call_every(
+        self, interval: float, callback: Callable[..., Any], *args: Any
+    ) -> TimerHandle:
+        return self._push(time.monotonic() + interval, callback, args, interval)
+
+    def reschedule(self, handle: TimerHandle, deadline: float) -> TimerHandle:
+        self.cancel(handle)
+        return self._push(deadline, handle.callback, handle.args, handle.interval)
+
+    def cancel(self, handle: Optional[TimerHandle]) -> None:
+        if handle is None or handle.cancelled:
+            return
+        handle.cancel()
+        if not handle.scheduled:
+            return
+        self._cancelled += 1
+        if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+            for entry in self._heap:
+                if entry.cancelled:
+                    entry.scheduled = False
+            self._heap = [entry for entry in self._heap if not entry.cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "scheduled": len(self),
+            "fired": self.fired,
+            "errors": self.errors,
+            "runningCallbacks": len(self._callbacks),
+        }
+
+    def _push(
+        self,
+        deadline: float,
+        callback: Callable[..., Any],
+        args: tuple,
+        interval: Optional[float],
+    ) -> TimerHandle:
+        self._seq += 1
+        handle = TimerHandle(deadline, self._seq, callback, args, interval)
+        heapq.heappush(self._heap, handle)
+        if self._heap[0] is handle:
+            self._wakeup.set()
+        self.start()
+        return handle
+
+    def _dispatch(self, handle: TimerHandle) -> None:
+        self.fired += 1
+        try:
+            result = handle.callback(*handle.args)
+        except Exception:
+            self.errors += 1
+            return
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self._callbacks.add(task)
+            task.add_done_callback(self._callback_done)
+
+    def _callback_done(self, task: asyncio.Task) -> None:
+        self._callbacks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    async def _run(self) -> None:
+        while True:
+            now = time.monotonic()
+            while self._heap and (self._heap[0].cancelled or self._heap[0].deadline <= now):
+                handle = heapq.heappop(self._heap)
+                handle.scheduled = False
+                if handle.cancelled:
+                    self._cancelled -= 1
+                    continue
+                if handle.interval is not None:
+                    handle.deadline = max(now, handle.deadline + handle.interval)
+                    handle.scheduled = True
+                    heapq.heappush(self._heap, handle)
+                self._dispatch(handle)
+            self._wakeup.clear()
+            timeout = self._heap[0].deadline - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+GAME_CLOCK = GameClock()
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+from collections import deque
+from typing import Deque
+
+
+SEEN_FILTER = os.getenv("SEEN_FILTER", "exact")
+SEEN_EXACT_LIMIT = int(os.getenv("SEEN_EXACT_LIMIT", "1024"))
+SEEN_BLOOM_CAPACITY = int(os.getenv("SEEN_BLOOM_CAPACITY", "2000"))
+SEEN_BLOOM_ERROR_RATE = float(os.getenv("SEEN_BLOOM_ERROR_RATE", "0.01"))
+
+
+class ExactSeenSet:
+    # Exact membership for short games; the oldest words are forgotten once
+    # the limit is reached so memory stays bounded.
+    __slots__ = ("limit", "_words", "_order")
+
+    def __init__(self, limit: int = SEEN_EXACT_LIMIT) -> None:
+        self.limit = max(1, limit)
+        self._words: set[str] = set()
+        self._order: Deque[str] = deque()
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def __contains__(self, word: object) -> bool:
+        return isinstance(word, str) and word.lower() in self._words
+
+    def add(self, word: str) -> None:
+        word = word.lower()
+        if word in self._words:
+            return
+        if len(self._order) >= self.limit:
+            self._words.discard(self._order.popleft())
+        self._words.add(word)
+        self._order.append(word)
+
+
+class _BloomGeneration:
+    __slots__ = ("bits", "count")
+
+    def __init__(self, size_bits: int) -> None:
+        self.bits = bytearray((size_bits + 7) // 8)
+        self.count = 0
+
+
+class BloomSeenSet:
+    # Fixed-size filter for long-lived players: no false negatives, and
+    # false positives (a fresh word treated as seen) only cost a skipped
+    # candidate. Two generations rotate so the error rate stays near the
+    # target however many words a player sees.
+    __slots__ = ("capacity", "size_bits", "hashes", "_current", "_previous")
+
+    def __init__(
+        self,
+        capacity: int = SEEN_BLOOM_CAPACITY,
+        error_rate: float = SEEN_BLOOM_ERROR_RATE,
+    ) -> None:
+        self.capacity = max(1, capacity)
+        error_rate = min(max(error_rate, 1e-6), 0.5)
+        self.size_bits = max(
+            8, int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        )
+        self.hashes = max(1, int(round(self.size_bits / self.capacity * math.log(2))))
+        self._current = _BloomGeneration(self.size_bits)
+        self._previous: _BloomGeneration | None = None
+
+    def __len__(self) -> int:
+        return self._current.count + (self._previous.count if self._previous else 0)
+
+    def _positions(self, word: str) -> list[int]:
+        digest = hashlib.blake2b(word.lower().encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [(first + idx * second) % self.size_bits for idx in range(self.hashes)]
+
+    @staticmethod
+    def _has(generation: _BloomGeneration, positions: list[int]) -> bool:
+        bits = generation.bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in positions)
+
+    def __contains__(self, word: object) -> bool:
+        if not isinstance(word, str):
+            return False
+        positions = self._positions(word)
+        if self._has(self._current, positions):
+            return True
+        return self._previous is not None and self._has(self._previous, positions)
+
+    def add(self, word: str) -> None:
+        positions = self._positions(word)
+        if self._has(self._current, positions):
+            return
+        if self._current.count >= self.capacity:
+            self._previous = self._current
+            self._current = _BloomGeneration(self.size_bits)
+        bits = self._current.bits
+        for pos in positions:
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self._current.count += 1
+
+
+SeenSet = ExactSeenSet | BloomSeenSet
+
+
+def new_seen_set(kind: str = SEEN_FILTER) -> SeenSet:
+    if kind == "bloom":
+        return BloomSeenSet()
+    return ExactSeenSet()
@@ -0,0 +1,592 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from app.storage import STATE, SqliteBackend, StateBackend
+
+try:
+    from web3 import Web3
+    WEB3_AVAILABLE = True
+except Exception:  # pragma: no cover - optional dependency guard
+    Web3 = None  # type: ignore
+    WEB3_AVAILABLE = False
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except Exception:  # pragma: no cover - optional dependency guard
+    httpx = None  # type: ignore
+    HTTPX_AVAILABLE = False
+
+
+SETTLEMENT_ENABLED = os.getenv("SETTLEMENT_ENABLED", "0") != "0"
+CHAIN_RPC_URL = os.getenv("CHAIN_RPC_URL", "http://127.0.0.1:8545")
+# Default matches the first contract a fresh Hardhat node deploys.
+GAMEPOOL_ADDRESS = os.getenv(
+    "GAMEPOOL_ADDRESS", "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+)
+SETTLEMENT_PRIVATE_KEY = os.getenv("SETTLEMENT_PRIVATE_KEY", "")
+# Fraction of the entry fees a game collected paid to each finishing place,
+# winner first; whatever the shares leave unpaid stays in the pool.
+SETTLEMENT_SHARES = os.getenv("SETTLEMENT_SHARES", "1")
+# Paid entrants a game needs before it pays out at all, so nobody can win
+# back their own entry (or more) by playing alone.
+SETTLEMENT_MIN_PLAYERS = int(os.getenv("SETTLEMENT_MIN_PLAYERS", "2"))
+SETTLEMENT_BATCH_SIZE = int(os.getenv("SETTLEMENT_BATCH_SIZE", "50"))
+SETTLEMENT_FLUSH_SECONDS = float(os.getenv("SETTLEMENT_FLUSH_SECONDS", "5"))
+SETTLEMENT_MAX_ATTEMPTS = int(os.getenv("SETTLEMENT_MAX_ATTEMPTS", "5"))
+SETTLEMENT_RETRY_SECONDS = float(os.getenv("SETTLEMENT_RETRY_SECONDS", "2"))
+SETTLEMENT_RECEIPT_TIMEOUT_SECONDS = float(
+    os.getenv("SETTLEMENT_RECEIPT_TIMEOUT_SECONDS", "120")
+)
+# Each retry of a stuck transaction raises its fees by this fraction so the
+# node accepts it as a replacement for the same nonce.
+SETTLEMENT_FEE_BUMP = float(os.getenv("SETTLEMENT_FEE_BUMP", "0.125"))
+# Where open batches and reward records live when STATE is the in-memory
+# cache, which may evict them.
+SETTLEMENT_SQLITE_PATH = os.getenv("SETTLEMENT_SQLITE_PATH", "settlement.db")
+# With sharding, only the shard owning this ring key signs transactions; the
+# others forward finished games to it so no two processes race one nonce.
+SETTLEMENT_OWNER_KEY = "settlement"
+SETTLEMENT_FORWARD_PATH = "/settlement/games"
+SETTLEMENT_SIGNATURE_HEADER = "X-Settlement-Signature"
+SETTLEMENT_FORWARD_TIMEOUT_SECONDS = float(
+    os.getenv("SETTLEMENT_FORWARD_TIMEOUT_SECONDS", "10")
+)
+
+STATUS_QUEUED = "queued"
+STATUS_SUBMITTED = "submitted"
+STATUS_SETTLED = "settled"
+STATUS_FAILED = "failed"
+STATUS_UNSETTLED = "unsettled"
+
+GAMEPOOL_ABI: List[Dict[str, Any]] = [
+    {
+        "type": "function",
+        "name": "batchPayout",
+        "stateMutability": "nonpayable",
+        "inputs": [
+            {"name": "batchId", "type": "bytes32"},
+            {"name": "recipients", "type": "address[]"},
+            {"name": "amounts", "type": "uint256[]"},
+        ],
+        "outputs": [],
+    },
+    {
+        "type": "function",
+        "name": "settledBatches",
+        "stateMutability": "view",
+        "inputs": [{"name": "", "type": "bytes32"}],
+        "outputs": [{"name": "", "type": "bool"}],
+    },
+]
+
+
+@dataclass(slots=True)
+class Payout:
+    player_id: str
+    address: str
+    amount_wei: int
+
+    def to_record(self) -> dict:
+        return {
+            "playerId": self.player_id,
+            "address": self.address,
+            "amountWei": str(self.amount_wei),
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Payout":
+        return cls(record["playerId"], record["address"], int(record["amountWei"]))
+
+
+@dataclass(slots=True)
+class GameResult:
+    # key identifies one finished game and doubles as its idempotency key.
+    key: str
+    room_id: str
+    payouts: List[Payout]
+
+    def to_record(self) -> dict:
+        return {
+            "key": self.key,
+            "roomId": self.room_id,
+            "payouts": [payout.to_record() for payout in self.payouts],
+        }
+
+    @classmethod
+    def from_record(cls, record: dict) -> "GameResult":
+        return cls(
+            record["key"],
+            record["roomId"],
+            [Payout.from_record(item) for item in record.get("payouts", [])],
+        )
+
+
+def parse_shares(spec: str) -> List[Decimal]:
+    shares = [Decimal(part.strip()) for part in spec.split(",") if part.strip()]
+    if any(share < 0 for share in shares) or sum(shares) > 1:
+        raise ValueError("settlement shares must be non-negative and sum to at most 1")
+    return shares
+
+
+# Parsed at import so a malformed SETTLEMENT_SHARES stops the server from
+# starting instead of failing every finished game.
+SETTLEMENT_SHARE_SPLIT = parse_shares(SETTLEMENT_SHARES)
+
+
+def compute_payouts(
+    ranked: Sequence[Tuple[str, Optional[str]]],
+    collected_wei: int,
+    shares: Sequence[Decimal] = (),
+    min_players: int = SETTLEMENT_MIN_PLAYERS,
+) -> List[Payout]:
+    # ranked is (player_id, address) by finishing place, paid entrants only;
+    # the prize is what those entries collected, never more. Places without
+    # a payout address are skipped and their share stays in the pot.
+    if len(ranked) < max(1, min_players) or collected_wei <= 0:
+        return []
+    shares = shares or SETTLEMENT_SHARE_SPLIT
+    payouts: List[Payout] = []
+    for (player_id, address), share in zip(ranked, shares):
+        amount = int(Decimal(collected_wei) * share)
+        if address and amount > 0:
+            payouts.append(Payout(player_id, address, amount))
+    return payouts
+
+
+def batch_id_for(game_keys: Sequence[str]) -> bytes:
+    # Derived from the games it settles, so a retried or resumed batch keeps
+    # the id the contract already knows.
+    return hashlib.sha256("\n".join(sorted(game_keys)).encode("utf-8")).digest()
+
+
+def format_eth(amount_wei: int) -> str:
+    value = (Decimal(amount_wei) / Decimal(10**18)).normalize()
+    return f"{value:f} ETH"
+
+
+def bump_fees(tx: Dict[str, Any], attempt: int) -> Dict[str, Any]:
+    # Strictly above the previous attempt, as nodes require of a replacement.
+    bump = 1 + SETTLEMENT_FEE_BUMP * attempt
+    for field_name in ("maxFeePerGas", "maxPriorityFeePerGas", "gasPrice"):
+        if field_name in tx:
+            tx[field_name] = int(tx[field_name] * bump) + 1
+    return tx
+
+
+class Web3PayoutClient:
+    def __init__(
+        self,
+        rpc_url: str = CHAIN_RPC_URL,
+        contract_address: str = GAMEPOOL_ADDRESS,
+        private_key: str = SETTLEMENT_PRIVATE_KEY,
+    ) -> None:
+        self._w3 = Web3(Web3.HTTPProvider(rpc_url, request_kwargs={"timeout": 30}))
+        self._account = self._w3.eth.account.from_key(private_key)
+        self._contract = self._w3.eth.contract(
+            address=Web3.to_checksum_address(contract_address), abi=GAMEPOOL_ABI
+        )
+        self._next_nonce: Optional[int] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def address(self) -> str:
+        return self._account.address
+
+    async def is_settled(self, batch_id: bytes) -> bool:
+        call = self._contract.functions.settledBatches(batch_id).call
+        return bool(await asyncio.to_thread(call))
+
+    async def send_batch(
+        self,
+        batch_id: bytes,
+        recipients: List[str],
+        amounts: List[int],
+        nonce: Optional[int] = None,
+        attempt: int = 0,
+    ) -> Tuple[str, int]:
+        # One sender at a time so locally assigned nonces never collide.
+        async with self._lock:
+            return await asyncio.to_thread(
+                self._send_sync, batch_id, recipients, amounts, nonce, attempt
+            )
+
+    def _send_sync(
+        self,
+        batch_id: bytes,
+        recipients: List[str],
+        amounts: List[int],
+        nonce: Optional[int],
+        attempt: int,
+    ) -> Tuple[str, int]:
+        eth = self._w3.eth
+        confirmed = eth.get_transaction_count(self.address, "latest")
+        fresh = nonce is None or nonce < confirmed
+        if fresh:
+            if self._next_nonce is None or self._next_nonce < confirmed:
+                self._next_nonce = eth.get_transaction_count(self.address, "pending")
+            nonce = self._next_nonce
+        # Otherwise the earlier send is still pending: replace it in place.
+        tx = self._contract.functions.batchPayout(
+            batch_id,
+            [Web3.to_checksum_address(address) for address in recipients],
+            amounts,
+        ).build_transaction(
+            {"from": self.address, "nonce": nonce, "chainId": eth.chain_id}
+        )
+        bump_fees(tx, attempt)
+        signed = self._account.sign_transaction(tx)
+        raw = getattr(signed, "raw_transaction", None) or signed.rawTransaction
+        try:
+            tx_hash = eth.send_raw_transaction(raw)
+        except Exception as exc:
+            if "nonce" in str(exc).lower():
+                # Our view of the account drifted; resync on the next send.
+                self._next_nonce = None
+            raise
+        if fresh:
+            self._next_nonce = nonce + 1
+        return tx_hash.hex(), nonce
+
+    async def wait_for_receipt(self, tx_hash: str, timeout: float) -> bool:
+        receipt = await asyncio.to_thread(
+            self._w3.eth.wait_for_transaction_receipt, tx_hash, timeout=timeout
+        )
+        return receipt["status"] == 1
+
+
+def create_payout_client() -> Optional[Web3PayoutClient]:
+    if not SETTLEMENT_ENABLED or not WEB3_AVAILABLE or not SETTLEMENT_PRIVATE_KEY:
+        return None
+    return Web3PayoutClient()
+
+
+def create_settlement_store(state: StateBackend = STATE) -> StateBackend:
+    # Open batches and rewards are money owed, so they never go into the
+    # evicting memory backend: a durable STATE is shared, otherwise
+    # settlement keeps its own SQLite file.
+    if not SETTLEMENT_ENABLED or state.name != "memory":
+        return state
+    return SqliteBackend(SETTLEMENT_SQLITE_PATH)
+
+
+class SettlementQueue:
+    # Finished games accumulate here and are paid out in batches, one
+    # transaction per SETTLEMENT_BATCH_SIZE games rather than per winner.
+    def __init__(
+        self,
+        client: Optional[Web3PayoutClient] = None,
+        store: Optional[StateBackend] = None,
+        batch_size: int = SETTLEMENT_BATCH_SIZE,
+        flush_seconds: float = SETTLEMENT_FLUSH_SECONDS,
+        max_attempts: int = SETTLEMENT_MAX_ATTEMPTS,
+        private_key: str = SETTLEMENT_PRIVATE_KEY,
+    ) -> None:
+        self.client = client
+        self.store = store if store is not None else STATE
+        # Forwarded games are authenticated with a key derived from the
+        # sender key every shard is already configured with.
+        self._forward_key = hashlib.sha256(
+            b"settlement-forward:" + private_key.encode("utf-8")
+        ).digest()
+        self.forward_url: Optional[str] = None
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = max(0.0, flush_seconds)
+        self.max_attempts = max(1, max_attempts)
+        self._queued: Deque[GameResult] = deque()
+        self._open: Dict[str, dict] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._submitting: set[asyncio.Task] = set()
+        self.games = 0
+        self.submit_errors = 0
+        self.forwarded = 0
+        self.forward_failures = 0
+        self.batches_settled = 0
+        self.batches_failed = 0
+        self.retries = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.client is not None
+
+    def forward_to(self, url: Optional[str]) -> None:
+        # Called before start on shards that do not own the sender.
+        self.forward_url = url
+
+    def sign(self, body: bytes) -> str:
+        return hmac.new(self._forward_key, body, hashlib.sha256).hexdigest()
+
+    def accepts(self, body: bytes, signature: Optional[str]) -> bool:
+        if not self.enabled or self.forward_url is not None or not signature:
+            return False
+        return hmac.compare_digest(self.sign(body), signature)
+
+    async def start(self) -> None:
+        if self.store is not STATE:
+            await self.store.start()
+        if self._worker is not None or not self.enabled:
+            return
+        # Resume whatever a previous process left unsettled; batch ids are
+        # deterministic, so re-submitting cannot pay anyone twice.
+        saved = await self.store.get("settlement", "open")
+        if saved:
+            for record in saved.get("batches", []):
+                self._open[record["batchId"]] = record
+            for record in saved.get("queued", []):
+                self._queued.append(GameResult.from_record(record))
+        self._wakeup = asyncio.Event()
+        self._worker = asyncio.create_task(self._run_worker())
+
+    async def stop(self) -> None:
+        if self._submitting:
+            await asyncio.gather(*self._submitting, return_exceptions=True)
+        worker, self._worker = self._worker, None
+        if worker is not None:
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        if self.enabled:
+            await self._save_open()
+        self._wakeup = None
+        if self.store is not STATE:
+            await self.store.close()
+
+    async def submit(self, result: GameResult) -> None:
+        self.games += 1
+        status = STATUS_QUEUED if self.enabled else STATUS_UNSETTLED
+        if self.forward_url is None:
+            # A forwarding shard leaves the reward record to the owner.
+            for payout in result.payouts:
+                await self._record_reward(result, payout, status)
+        if not self.enabled or not result.payouts:
+            return
+        self._queued.append(result)
+        await self._save_open()
+        full = self.forward_url is not None or len(self._queued) >= self.batch_size
+        if full and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def accept_forwarded(self, record: dict) -> None:
+        result = GameResult.from_record(record)
+        # A forward retried after a lost reply must not queue the game twice.
+        if await self.store.get("settlement_game", result.key) is not None:
+            return
+        await self.store.put("settlement_game", result.key, {"at": int(time.time())})
+        await self.submit(result)
+
+    async def _forward_queued(self) -> None:
+        while self._queued:
+            body = json.dumps(self._queued[0].to_record()).encode("utf-8")
+            try:
+                delivered = await self._post(body)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                delivered = False
+            if not delivered:
+                # Kept queued (and saved) until the owner shard takes it.
+                self.forward_failures += 1
+                return
+            self._queued.popleft()
+            self.forwarded += 1
+            await self._save_open()
+
+    async def _post(self, body: bytes) -> bool:
+        if not HTTPX_AVAILABLE or self.forward_url is None:
+            return False
+        async with httpx.AsyncClient(timeout=SETTLEMENT_FORWARD_TIMEOUT_SECONDS) as http:
+            response = await http.post(
+                self.forward_url,
+                content=body,
+                headers={
+                    "Content-Type": "application/json",
+                    SETTLEMENT_SIGNATURE_HEADER: self.sign(body),
+                },
+            )
+        return response.status_code == 200 and response.json().get("ok") is True
+
+    def submit_later(self, result: GameResult) -> None:
+        # Finishing a game never waits on (or fails because of) settlement.
+        task = asyncio.create_task(self.submit(result))
+        self._submitting.add(task)
+        task.add_done_callback(self._submit_done)
+
+    def _submit_done(self, task: asyncio.Task) -> None:
+        self._submitting.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self.submit_errors += 1
+
+    async def reward(self, player_id: str) -> Optional[dict]:
+        return await self.store.get("reward", player_id)
+
+    async def _record_reward(
+        self,
+        result: GameResult,
+        payout: Payout,
+        status: str,
+        tx_hash: Optional[str] = None,
+    ) -> None:
+        await self.store.put(
+            "reward",
+            payout.player_id,
+            {
+                "playerId": payout.player_id,
+                "roomId": result.room_id,
+                "gameKey": result.key,
+                "address": payout.address,
+                "amountWei": str(payout.amount_wei),
+                "amount": format_eth(payout.amount_wei),
+                "status": status,
+                "txHash": tx_hash,
+                "updatedAt": int(time.time()),
+            },
+        )
+
+    async def _save_open(self) -> None:
+        await self.store.put(
+            "settlement",
+            "open",
+            {
+                "batches": list(self._open.values()),
+                "queued": [result.to_record() for result in self._queued],
+            },
+        )
+
+    def _next_batch(self) -> Optional[dict]:
+        if not self._queued:
+            return None
+        games = [
+            self._queued.popleft()
+            for _ in range(min(self.batch_size, len(self._queued)))
+        ]
+        totals: Dict[str, int] = {}
+        for game in games:
+            for payout in game.payouts:
+                # One transfer per address, however many games it won.
+                key = payout.address.lower()
+                totals[key] = totals.get(key, 0) + payout.amount_wei
+        record = {
+            "batchId": "0x" + batch_id_for([game.key for game in games]).hex(),
+            "games": [game.to_record() for game in games],
+            "recipients": list(totals),
+            "amounts": [str(amount) for amount in totals.values()],
+            "status": STATUS_QUEUED,
+            "attempts": 0,
+            "nonce": None,
+            "txHash": None,
+        }
+        self._open[record["batchId"]] = record
+        return record
+
+    async def _run_worker(self) -> None:
+        wakeup = self._wakeup
+        assert wakeup is not None
+        while True:
+            try:
+                await asyncio.wait_for(wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            if self.forward_url is not None:
+                await self._forward_queued()
+                continue
+            while True:
+                pending = [
+                    record
+                    for record in self._open.values()
+                    if record["status"] != STATUS_FAILED
+                ]
+                if pending:
+                    record = pending[0]
+                else:
+                    record = self._next_batch()
+                    if record is None:
+                        break
+                    await self._save_open()
+                await self._settle(record)
+
+    async def _settle(self, record: dict) -> None:
+        client = self.client
+        assert client is not None
+        batch_id = bytes.fromhex(record["batchId"][2:])
+        games = [GameResult.from_record(game) for game in record["games"]]
+        while record["attempts"] < self.max_attempts:
+            try:
+                if await client.is_settled(batch_id):
+                    await self._finish(record, games, STATUS_SETTLED)
+                    return
+                tx_hash, nonce = await client.send_batch(
+                    batch_id,
+                    record["recipients"],
+                    [int(amount) for amount in record["amounts"]],
+                    nonce=record["nonce"],
+                    attempt=record["attempts"],
+                )
+                record.update(status=STATUS_SUBMITTED, nonce=nonce, txHash=tx_hash)
+                await self._save_open()
+                for game in games:
+                    for payout in game.payouts:
+                        await self._record_reward(game, payout, STATUS_SUBMITTED, tx_hash)
+                if await client.wait_for_receipt(
+                    tx_hash, SETTLEMENT_RECEIPT_TIMEOUT_SECONDS
+                ):
+                    await self._finish(record, games, STATUS_SETTLED)
+                    return
+                # Reverted: is_settled on the next pass tells a replayed batch
+                # apart from a real failure.
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                record["error"] = f"{type(exc).__name__}: {exc}"
+            record["attempts"] += 1
+            self.retries += 1
+            await self._save_open()
+            await asyncio.sleep(SETTLEMENT_RETRY_SECONDS * 2 ** (record["attempts"] - 1))
+        await self._finish(record, games, STATUS_FAILED)
+
+    async def _finish(self, record: dict, games: List[GameResult], status: str) -> None:
+        record["status"] = status
+        if status == STATUS_SETTLED:
+            self.batches_settled += 1
+            self._open.pop(record["batchId"], None)
+        else:
+            # Failed batches stay in the open set for an operator to inspect.
+            self.batches_failed += 1
+        await self._save_open()
+        for game in games:
+            for payout in game.payouts:
+                await self._record_reward(game, payout, status, record.get("txHash"))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "running": self._worker is not None,
+            "sender": self.client.address if self.client is not None else None,
+            "store": self.store.name,
+            "forwardTo": self.forward_url,
+            "forwarded": self.forwarded,
+            "forwardFailures": self.forward_failures,
+            "queuedGames": len(self._queued),
+            "openBatches": len(self._open),
+            "games": self.games,
+            "submitErrors": self.submit_errors,
+            "batchesSettled": self.batches_settled,
+            "batchesFailed": self.batches_failed,
+            "retries": self.retries,
+        }
+
+
+SETTLEMENT = SettlementQueue(create_payout_client(), create_settlement_store())
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import os
+import signal
+import subprocess
+import sys
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+
+
+@dataclass(frozen=True)
+class ShardNode:
+    shard_id: str
+    base_url: str
+
+    @property
+    def ws_base_url(self) -> str:
+        if self.base_url.startswith("https://"):
+            return "wss://" + self.base_url[len("https://") :]
+        if self.base_url.startswith("http://"):
+            return "ws://" + self.base_url[len("http://") :]
+        return self.base_url
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, vnodes: int = SHARD_VNODES) -> None:
+        self.vnodes = max(1, vnodes)
+        self._points: list[int] = []
+        self._owners: Dict[int, str] = {}
+
+    def add(self, shard_id: str) -> None:
+        for replica in range(self.vnodes):
+            point = _hash(f"{shard_id}#{replica}")
+            if point in self._owners:
+                continue
+            self._owners[point] = shard_id
+            self._points.insert(bisect_right(self._points, point), point)
+
+    def remove(self, shard_id: str) -> None:
+        self._points = [p for p in self._points if self._owners[p] != shard_id]
+        self._owners = {p: owner for p, owner in self._owners.items() if owner != shard_id}
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        idx = bisect_right(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[idx]]
+
+
+class ShardCoordinator:
+    def __init__(self, local_shard_id: str, nodes: Dict[str, str] | None = None) -> None:
+        self.local_shard_id = local_shard_id
+        self.nodes: Dict[str, ShardNode] = {}
+        self.ring = HashRing()
+        for shard_id, base_url in (nodes or {}).items():
+            self.register(shard_id, base_url)
+
+    def register(self, shard_id: str, base_url: str) -> None:
+        if shard_id in self.nodes:
+            self.ring.remove(shard_id)
+        self.nodes[shard_id] = ShardNode(shard_id, base_url.rstrip("/"))
+        self.ring.add(shard_id)
+
+    def unregister(self, shard_id: str) -> None:
+        if self.nodes.pop(shard_id, None) is not None:
+            self.ring.remove(shard_id)
+
+    def owner(self, room_id: str) -> Optional[ShardNode]:
+        shard_id = self.ring.owner(room_id)
+        return self.nodes.get(shard_id) if shard_id else None
+
+    def is_local(self, room_id: str) -> bool:
+        node = self.owner(room_id)
+        return node is None or node.shard_id == self.local_shard_id
+
+    def http_url(self, room_id: str, path: str) -> Optional[str]:
+        node = self.owner(room_id)
+        return f"{node.base_url}{path}" if node else None
+
+    def ws_url(self, room_id: str) -> Optional[str]:
+        node = self.owner(room_id)
+        return f"{node.ws_base_url}/ws/{room_id}" if node else None
+
+
+class LocalCoordinator(ShardCoordinator):
+    # In-process stand-in: membership is driven by register/unregister calls
+    # instead of the environment, so several app instances can share one ring.
+    def __init__(self, local_shard_id: str = "local") -> None:
+        super().__init__(local_shard_id)
+
+    def view_for(self, shard_id: str) -> "LocalCoordinator":
+        view = LocalCoordinator(shard_id)
+        view.nodes = self.nodes
+        view.ring = self.ring
+        return view
+
+
+def parse_nodes(spec: str) -> Dict[str, str]:
+    nodes: Dict[str, str] = {}
+    for entry in spec.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        shard_id, _, base_url = entry.partition("=")
+        if not base_url:
+            raise ValueError(f"Invalid shard entry: {entry!r}")
+        nodes[shard_id.strip()] = base_url.strip()
+    return nodes
+
+
+def coordinator_from_env() -> Optional[ShardCoordinator]:
+    spec = os.getenv("SHARD_NODES", "")
+    shard_id = os.getenv("SHARD_ID", "")
+    if not spec or not shard_id:
+        return None
+    return ShardCoordinator(shard_id, parse_nodes(spec))
+
+
+_COORDINATOR: Optional[ShardCoordinator] = coordinator_from_env()
+
+
+def get_coordinator() -> Optional[ShardCoordinator]:
+    return _COORDINATOR
+
+
+def set_coordinator(coordinator: Optional[ShardCoordinator]) -> None:
+    global _COORDINATOR
+    _COORDINATOR = coordinator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run one uvicorn worker per room shard.")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--base-port", type=int, default=8001)
+    args = parser.parse_args()
+
+    nodes = {
+        f"shard-{idx}": f"http://{args.host}:{args.base_port + idx}"
+        for idx in range(args.shards)
+    }
+    spec = ",".join(f"{shard_id}={url}" for shard_id, url in nodes.items())
+    processes: list[subprocess.Popen] = []
+    for idx, shard_id in enumerate(nodes):
+        env = {**os.environ, "SHARD_ID": shard_id, "SHARD_NODES": spec}
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "app.main:app",
+                    "--host",
+                    args.host,
+                    "--port",
+                    str(args.base_port + idx),
+                ],
+                env=env,
+            )
+        )
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.send_signal(signal.SIGINT)
+        for process in processes:
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+from app.cache import TTLCache
+
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_MAX_ENTRIES = int(os.getenv("STATE_MAX_ENTRIES", "10000"))
+STATE_TTL_SECONDS = float(os.getenv("STATE_TTL_SECONDS", "0"))
+STATE_SQLITE_PATH = os.getenv("STATE_SQLITE_PATH", "arena_state.db")
+STATE_REDIS_URL = os.getenv("STATE_REDIS_URL", "redis://127.0.0.1:6379/0")
+STATE_FLUSH_INTERVAL_SECONDS = float(os.getenv("STATE_FLUSH_INTERVAL_SECONDS", "0.5"))
+STATE_FLUSH_BATCH_SIZE = int(os.getenv("STATE_FLUSH_BATCH_SIZE", "200"))
+
+_DELETED = object()
+
+
+class StateBackend:
+    name = "base"
+
+    async def start(self) -> None:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+    async def put(self, namespace: str, key: str, value: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    async def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def delete(self, namespace: str, key: str) -> None:
+        raise NotImplementedError
+
+    async def reload(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        # A read that sees other processes' writes; caching backends bypass
+        # their local copy.
+        return await self.get(namespace, key)
+
+    async def flush(self) -> None:
+        return None
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class MemoryBackend(StateBackend):
+    name = "memory"
+
+    def __init__(
+        self, max_entries: int = STATE_MAX_ENTRIES, ttl_seconds: float = STATE_TTL_SECONDS
+    ) -> None:
+        self._entries: TTLCache[Dict[str, Any]] = TTLCache(max_entries, ttl_seconds)
+
+    async def put(self, namespace: str, key: str, value: Dict[str, Any]) -> None:
+        self._entries.set((namespace, key), value)
+
+    async def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get((namespace, key))
+
+    async def delete(self, namespace: str, key: str) -> None:
+        self._entries.pop((namespace, key))
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self._entries.stats()}
+
+
+class WriteBehindBackend(StateBackend):
+    # Writes land in a pending map and a bounded read cache immediately; a
+    # background task flushes them to the store in batches.
+    def __init__(
+        self,
+        flush_interval: float = STATE_FLUSH_INTERVAL_SECONDS,
+        batch_size: int = STATE_FLUSH_BATCH_SIZE,
+        cache_entries: int = STATE_MAX_ENTRIES,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self._pending: Dict[tuple[str, str], Any] = {}
+        self._cache: TTLCache[Dict[str, Any]] = TTLCache(cache_entries, 0)
+        self._flush_requested = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self.flushes = 0
+        self.flushed_items = 0
+        self.flush_errors = 0
+
+    async def start(self) -> None:
+        await self._open()
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        await self._close()
+
+    async def put(self, namespace: str, key: str, value: Dict[str, Any]) -> None:
+        self._pending[(namespace, key)] = value
+        self._cache.set((namespace, key), value)
+        if len(self._pending) >= self.batch_size:
+            self._flush_requested.set()
+
+    async def get(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        pending = self._pending.get((namespace, key))
+        if pending is _DELETED:
+            return None
+        if pending is not None:
+            return pending
+        cached = self._cache.get((namespace, key))
+        if cached is not None:
+            return cached
+        value = await self._read(namespace, key)
+        if value is not None:
+            self._cache.set((namespace, key), value)
+        return value
+
+    async def reload(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        pending = self._pending.get((namespace, key))
+        if pending is not None:
+            return None if pending is _DELETED else pending
+        value = await self._read(namespace, key)
+        if value is None:
+            self._cache.pop((namespace, key))
+        else:
+            self._cache.set((namespace, key), value)
+        return value
+
+    async def delete(self, namespace: str, key: str) -> None:
+        self._pending[(namespace, key)] = _DELETED
+        self._cache.pop((namespace, key))
+
+    async def flush(self) -> None:
+        while self._pending:
+            batch = dict(list(self._pending.items())[: self.batch_size])
+            for item_key in batch:
+                del self._pending[item_key]
+            try:
+                await self._write_batch(batch)
+            except Exception:
+                self.flush_errors += 1
+                self._requeue(batch)
+                raise
+            except BaseException:
+                # Cancelled mid-write: the batch may not have landed, and
+                # rewriting it later is harmless.
+                self._requeue(batch)
+                raise
+            self.flushes += 1
+            self.flushed_items += len(batch)
+
+    def _requeue(self, batch: Dict[tuple[str, str], Any]) -> None:
+        # Keep newer writes that arrived while this batch was in flight.
+        for item_key, value in batch.items():
+            self._pending.setdefault(item_key, value)
+
+    async def _run_flusher(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._flush_requested.wait(), timeout=self.flush_interval
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception:
+                await asyncio.sleep(self.flush_interval)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "pending": len(self._pending),
+            "flushes": self.flushes,
+            "flushedItems": self.flushed_items,
+            "flushErrors": self.flush_errors,
+            "cache": self._cache.stats(),
+        }
+
+    async def _open(self) -> None:
+        return None
+
+    async def _close(self) -> None:
+        return None
+
+    async def _read(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def _write_batch(self, batch: Dict[tuple[str, str], Any]) -> None:
+        raise NotImplementedError
+
+
+class SqliteBackend(WriteBehindBackend):
+    name = "sqlite"
+
+    def __init__(self, path: str = STATE_SQLITE_PATH, **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    async def _open(self) -> None:
+        if self._conn is None:
+            self._conn = await asyncio.to_thread(self._connect)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS state ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "PRIMARY KEY (namespace, key))"
+        )
+        conn.commit()
+        return conn
+
+    async def _close(self) -> None:
+        if self._conn is not None:
+            await asyncio.to_thread(self._disconnect)
+
+    def _disconnect(self) -> None:
+        # A cancelled flush can leave a writer thread inside _apply, so the
+        # connection is only closed once it holds the lock.
+        with self._lock:
+            conn, self._conn = self._conn, None
+            if conn is not None:
+                conn.close()
+
+    async def _read(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        if self._conn is None:
+            return None
+        return await asyncio.to_thread(self._select, namespace, key)
+
+    def _select(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT value FROM state WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def _write_batch(self, batch: Dict[tuple[str, str], Any]) -> None:
+        if self._conn is None:
+            raise RuntimeError("SQLite backend is not open.")
+        await asyncio.to_thread(self._apply, batch)
+
+    def _apply(self, batch: Dict[tuple[str, str], Any]) -> None:
+        upserts = [
+            (namespace, key, json.dumps(value, ensure_ascii=False))
+            for (namespace, key), value in batch.items()
+            if value is not _DELETED
+        ]
+        deletes = [
+            (namespace, key)
+            for (namespace, key), value in batch.items()
+            if value is _DELETED
+        ]
+        with self._lock:
+            conn = self._conn
+            if conn is None:
+                raise RuntimeError("SQLite backend is not open.")
+            with conn:
+                if upserts:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO state (namespace, key, value) "
+                        "VALUES (?, ?, ?)",
+                        upserts,
+                    )
+                if deletes:
+                    conn.executemany(
+                        "DELETE FROM state WHERE namespace = ? AND key = ?", deletes
+                    )
+
+
+class RespError(Exception):
+    pass
+
+
+class RedisBackend(WriteBehindBackend):
+    # Speaks plain RESP2 over asyncio streams, so any Redis-compatible server
+    # (or a local stand-in) works without a client library.
+    name = "redis"
+
+    def __init__(
+        self,
+        url: str = STATE_REDIS_URL,
+        ttl_seconds: float = STATE_TTL_SECONDS,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int((parsed.path or "/0").lstrip("/") or 0)
+        self.ttl_seconds = ttl_seconds
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._io_lock = asyncio.Lock()
+
+    async def _open(self) -> None:
+        await self._ensure_connection()
+
+    async def _ensure_connection(self) -> None:
+        if self._writer is not None and not self._writer.is_closing():
+            return
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._pipeline([("AUTH", self.password)])
+        if self.db:
+            await self._pipeline([("SELECT", str(self.db))])
+
+    async def _close(self) -> None:
+        writer = self._writer
+        self._abort()
+        if writer is not None:
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def _abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+
+    @staticmethod
+    def _key(namespace: str, key: str) -> str:
+        return f"arena:{namespace}:{key}"
+
+    async def _read(self, namespace: str, key: str) -> Optional[Dict[str, Any]]:
+        async with self._io_lock:
+            await self._ensure_connection()
+            (value,) = await self._pipeline([("GET", self._key(namespace, key))])
+        if value is None:
+            return None
+        return json.loads(value)
+
+    async def _write_batch(self, batch: Dict[tuple[str, str], Any]) -> None:
+        commands: list[tuple[str, ...]] = []
+        for (namespace, key), value in batch.items():
+            redis_key = self._key(namespace, key)
+            if value is _DELETED:
+                commands.append(("DEL", redis_key))
+                continue
+            encoded = json.dumps(value, ensure_ascii=False)
+            if self.ttl_seconds > 0:
+                commands.append(("SET", redis_key, encoded, "EX", str(int(self.ttl_seconds))))
+            else:
+                commands.append(("SET", redis_key, encoded))
+        async with self._io_lock:
+            await self._ensure_connection()
+            await self._pipeline(commands)
+
+    async def _pipeline(self, commands: list[tuple[str, ...]]) -> list[Any]:
+        assert self._reader is not None and self._writer is not None
+        chunks: list[bytes] = []
+        for command in commands:
+            chunks.append(f"*{len(command)}\r\n".encode())
+            for part in command:
+                data = part.encode("utf-8")
+                chunks.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        try:
+            self._writer.write(b"".join(chunks))
+            await self._writer.drain()
+            # Error replies come back as values so every reply is consumed
+            # and the stream stays in step for the next pipeline.
+            replies = [await self._read_reply() for _ in commands]
+        except BaseException:
+            # Anything else (I/O, a malformed reply, cancellation) leaves
+            # replies unread on the socket: drop the connection.
+            self._abort()
+            raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    async def _read_reply(self) -> Any:
+        assert self._reader is not None
+        line = await self._reader.readuntil(b"\r\n")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            return RespError(body.decode())
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length == -1:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2].decode("utf-8")
+        if prefix == b"*":
+            count = int(body)
+            if count == -1:
+                return None
+            return [await self._read_reply() for _ in range(count)]
+        raise RespError(f"Unexpected reply: {line!r}")
+
+
+def create_backend(kind: str = STATE_BACKEND) -> StateBackend:
+    if kind == "sqlite":
+        return SqliteBackend()
+    if kind == "redis":
+        return RedisBackend()
+    return MemoryBackend()
+
+
+STATE = create_backend()
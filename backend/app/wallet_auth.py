@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import os
+import secrets
+from typing import Optional, Tuple
+
+from app.cache import TTLCache
+
+try:
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+    ETH_ACCOUNT_AVAILABLE = True
+except Exception:  # pragma: no cover - optional dependency guard
+    Account = None  # type: ignore
+    encode_defunct = None  # type: ignore
+    ETH_ACCOUNT_AVAILABLE = False
+
+
+WALLET_CHALLENGE_TTL_SECONDS = float(os.getenv("WALLET_CHALLENGE_TTL_SECONDS", "300"))
+WALLET_CHALLENGE_ENTRIES = int(os.getenv("WALLET_CHALLENGE_ENTRIES", "10000"))
+
+
+def challenge_message(address: str, nonce: str) -> str:
+    return f"Wit or Die: join the arena\nAddress: {address.lower()}\nNonce: {nonce}"
+
+
+class WalletChallenges:
+    # Addresses are public, so a join only speaks for a wallet when it
+    # carries an EIP-191 signature over a fresh, single-use nonce. Challenges
+    # are keyed by nonce so asking for one never invalidates another: a
+    # stranger requesting challenges for your address cannot lock you out.
+    def __init__(
+        self,
+        ttl_seconds: float = WALLET_CHALLENGE_TTL_SECONDS,
+        max_entries: int = WALLET_CHALLENGE_ENTRIES,
+    ) -> None:
+        self.ttl_seconds = ttl_seconds
+        self._pending: TTLCache[Tuple[str, str]] = TTLCache(max_entries, ttl_seconds)
+        self.issued = 0
+        self.verified = 0
+        self.rejected = 0
+
+    @property
+    def available(self) -> bool:
+        return ETH_ACCOUNT_AVAILABLE
+
+    def issue(self, address: str) -> Tuple[str, str]:
+        nonce = secrets.token_hex(16)
+        message = challenge_message(address, nonce)
+        self._pending.set(nonce, (address.lower(), message))
+        self.issued += 1
+        return nonce, message
+
+    def verify(self, address: str, nonce: Optional[str], signature: Optional[str]) -> bool:
+        # The challenge is consumed only by a signature that verifies, so a
+        # bad attempt cannot burn someone else's outstanding nonce.
+        pending = self._pending.get(nonce) if nonce is not None else None
+        if (
+            pending is None
+            or pending[0] != address.lower()
+            or signature is None
+            or not ETH_ACCOUNT_AVAILABLE
+        ):
+            self.rejected += 1
+            return False
+        try:
+            signer = Account.recover_message(
+                encode_defunct(text=pending[1]), signature=signature
+            )
+        except Exception:
+            self.rejected += 1
+            return False
+        if signer.lower() != address.lower():
+            self.rejected += 1
+            return False
+        self._pending.pop(nonce)
+        self.verified += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "available": self.available,
+            "outstanding": len(self._pending),
+            "issued": self.issued,
+            "verified": self.verified,
+            "rejected": self.rejected,
+        }
+
+
+WALLET_AUTH = WalletChallenges()
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import os
+import random
+import socket
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import httpx
+import uvicorn
+import websockets
+
+from app.codec import dumps, loads
+from bench.stub_llm import StubAgent, install
+
+
+@dataclass
+class BenchConfig:
+    players: int = 1000
+    players_per_room: int = 20
+    turns: int = 20
+    mode: str = "rooms"
+    correct_rate: float = 0.8
+    think_ms: float = 0.0
+    connect_concurrency: int = 200
+    room_duration_seconds: int = 600
+    llm_latency_ms: float = 50.0
+    llm_jitter_ms: float = 20.0
+    llm_failure_rate: float = 0.0
+    question_pool: bool = True
+    trace_memory: bool = False
+    seed: Optional[int] = None
+
+
+@dataclass
+class BenchMetrics:
+    match_ms: List[float] = field(default_factory=list)
+    join_ms: List[float] = field(default_factory=list)
+    turn_ms: List[float] = field(default_factory=list)
+    fanout_ms: List[float] = field(default_factory=list)
+    turns: int = 0
+    frames: int = 0
+    deaths: int = 0
+    errors: int = 0
+    error_samples: List[str] = field(default_factory=list)
+
+    def fail(self, exc: BaseException) -> None:
+        self.errors += 1
+        if len(self.error_samples) < 5:
+            self.error_samples.append(f"{type(exc).__name__}: {exc}")
+
+
+def percentiles(samples: List[float]) -> Dict[str, Optional[float]]:
+    if not samples:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(samples)
+
+    def pick(fraction: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 3)
+
+    return {
+        "count": len(ordered),
+        "p50": pick(0.50),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _now_ms() -> float:
+    return time.time() * 1000
+
+
+class SimulatedPlayer:
+    def __init__(
+        self,
+        player_id: str,
+        room_id: str,
+        config: BenchConfig,
+        metrics: BenchMetrics,
+        rng: random.Random,
+    ) -> None:
+        self.player_id = player_id
+        self.room_id = room_id
+        self.config = config
+        self.metrics = metrics
+        self.rng = rng
+
+    def _observe(self, frame: Dict[str, Any]) -> None:
+        self.metrics.frames += 1
+        if frame.get("type") in ("room", "room_delta"):
+            sent_ms = frame.get("payload", {}).get("serverNowMs")
+            if sent_ms:
+                self.metrics.fanout_ms.append(max(0.0, _now_ms() - sent_ms))
+
+    async def _until(self, ws: Any, wanted: set[str]) -> Dict[str, Any]:
+        while True:
+            frame = loads(await ws.recv())
+            self._observe(frame)
+            if frame.get("type") in wanted:
+                return frame
+
+    async def run(self, http: httpx.AsyncClient, ws_base: str) -> None:
+        if self.config.mode == "arena":
+            started = time.perf_counter()
+            response = await http.post("/match", params={"player_id": self.player_id})
+            response.raise_for_status()
+            self.metrics.match_ms.append((time.perf_counter() - started) * 1000)
+
+        async with websockets.connect(
+            f"{ws_base}/ws/{self.room_id}", ping_interval=None, max_size=None
+        ) as ws:
+            started = time.perf_counter()
+            await ws.send(dumps({"type": "join", "payload": {"playerId": self.player_id}}))
+            frame = await self._until(ws, {"question", "game_over"})
+            self.metrics.join_ms.append((time.perf_counter() - started) * 1000)
+
+            for _ in range(self.config.turns):
+                if frame["type"] != "question":
+                    return
+                question = frame["payload"]
+                if self.config.think_ms:
+                    await asyncio.sleep(self.rng.uniform(0, self.config.think_ms) / 1000)
+                answer = (
+                    question["answer"]
+                    if self.rng.random() < self.config.correct_rate
+                    else "zzzz"
+                )
+                started = time.perf_counter()
+                await ws.send(
+                    dumps(
+                        {
+                            "type": "submit",
+                            "payload": {"questionId": question["id"], "answer": answer},
+                        }
+                    )
+                )
+                while True:
+                    frame = await self._until(ws, {"question", "trigger", "game_over"})
+                    if frame["type"] != "trigger" or frame["payload"]["outcome"] == "dead":
+                        break
+                self.metrics.turn_ms.append((time.perf_counter() - started) * 1000)
+                self.metrics.turns += 1
+                if frame["type"] == "trigger":
+                    self.metrics.deaths += 1
+                    return
+
+
+async def _stats(http: httpx.AsyncClient) -> dict:
+    response = await http.get("/stats")
+    response.raise_for_status()
+    return response.json()
+
+
+def _app_traced_bytes() -> int:
+    app_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "app")
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(True, os.path.join(app_dir, "*"))]
+    )
+    return sum(stat.size for stat in snapshot.statistics("filename"))
+
+
+async def run_bench(config: BenchConfig) -> dict:
+    # main reads its settings at import time, so configure before importing.
+    os.environ.setdefault("QUESTION_POOL_ENABLED", "1" if config.question_pool else "0")
+    os.environ.setdefault("ROOM_MAX_COUNT", str(config.players + 10))
+    from app.main import app
+
+    agent = StubAgent(
+        latency_ms=config.llm_latency_ms,
+        jitter_ms=config.llm_jitter_ms,
+        failure_rate=config.llm_failure_rate,
+        seed=config.seed,
+    )
+    install(agent)
+    if config.trace_memory:
+        tracemalloc.start()
+
+    port = _free_port()
+    server = uvicorn.Server(
+        uvicorn.Config(
+            app, host="127.0.0.1", port=port, log_level="warning", ws="websockets"
+        )
+    )
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            server_task.result()
+        await asyncio.sleep(0.05)
+
+    metrics = BenchMetrics()
+    rng = random.Random(config.seed)
+    base = f"http://127.0.0.1:{port}"
+    ws_base = f"ws://127.0.0.1:{port}"
+    room_count = max(1, -(-config.players // max(1, config.players_per_room)))
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=30) as http:
+            gc.collect()
+            before = await _stats(http)
+            traced_before = _app_traced_bytes() if config.trace_memory else 0
+
+            if config.mode == "arena":
+                room_ids = ["arena"] * config.players
+                room_count = 1
+            else:
+                rooms = [f"bench-{idx}" for idx in range(room_count)]
+                for room_id in rooms:
+                    response = await http.post(
+                        f"/rooms/{room_id}",
+                        json={"duration_seconds": config.room_duration_seconds},
+                    )
+                    response.raise_for_status()
+                room_ids = [rooms[idx % room_count] for idx in range(config.players)]
+
+            gate = asyncio.Semaphore(max(1, config.connect_concurrency))
+
+            async def drive(idx: int) -> None:
+                player = SimulatedPlayer(
+                    f"bench-player-{idx}",
+                    room_ids[idx],
+                    config,
+                    metrics,
+                    random.Random(rng.random()),
+                )
+                async with gate:
+                    try:
+                        await player.run(http, ws_base)
+                    except Exception as exc:
+                        metrics.fail(exc)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(drive(idx) for idx in range(config.players)))
+            elapsed = time.perf_counter() - started
+
+            gc.collect()
+            after = await _stats(http)
+            traced_after = _app_traced_bytes() if config.trace_memory else 0
+    finally:
+        server.should_exit = True
+        await server_task
+        if config.trace_memory:
+            tracemalloc.stop()
+
+    rss_delta = after["rooms"]["rssBytes"] - before["rooms"]["rssBytes"]
+    memory: Dict[str, Any] = {
+        "rooms": after["rooms"]["rooms"],
+        # Clients run in the same process, so this overstates the server share.
+        "rssDeltaBytesPerRoom": rss_delta // room_count,
+    }
+    if config.trace_memory:
+        memory["appAllocatedBytesPerRoom"] = (traced_after - traced_before) // room_count
+    return {
+        "config": config.__dict__,
+        "elapsedSeconds": round(elapsed, 3),
+        "throughput": {
+            "turnsPerSecond": round(metrics.turns / elapsed, 1) if elapsed else None,
+            "framesPerSecond": round(metrics.frames / elapsed, 1) if elapsed else None,
+        },
+        "latencyMs": {
+            "match": percentiles(metrics.match_ms),
+            "join": percentiles(metrics.join_ms),
+            "turn": percentiles(metrics.turn_ms),
+            "broadcastFanout": percentiles(metrics.fanout_ms),
+        },
+        "turns": metrics.turns,
+        "deaths": metrics.deaths,
+        "errors": metrics.errors,
+        "errorSamples": metrics.error_samples,
+        "memory": memory,
+        "llm": {**agent.stats(), "guard": after["llm"]},
+        "questionPool": after["questionPool"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the arena WebSocket server.")
+    parser.add_argument("--players", type=int, default=BenchConfig.players)
+    parser.add_argument("--players-per-room", type=int, default=BenchConfig.players_per_room)
+    parser.add_argument("--turns", type=int, default=BenchConfig.turns)
+    parser.add_argument("--mode", choices=("rooms", "arena"), default=BenchConfig.mode)
+    parser.add_argument("--correct-rate", type=float, default=BenchConfig.correct_rate)
+    parser.add_argument("--think-ms", type=float, default=BenchConfig.think_ms)
+    parser.add_argument(
+        "--connect-concurrency", type=int, default=BenchConfig.connect_concurrency
+    )
+    parser.add_argument(
+        "--room-duration-seconds", type=int, default=BenchConfig.room_duration_seconds
+    )
+    parser.add_argument("--llm-latency-ms", type=float, default=BenchConfig.llm_latency_ms)
+    parser.add_argument("--llm-jitter-ms", type=float, default=BenchConfig.llm_jitter_ms)
+    parser.add_argument(
+        "--llm-failure-rate", type=float, default=BenchConfig.llm_failure_rate
+    )
+    parser.add_argument("--no-question-pool", action="store_true")
+    parser.add_argument("--trace-memory", action="store_true")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Also write the JSON report to this path.")
+    parser.add_argument(
+        "--max-turn-p95-ms",
+        type=float,
+        default=None,
+        help="Exit non-zero when turn p95 exceeds this, for CI regression checks.",
+    )
+    args = parser.parse_args()
+
+    config = BenchConfig(
+        players=args.players,
+        players_per_room=args.players_per_room,
+        turns=args.turns,
+        mode=args.mode,
+        correct_rate=args.correct_rate,
+        think_ms=args.think_ms,
+        connect_concurrency=args.connect_concurrency,
+        room_duration_seconds=args.room_duration_seconds,
+        llm_latency_ms=args.llm_latency_ms,
+        llm_jitter_ms=args.llm_jitter_ms,
+        llm_failure_rate=args.llm_failure_rate,
+        question_pool=not args.no_question_pool,
+        trace_memory=args.trace_memory,
+        seed=args.seed,
+    )
+    report = asyncio.run(run_bench(config))
+    text = dumps(report)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text)
+    turn_p95 = report["latencyMs"]["turn"]["p95"]
+    if args.max_turn_p95_ms is not None and (
+        turn_p95 is None or turn_p95 > args.max_turn_p95_ms
+    ):
+        print(
+            f"turn p95 {turn_p95} ms exceeds {args.max_turn_p95_ms} ms", file=sys.stderr
+        )
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import re
+import string
+from typing import Optional
+
+from app import llm_agent
+from app.codec import dumps
+
+
+_COUNT_PATTERN = re.compile(r"Generate (\d+) distinct")
+_DIFFICULTY_PATTERN = re.compile(r"Difficulty: (\d+)")
+
+
+def _word(index: int) -> str:
+    # Bijective base-26 so every index maps to a distinct letters-only word.
+    letters = []
+    index += 1
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters.append(string.ascii_lowercase[rem])
+    return "stub" + "".join(reversed(letters))
+
+
+class StubAgent:
+    # Stands in for ArenaLlmAgent: answers every prompt shape llm_agent sends
+    # after a synthetic latency, failing a configurable share of calls.
+    def __init__(
+        self,
+        latency_ms: float = 50.0,
+        jitter_ms: float = 20.0,
+        failure_rate: float = 0.0,
+        judge_correct_rate: float = 0.5,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.judge_correct_rate = judge_correct_rate
+        self._rng = random.Random(seed)
+        self._words = 0
+        self.calls = 0
+        self.failures = 0
+
+    async def run(self, prompt: str) -> str:
+        self.calls += 1
+        delay = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+        if self._rng.random() < self.failure_rate:
+            self.failures += 1
+            raise RuntimeError("synthetic LLM failure")
+        if "You are judging" in prompt:
+            return dumps(
+                {
+                    "correct": self._rng.random() < self.judge_correct_rate,
+                    "confidence": 0.7,
+                    "reason": "stub",
+                    "normalized_answer": "",
+                }
+            )
+        if "single key: text" in prompt:
+            return dumps({"text": "stub report"})
+        count_match = _COUNT_PATTERN.search(prompt)
+        difficulty_match = _DIFFICULTY_PATTERN.search(prompt)
+        count = int(count_match.group(1)) if count_match else 1
+        difficulty = int(difficulty_match.group(1)) if difficulty_match else 1
+        items = []
+        for _ in range(count):
+            self._words += 1
+            items.append(
+                {
+                    "id": f"stub-{self._words}",
+                    "prompt": f"拼写: 测试{self._words}",
+                    "answer": _word(self._words),
+                    "difficulty": difficulty,
+                    "topic": "stub",
+                }
+            )
+        return dumps(items)
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "failures": self.failures}
+
+
+def install(agent: StubAgent) -> None:
+    llm_agent._get_agent = lambda: agent  # type: ignore[assignment]
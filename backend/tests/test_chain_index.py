@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from app.chain_index import DEPOSITED, ChainEvent, ChainIndexer, IndexStore, SqliteIndexStore
+from app.protocol import ProtocolError, parse_message
+from app.storage import MemoryBackend, SqliteBackend
+from app.wallet_auth import ETH_ACCOUNT_AVAILABLE, WalletChallenges
+
+ALICE = "0x" + "a1" * 20
+BOB = "0x" + "b2" * 20
+FEE = 10**16
+
+
+def _funded(amount: int, store=None) -> ChainIndexer:
+    indexer = ChainIndexer(store=store or IndexStore(MemoryBackend()))
+    indexer._apply([ChainEvent(DEPOSITED, ALICE, amount, block=1)])
+    return indexer
+
+
+def test_each_game_claims_one_entry_fee() -> None:
+    async def scenario() -> None:
+        indexer = _funded(2 * FEE)
+        assert await indexer.claim_entry(ALICE, "arena:g1", FEE)
+        # Rejoining the same game does not charge again.
+        assert await indexer.claim_entry("0x" + "A1" * 20, "arena:g1", FEE)
+        assert indexer.available(ALICE) == FEE
+        assert await indexer.claim_entry(ALICE, "arena:g2", FEE)
+        assert not indexer.has_deposit(ALICE, FEE)
+        assert not await indexer.claim_entry(ALICE, "arena:g3", FEE)
+        assert indexer.has_entry(ALICE, "arena:g2")
+        assert indexer.stats()["entriesRefused"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_claims_survive_a_restart(tmp_path) -> None:
+    async def scenario() -> None:
+        path = str(tmp_path / "index.db")
+        store = SqliteIndexStore(path)
+        await store.load()
+        indexer = _funded(FEE, store)
+        await store.save(1, indexer._balances)
+        assert await indexer.claim_entry(ALICE, "arena:g1", FEE)
+        await store.close()
+
+        reloaded = SqliteIndexStore(path)
+        _, balances = await reloaded.load()
+        claims = await reloaded.load_claims()
+        assert balances[ALICE] == (FEE, 0)
+        assert claims == {ALICE: {"arena:g1": FEE}}
+        await reloaded.close()
+
+    asyncio.run(scenario())
+
+
+def test_memory_store_keeps_claims_in_the_state_backend() -> None:
+    async def scenario() -> None:
+        state = MemoryBackend()
+        indexer = _funded(2 * FEE, IndexStore(state))
+        assert await indexer.claim_entry(ALICE, "arena:g1", FEE)
+        assert await indexer.claim_entry(ALICE, "arena:g2", FEE)
+
+        # A fresh process sharing the backend sees the spent entries.
+        claims = await IndexStore(state).load_claims()
+        assert claims == {ALICE: {"arena:g1": FEE, "arena:g2": FEE}}
+
+    asyncio.run(scenario())
+
+
+def test_disabled_indexer_reports_no_lag() -> None:
+    indexer = ChainIndexer()
+    assert not indexer.enabled
+    assert indexer.stats()["lagBlocks"] == 0
+
+
+def test_challenges_are_per_nonce_and_survive_bad_attempts() -> None:
+    challenges = WalletChallenges()
+    first, message = challenges.issue(ALICE)
+    assert ALICE in message
+    # A stranger asking for another challenge does not replace the first.
+    second, _ = challenges.issue(ALICE)
+    assert first != second
+    assert challenges.stats()["outstanding"] == 2
+    assert not challenges.verify(ALICE, first, None)
+    assert not challenges.verify(ALICE, first, "0x" + "00" * 65)
+    assert not challenges.verify(BOB, second, "0x" + "00" * 65)
+    assert not challenges.verify(ALICE, "0" * 32, "0x" + "00" * 65)
+    # Failed attempts leave both challenges usable by the real owner.
+    assert challenges.stats()["outstanding"] == 2
+    assert challenges.stats()["rejected"] == 4
+
+
+@pytest.mark.skipif(not ETH_ACCOUNT_AVAILABLE, reason="eth_account not installed")
+def test_challenge_accepts_only_the_owner_signature() -> None:
+    from eth_account import Account
+    from eth_account.messages import encode_defunct
+
+    owner, other = Account.create(), Account.create()
+    challenges = WalletChallenges()
+    nonce, message = challenges.issue(owner.address)
+    forged = other.sign_message(encode_defunct(text=message)).signature.hex()
+    assert not challenges.verify(owner.address, nonce, forged)
+    signed = owner.sign_message(encode_defunct(text=message)).signature.hex()
+    assert challenges.verify(owner.address, nonce, signed)
+    # Single use: the same signature cannot be replayed.
+    assert not challenges.verify(owner.address, nonce, signed)
+
+
+def test_join_signature_must_be_well_formed() -> None:
+    signature = "0x" + "ab" * 65
+    join = parse_message(
+        {"type": "join", "payload": {"playerId": "p1", "address": ALICE, "signature": signature}}
+    )
+    assert join.signature == signature
+    with pytest.raises(ProtocolError):
+        parse_message(
+            {"type": "join", "payload": {"playerId": "p1", "address": ALICE, "nonce": "xyz"}}
+        )
+    with pytest.raises(ProtocolError):
+        parse_message({"type": "join", "payload": {"playerId": "p1", "signature": signature}})
+    with pytest.raises(ProtocolError):
+        parse_message(
+            {"type": "join", "payload": {"playerId": "p1", "address": ALICE, "signature": "0x12"}}
+        )
+
+
+def test_claims_made_on_another_shard_spend_the_same_deposit(tmp_path) -> None:
+    async def scenario() -> None:
+        state = SqliteBackend(str(tmp_path / "state.db"))
+        await state.start()
+        shard_a = _funded(FEE, IndexStore(state))
+        shard_b = _funded(FEE, IndexStore(state))
+        assert await shard_a.claim_entry(ALICE, "room-a:g1", FEE)
+        # shard_b never saw the claim in memory, but the shared store has it.
+        assert not await shard_b.claim_entry(ALICE, "room-b:g1", FEE)
+        assert shard_b.available(ALICE) == 0
+        await state.close()
+
+    asyncio.run(scenario())
+
+
+def test_sharding_refuses_a_per_process_state_backend(monkeypatch) -> None:
+    import app.main as main
+    from app.sharding import LocalCoordinator
+
+    monkeypatch.setattr(main, "get_coordinator", lambda: LocalCoordinator("shard-a"))
+    monkeypatch.setattr(main, "STATE", MemoryBackend())
+    with pytest.raises(RuntimeError):
+        asyncio.run(main.start_background_workers())
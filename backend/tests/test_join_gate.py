@@ -0,0 +1,95 @@
+import asyncio
+
+import app.main as main
+from app.chain_index import DEPOSIT_MIN_WEI, DEPOSITED, ChainEvent, ChainIndexer, IndexStore
+from app.protocol import JoinMessage
+from app.scheduler import GameClock
+from app.storage import MemoryBackend
+
+ALICE = "0x" + "a1" * 20
+SIGNATURE = "0x" + "ab" * 65
+
+
+class _Conn:
+    framing = main.JSON_FRAMING
+
+    def __init__(self) -> None:
+        self.events: list[dict] = []
+
+    def send_event(self, event: dict) -> None:
+        self.events.append(event)
+
+    def send(self, *_args) -> None:
+        return None
+
+    def errors(self) -> list[str]:
+        return [event["payload"]["code"] for event in self.events if event["type"] == "error"]
+
+
+def test_join_requires_a_signed_wallet_with_an_unspent_entry(monkeypatch) -> None:
+    async def scenario() -> None:
+        clock = GameClock()
+        indexer = ChainIndexer(source=object(), store=IndexStore(MemoryBackend()))
+        indexer._apply([ChainEvent(DEPOSITED, ALICE, DEPOSIT_MIN_WEI, block=1)])
+        monkeypatch.setattr(main, "GAME_CLOCK", clock)
+        monkeypatch.setattr(main, "CHAIN_INDEX", indexer)
+        monkeypatch.setattr(main, "DEPOSIT_REQUIRED", True)
+        monkeypatch.setattr(
+            main.WALLET_AUTH, "verify", lambda address, nonce, signature: signature == SIGNATURE
+        )
+        room = main.RoomState("gate-room")
+
+        unsigned = _Conn()
+        await main.ClientSession(room, unsigned).on_join(JoinMessage("p1", address=ALICE))
+        assert unsigned.errors() == ["wallet_unverified"]
+        assert "p1" not in room.players
+
+        signed = _Conn()
+        await main.ClientSession(room, signed).on_join(
+            JoinMessage("p1", address=ALICE, signature=SIGNATURE)
+        )
+        assert signed.errors() == []
+        assert room.players["p1"].payout_address == ALICE
+        assert room.entrants == {ALICE: "p1"}
+        assert indexer.available(ALICE) == 0
+
+        # The same player reconnecting is not charged again...
+        again = _Conn()
+        await main.ClientSession(room, again).on_join(
+            JoinMessage("p1", address=ALICE, signature=SIGNATURE)
+        )
+        assert again.errors() == []
+        # ...but the wallet cannot seat a second player in the same game.
+        second = _Conn()
+        await main.ClientSession(room, second).on_join(
+            JoinMessage("p2", address=ALICE, signature=SIGNATURE)
+        )
+        assert second.errors() == ["deposit_required"]
+        assert "p2" not in room.players
+
+        room.reset()
+        await clock.stop()
+
+    asyncio.run(scenario())
+
+
+def test_join_is_refused_when_deposits_cannot_be_verified(monkeypatch) -> None:
+    async def scenario() -> None:
+        clock = GameClock()
+        monkeypatch.setattr(main, "GAME_CLOCK", clock)
+        monkeypatch.setattr(main, "CHAIN_INDEX", ChainIndexer(source=None))
+        monkeypatch.setattr(main, "DEPOSIT_REQUIRED", True)
+        monkeypatch.setattr(main.WALLET_AUTH, "verify", lambda address, nonce, signature: True)
+        room = main.RoomState("gate-room-down")
+
+        conn = _Conn()
+        await main.ClientSession(room, conn).on_join(
+            JoinMessage("p1", address=ALICE, signature=SIGNATURE)
+        )
+        assert conn.errors() == ["deposit_required"]
+        assert "p1" not in room.players
+
+        room.reset()
+        await clock.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,42 @@
+import random
+
+from app.leaderboard import ScoreIndex
+
+
+def test_ties_go_to_earliest_joiner() -> None:
+    index = ScoreIndex()
+    index.update("late", 10, order=2)
+    index.update("early", 10, order=1)
+    index.update("low", 5, order=0)
+    assert index.top() == "early"
+    assert index.top_k(3) == [("early", 10), ("late", 10), ("low", 5)]
+
+
+def test_matches_sorted_reference_under_churn() -> None:
+    rng = random.Random(7)
+    index = ScoreIndex()
+    reference: dict[str, tuple[int, int]] = {}
+    for step in range(2000):
+        player_id = f"p{rng.randrange(60)}"
+        if rng.random() < 0.2:
+            index.remove(player_id)
+            reference.pop(player_id, None)
+        else:
+            order = reference.get(player_id, (0, step))[1]
+            score = rng.randrange(50)
+            index.update(player_id, score, order)
+            reference[player_id] = (score, order)
+    expected = sorted(reference.items(), key=lambda item: (-item[1][0], item[1][1]))
+    assert len(index) == len(reference)
+    assert index.top_k(len(reference)) == [(pid, score) for pid, (score, _) in expected]
+    assert index.top() == expected[0][0]
+
+
+def test_clear_and_empty() -> None:
+    index = ScoreIndex()
+    assert index.top() is None
+    index.update("a", 1, 0)
+    index.clear()
+    assert len(index) == 0
+    assert "a" not in index
+    assert index.top_k(5) == []
@@ -0,0 +1,30 @@
+import asyncio
+
+import app.main as main
+from app.lifecycle import RoomLifecycleManager
+from app.scheduler import GameClock
+from app.settlement import SettlementQueue
+from app.storage import MemoryBackend
+
+
+def test_evicting_a_running_room_finishes_its_game(monkeypatch) -> None:
+    async def scenario() -> None:
+        clock = GameClock()
+        settlement = SettlementQueue(store=MemoryBackend())
+        monkeypatch.setattr(main, "GAME_CLOCK", clock)
+        monkeypatch.setattr(main, "SETTLEMENT", settlement)
+        room = main.RoomState("abandoned-room")
+        room.join("p1")
+        room.start_timer()
+        assert not room.game_over
+
+        manager = RoomLifecycleManager({"abandoned-room": room}, pinned=())
+        await manager.evict("abandoned-room")
+        await settlement.stop()
+
+        assert room.game_over
+        assert settlement.stats()["games"] == 1
+        assert manager.stats()["finishedOnEvict"] == 1
+        await clock.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+import pytest
+
+import app.llm_agent as llm_agent
+import app.resilience as resilience
+from app.llm_client import LlmClientManager
+from app.resilience import CircuitBreaker, LlmOverloaded, LlmUnavailable, ResilientCaller
+
+
+class _SlowAgent:
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.running = 0
+        self.peak = 0
+        self.calls = 0
+
+    async def run(self, prompt: str) -> str:
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        return "{}"
+
+
+def test_hedged_attempts_each_take_a_lane_slot(monkeypatch) -> None:
+    async def scenario() -> None:
+        client = LlmClientManager(max_in_flight=8, lane_max_in_flight=1, queue_timeout=5)
+        guard = ResilientCaller()
+        # Hedge almost immediately so every call races a duplicate.
+        monkeypatch.setattr(guard, "_hedge_delay", lambda _stats: 0.01)
+        monkeypatch.setattr(llm_agent, "LLM_CLIENT", client)
+        monkeypatch.setattr(llm_agent, "LLM_GUARD", guard)
+        agent = _SlowAgent(0.05)
+
+        await asyncio.gather(
+            *(
+                llm_agent._run_agent(agent, "generate_report", "p", "room-1")
+                for _ in range(3)
+            )
+        )
+        assert guard.stats()["ops"]["generate_report"]["hedges"] > 0
+        assert agent.peak == 1
+        assert client.stats()["inFlight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_wait_counts_against_the_operation_deadline(monkeypatch) -> None:
+    async def scenario() -> None:
+        client = LlmClientManager(max_in_flight=8, lane_max_in_flight=1, queue_timeout=10)
+        guard = ResilientCaller()
+        monkeypatch.setattr(llm_agent, "LLM_CLIENT", client)
+        monkeypatch.setattr(llm_agent, "LLM_GUARD", guard)
+        monkeypatch.setitem(resilience.LLM_TIMEOUTS, "judge_answer", 0.1)
+        busy = asyncio.create_task(
+            llm_agent._run_agent(_SlowAgent(1.0), "generate_report", "p", "room-1")
+        )
+        await asyncio.sleep(0.01)
+
+        started = time.monotonic()
+        with pytest.raises(LlmUnavailable):
+            await llm_agent._run_agent(_SlowAgent(0.0), "judge_answer", "p", "room-1")
+        # Bounded by the judge deadline, not deadline + queue timeout.
+        assert time.monotonic() - started < 0.5
+        assert client.queue_depth() == 0
+        # Never admitted: shed load, not a model failure.
+        judge = guard.stats()["ops"]["judge_answer"]
+        assert judge["overloaded"] == 1 and judge["failures"] == 0
+
+        busy.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await busy
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeouts_do_not_trip_the_breaker(monkeypatch) -> None:
+    async def scenario() -> None:
+        client = LlmClientManager(max_in_flight=1, lane_max_in_flight=1, queue_timeout=0.02)
+        guard = ResilientCaller()
+        monkeypatch.setattr(llm_agent, "LLM_CLIENT", client)
+        monkeypatch.setattr(llm_agent, "LLM_GUARD", guard)
+        busy = asyncio.create_task(
+            llm_agent._run_agent(_SlowAgent(1.0), "generate_report", "p", "room-1")
+        )
+        await asyncio.sleep(0.01)
+
+        for _ in range(resilience.CIRCUIT_FAILURE_THRESHOLD + 1):
+            with pytest.raises(LlmOverloaded):
+                await llm_agent._run_agent(_SlowAgent(0.0), "judge_answer", "p", "room-2")
+        judge = guard.stats()["ops"]["judge_answer"]
+        assert judge["circuit"] == CircuitBreaker.CLOSED
+        assert judge["failures"] == 0
+        assert judge["overloaded"] == resilience.CIRCUIT_FAILURE_THRESHOLD + 1
+        assert client.stats()["queueTimeouts"] >= judge["overloaded"]
+
+        busy.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await busy
+
+    asyncio.run(scenario())
+
+
+def test_failures_after_admission_still_trip_the_breaker() -> None:
+    async def scenario() -> None:
+        guard = ResilientCaller()
+
+        async def broken() -> str:
+            raise RuntimeError("model error")
+
+        for _ in range(resilience.CIRCUIT_FAILURE_THRESHOLD):
+            with pytest.raises(LlmUnavailable) as raised:
+                await guard.call("generate_report", broken)
+            assert not isinstance(raised.value, LlmOverloaded)
+        assert guard.stats()["ops"]["generate_report"]["circuit"] == CircuitBreaker.OPEN
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import pytest
+
+from app.llm_agent import (
+    LlmQuestion,
+    _damerau_levenshtein,
+    _typo_tolerance,
+    local_judge,
+)
+
+
+def _question(answer: str) -> LlmQuestion:
+    return LlmQuestion(id="q_test", prompt="拼写: test", answer=answer, difficulty=1, topic="t")
+
+
+@pytest.mark.parametrize(
+    "length, tolerance",
+    [(1, 0), (4, 0), (5, 1), (8, 1), (9, 2), (15, 2)],
+)
+def test_typo_tolerance_by_length(length: int, tolerance: int) -> None:
+    assert _typo_tolerance(length) == tolerance
+
+
+def test_transposition_is_one_edit() -> None:
+    assert _damerau_levenshtein("recieve", "receive", 3) == 1
+    assert _damerau_levenshtein("abc", "abc", 3) == 0
+    assert _damerau_levenshtein("kitten", "sitting", 5) == 3
+
+
+def test_distance_is_capped_at_bound_plus_one() -> None:
+    assert _damerau_levenshtein("abcdef", "uvwxyz", 2) == 3
+    assert _damerau_levenshtein("a", "abcdef", 2) == 3
+
+
+@pytest.mark.parametrize(
+    "answer, given, expected",
+    [
+        # Up to four letters: no typos allowed; one edit is for the LLM.
+        ("word", "word", True),
+        ("word", "wrod", None),
+        ("word", "wxyd", False),
+        # Five to eight letters: one edit allowed; two go to the LLM.
+        ("apple", "appel", True),
+        ("apple", "aple", True),
+        ("apple", "apxlx", None),
+        ("apple", "axxlx", False),
+        ("elephant", "elephnat", True),
+        ("elephant", "elxphnat", None),
+        # Nine or more letters: two edits allowed; three go to the LLM.
+        ("beautiful", "beuatiful", True),
+        ("beautiful", "beuatifal", True),
+        ("beautiful", "beuatifxx", None),
+        ("beautiful", "bxuatifxx", False),
+    ],
+)
+def test_local_judge_tolerance_boundaries(answer: str, given: str, expected) -> None:
+    result = local_judge(_question(answer), given)
+    if expected is None:
+        assert result is None
+    else:
+        assert result is not None
+        assert result.correct is expected
+
+
+def test_local_judge_normalizes_before_comparing() -> None:
+    result = local_judge(_question("Apple"), "  APPLE. ")
+    assert result is not None
+    assert result.correct
+    assert result.reason == "exact match"
+
+
+def test_local_judge_rejects_empty_and_non_english() -> None:
+    empty = local_judge(_question("apple"), "   ")
+    assert empty is not None and not empty.correct
+    chinese = local_judge(_question("apple"), "苹果")
+    assert chinese is not None and not chinese.correct
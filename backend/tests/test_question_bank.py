@@ -0,0 +1,47 @@
+import math
+import random
+
+import pytest
+
+from app.llm_agent import LlmQuestion
+from app.question_bank import BankCursor, QuestionBank, _coprime_stride
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 4, 12, 97, 100, 360])
+def test_cursor_visits_every_entry_once_per_pass(size: int) -> None:
+    rng = random.Random(size)
+    cursor = BankCursor()
+    for _ in range(3):
+        drawn = [cursor.next_index((1, None), size, rng) for _ in range(size)]
+        assert sorted(drawn) == list(range(size))
+
+
+@pytest.mark.parametrize("size", [3, 4, 12, 100, 360])
+def test_stride_is_coprime_with_size(size: int) -> None:
+    rng = random.Random(0)
+    for _ in range(50):
+        assert math.gcd(_coprime_stride(size, rng), size) == 1
+
+
+def test_cursor_restarts_when_the_list_grows() -> None:
+    rng = random.Random(1)
+    cursor = BankCursor()
+    for _ in range(5):
+        cursor.next_index((1, None), 10, rng)
+    drawn = [cursor.next_index((1, None), 11, rng) for _ in range(11)]
+    assert sorted(drawn) == list(range(11))
+
+
+def test_sample_skips_excluded_answers() -> None:
+    bank = QuestionBank(
+        LlmQuestion(id=f"q{idx}", prompt=f"拼写: {idx}", answer=f"word{idx}", difficulty=2, topic="t")
+        for idx in range(20)
+    )
+    cursor = BankCursor()
+    seen: set[str] = set()
+    for _ in range(20):
+        question = bank.sample(2, cursor, exclude=seen)
+        assert question is not None
+        assert question.answer not in seen
+        seen.add(question.answer)
+    assert len(seen) == 20
@@ -0,0 +1,75 @@
+import asyncio
+
+import app.main as main
+from app.llm_agent import LlmQuestion
+
+
+def _questions(level: int, prefix: str, count: int) -> list[LlmQuestion]:
+    return [
+        LlmQuestion(
+            id=f"{prefix}{idx}",
+            prompt=f"拼写: {prefix}{idx}",
+            answer=f"{prefix}{idx}",
+            difficulty=level,
+            topic="t",
+        )
+        for idx in range(count)
+    ]
+
+
+class _FakeGenerator:
+    def __init__(self) -> None:
+        self.calls: list[tuple[int, str]] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def __call__(self, player_id, difficulty, count, exclude=(), room_id=None, seen=()):
+        self.calls.append((difficulty, room_id))
+        await self.release.wait()
+        batch = _questions(difficulty, f"l{difficulty}w{len(self.calls)}x", count)
+        return [question for question in batch if question.answer not in seen]
+
+
+def test_cleared_queue_does_not_burn_words(monkeypatch) -> None:
+    async def scenario() -> None:
+        generator = _FakeGenerator()
+        monkeypatch.setattr(main, "generate_unique_questions", generator)
+        room = main.RoomState("queue-room")
+        room.join("p1")
+        served = await room.next_question("p1")
+        player = room.players["p1"]
+        queued = [question.answer for question in player.question_queue]
+        assert served.answer in player.seen
+        assert queued and not any(word in player.seen for word in queued)
+
+        player.question_queue.clear()
+        assert not any(word in player.seen for word in queued)
+
+    asyncio.run(scenario())
+
+
+def test_prefetch_runs_one_batch_on_the_prefetch_lane(monkeypatch) -> None:
+    async def scenario() -> None:
+        generator = _FakeGenerator()
+        monkeypatch.setattr(main, "generate_unique_questions", generator)
+        monkeypatch.setattr(main.QUESTION_CACHE, "_workers", [])
+        room = main.RoomState("lane-room")
+        room.join("p1")
+        player = room.players["p1"]
+        player.correct_streak = 2
+
+        generator.release.clear()
+        room.prefetch_next("p1")
+        room.prefetch_next("p1")
+        await asyncio.sleep(0)
+        # One batch, for the level a correct answer would reach.
+        assert generator.calls == [(2, "lane-room:prefetch")]
+
+        room.apply_answer("p1", True)
+        generator.release.set()
+        question = await room.next_question("p1")
+        assert question.difficulty == 2
+        assert "p1" not in room._prefetch
+        room.reset()
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import asyncio
+
+import app.llm_agent as llm_agent
+import app.reports as reports
+from app.reports import STATUS_DONE, ReportQueue
+from app.resilience import LlmUnavailable
+
+
+def test_failed_generation_completes_with_fallback(monkeypatch) -> None:
+    async def boom(*_args, **_kwargs) -> str:
+        raise RuntimeError("model exploded")
+
+    async def scenario() -> None:
+        monkeypatch.setattr(reports, "generate_model_report", boom)
+        queue = ReportQueue(workers=1)
+        queue.start()
+        notified: list[str] = []
+        job = queue.submit(["apple"], 30, listener=lambda done: notified.append(done.status))
+        for _ in range(50):
+            if job.status == STATUS_DONE:
+                break
+            await asyncio.sleep(0.01)
+        assert job.status == STATUS_DONE
+        assert "apple" in (job.text or "")
+        assert notified == [STATUS_DONE]
+        assert queue.stats()["pending"] == 0
+        assert queue.stats()["failed"] == 1
+        # The fallback is not cached, so the next request retries the model.
+        assert queue._results.get(job.key) is None
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_identical_requests_share_one_job(monkeypatch) -> None:
+    calls: list[list[str]] = []
+
+    async def fake(words, score, room_id=None) -> str:
+        calls.append(words)
+        await asyncio.sleep(0.01)
+        return "report"
+
+    async def scenario() -> None:
+        monkeypatch.setattr(reports, "generate_model_report", fake)
+        queue = ReportQueue(workers=1)
+        queue.start()
+        first = queue.submit(["Apple", "pear"], 31)
+        second = queue.submit(["pear", "apple"], 38)
+        assert first is second
+        await asyncio.sleep(0.05)
+        assert first.text == "report"
+        cached = queue.submit(["apple", "pear"], 35)
+        assert cached.status == STATUS_DONE
+        assert len(calls) == 1
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_unavailable_llm_does_not_cache_the_fallback(monkeypatch) -> None:
+    class _DownAgent:
+        async def run(self, prompt: str) -> str:
+            raise LlmUnavailable("circuit open")
+
+    async def unavailable(agent, op, prompt, room_id):
+        raise LlmUnavailable("circuit open")
+
+    async def scenario() -> None:
+        monkeypatch.setattr(llm_agent, "_get_agent", lambda: _DownAgent())
+        monkeypatch.setattr(llm_agent, "_run_agent", unavailable)
+        queue = ReportQueue(workers=1)
+        queue.start()
+        job = queue.submit(["apple"], 30)
+        for _ in range(50):
+            if job.status == STATUS_DONE:
+                break
+            await asyncio.sleep(0.01)
+        assert job.text == llm_agent.fallback_report(["apple"])
+        assert len(queue._results) == 0
+        assert queue.stats()["failed"] == 1
+        await queue.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+from app.scheduler import GameClock
+
+
+def test_cancelled_handles_never_fire_and_are_skipped_lazily() -> None:
+    async def scenario() -> None:
+        clock = GameClock()
+        fired: list[str] = []
+        now = time.monotonic()
+        keep = clock.call_at(now + 0.01, fired.append, "keep")
+        drop = clock.call_at(now + 0.005, fired.append, "drop")
+        clock.cancel(drop)
+        # Lazy: still in the heap, but no longer counted.
+        assert drop in clock._heap
+        assert len(clock) == 1
+        await asyncio.sleep(0.05)
+        assert fired == ["keep"]
+        assert not clock._heap
+        assert clock._cancelled == 0
+        # Cancelling a handle that already fired does not skew the count.
+        clock.cancel(keep)
+        assert clock._cancelled == 0
+        await clock.stop()
+
+    asyncio.run(scenario())
+
+
+def test_heap_is_compacted_once_cancelled_outnumber_live() -> None:
+    async def scenario() -> None:
+        clock = GameClock()
+        far = time.monotonic() + 3600
+        handles = [clock.call_at(far + idx, lambda: None) for idx in range(200)]
+        for handle in handles[:64]:
+            clock.cancel(handle)
+        assert len(clock._heap) == 200
+
+        for handle in handles[64:150]:
+            clock.cancel(handle)
+        # The 101st cancel tipped the balance: those entries were dropped,
+        # later cancels wait lazily for the next compaction.
+        assert len(clock._heap) == 99
+        assert len(clock) == 50
+        assert all(not handle.scheduled for handle in handles[:101])
+        assert all(handle.scheduled for handle in handles[101:])
+        assert clock._heap[0] is handles[101]
+        await clock.stop()
+
+    asyncio.run(scenario())
+
+
+def test_fires_in_deadline_order_and_repeats_intervals() -> None:
+    async def scenario() -> None:
+        clock = GameClock()
+        fired: list[str] = []
+        now = time.monotonic()
+        clock.call_at(now + 0.02, fired.append, "second")
+        clock.call_at(now + 0.01, fired.append, "first")
+        ticks = clock.call_every(0.01, fired.append, "tick")
+        await asyncio.sleep(0.06)
+        clock.cancel(ticks)
+        assert fired.index("first") < fired.index("second")
+        assert fired.count("tick") >= 2
+        assert len(clock) == 0
+        await clock.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,56 @@
+from app.seen import BloomSeenSet, ExactSeenSet, new_seen_set
+
+
+def test_bloom_has_no_false_negatives_within_capacity() -> None:
+    seen = BloomSeenSet(capacity=100, error_rate=0.01)
+    words = [f"word{idx}" for idx in range(100)]
+    for word in words:
+        seen.add(word)
+    assert all(word in seen for word in words)
+    assert "WORD7" in seen
+    assert 123 not in seen
+
+
+def test_bloom_rotates_generations_at_capacity() -> None:
+    seen = BloomSeenSet(capacity=50, error_rate=0.01)
+    first = [f"first{idx}" for idx in range(50)]
+    second = [f"second{idx}" for idx in range(50)]
+    for word in first:
+        seen.add(word)
+    assert seen._previous is None
+    assert len(seen) == 50
+
+    # The next new word starts a fresh generation; the old one is still
+    # consulted, so nothing is forgotten yet.
+    for word in second:
+        seen.add(word)
+    assert seen._previous is not None
+    assert seen._previous.count == 50
+    assert len(seen) == 100
+    assert all(word in seen for word in first + second)
+
+    # A second rotation drops the oldest generation.
+    seen.add("third0")
+    assert len(seen) == 51
+    assert all(word in seen for word in second)
+    forgotten = sum(word not in seen for word in first)
+    assert forgotten > 40
+
+
+def test_bloom_false_positive_rate_stays_near_target() -> None:
+    seen = BloomSeenSet(capacity=1000, error_rate=0.01)
+    for idx in range(5000):
+        seen.add(f"seen{idx}")
+    false_positives = sum(f"fresh{idx}" in seen for idx in range(5000))
+    # Two live generations at most double the per-generation rate.
+    assert false_positives / 5000 < 0.04
+
+
+def test_exact_seen_set_forgets_oldest_past_limit() -> None:
+    seen = ExactSeenSet(limit=3)
+    for word in ("a", "b", "c", "d"):
+        seen.add(word)
+    assert "a" not in seen
+    assert all(word in seen for word in ("b", "c", "d"))
+    assert isinstance(new_seen_set("bloom"), BloomSeenSet)
+    assert isinstance(new_seen_set("exact"), ExactSeenSet)
@@ -0,0 +1,255 @@
+import asyncio
+import json
+from collections import deque
+from decimal import Decimal
+
+import app.main as main
+import app.settlement as settlement
+from app.chain_index import DEPOSITED, ChainEvent, ChainIndexer, IndexStore
+from app.scheduler import GameClock
+from app.settlement import (
+    GameResult,
+    Payout,
+    SettlementQueue,
+    batch_id_for,
+    bump_fees,
+    compute_payouts,
+)
+from app.storage import MemoryBackend, SqliteBackend
+
+FEE = 10**16
+ALICE = "0x" + "a1" * 20
+BOB = "0x" + "b2" * 20
+
+
+def test_no_payout_below_the_minimum_players() -> None:
+    assert compute_payouts([("p1", ALICE)], FEE, min_players=2) == []
+    assert compute_payouts([("p1", ALICE), ("p2", BOB)], 0, min_players=2) == []
+
+
+def test_prize_never_exceeds_what_was_collected() -> None:
+    payouts = compute_payouts(
+        [("p1", ALICE), ("p2", BOB)],
+        2 * FEE,
+        shares=[Decimal("0.6"), Decimal("0.3")],
+        min_players=2,
+    )
+    assert [(p.player_id, p.amount_wei) for p in payouts] == [
+        ("p1", 12 * 10**15),
+        ("p2", 6 * 10**15),
+    ]
+    assert sum(p.amount_wei for p in payouts) <= 2 * FEE
+
+
+def test_game_result_pays_only_paid_entrants_from_their_fees(monkeypatch) -> None:
+    async def scenario() -> None:
+        indexer = ChainIndexer(store=IndexStore(MemoryBackend()))
+        indexer._apply(
+            [ChainEvent(DEPOSITED, ALICE, FEE, block=1), ChainEvent(DEPOSITED, BOB, FEE, block=1)]
+        )
+        monkeypatch.setattr(main, "CHAIN_INDEX", indexer)
+        room = main.RoomState("settle-room")
+        key = room.entry_key()
+        for player_id, address in (("alice", ALICE), ("bob", BOB)):
+            assert await indexer.claim_entry(address, key, FEE)
+            room.join(player_id)
+            room.entrants[address] = player_id
+            room.players[player_id].payout_address = address
+        # A free rider with the top score never ranks for the prize.
+        room.join("rider")
+        room.players["rider"].score = 100
+        room._index_score("rider", room.players["rider"])
+        room.apply_answer("bob", True)
+        room.winner_id = "bob"
+
+        result = room.game_result()
+        assert result.key == key
+        assert [(p.player_id, p.amount_wei) for p in result.payouts] == [("bob", 2 * FEE)]
+
+        # Alone in the room, the only paid player wins nothing back.
+        solo = main.RoomState("solo-room")
+        solo_key = solo.entry_key()
+        indexer._apply([ChainEvent(DEPOSITED, ALICE, FEE, block=2)])
+        assert await indexer.claim_entry(ALICE, solo_key, FEE)
+        solo.join("alice")
+        solo.entrants[ALICE] = "alice"
+        solo.winner_id = "alice"
+        assert solo.game_result().payouts == []
+
+    asyncio.run(scenario())
+
+
+def test_game_over_is_broadcast_even_when_settlement_fails(monkeypatch) -> None:
+    class _Conn:
+        framing = main.JSON_FRAMING
+
+        def __init__(self) -> None:
+            self.messages: list = []
+
+        def send(self, message, _priority) -> bool:
+            self.messages.append(message)
+            return True
+
+    class _BrokenSettlement(SettlementQueue):
+        async def submit(self, result) -> None:
+            raise ValueError("bad shares")
+
+    async def scenario() -> None:
+        clock = GameClock()
+        settlement = _BrokenSettlement()
+        monkeypatch.setattr(main, "GAME_CLOCK", clock)
+        monkeypatch.setattr(main, "SETTLEMENT", settlement)
+        room = main.RoomState("broken-settle-room")
+        conn = _Conn()
+        room.connections.add(conn)
+        room.join("p1")
+
+        await room.finish_game("time_up")
+        await settlement.stop()
+        assert any('"game_over"' in message for message in conn.messages)
+        assert settlement.stats()["submitErrors"] == 1
+
+        room.reset()
+        await clock.stop()
+
+    asyncio.run(scenario())
+
+
+class _FakeClient:
+    address = "0x" + "5e" * 20
+
+    def __init__(self, stuck_receipts: int = 0) -> None:
+        self.sends: list[tuple] = []
+        self.settled: set[bytes] = set()
+        self.stuck_receipts = stuck_receipts
+
+    async def is_settled(self, batch_id: bytes) -> bool:
+        return batch_id in self.settled
+
+    async def send_batch(self, batch_id, recipients, amounts, nonce=None, attempt=0):
+        self.sends.append((batch_id, list(recipients), list(amounts), nonce, attempt))
+        return f"0x{len(self.sends):064x}", 7 if nonce is None else nonce
+
+    async def wait_for_receipt(self, tx_hash: str, timeout: float) -> bool:
+        if self.stuck_receipts:
+            self.stuck_receipts -= 1
+            raise TimeoutError("receipt not found")
+        self.settled.add(self.sends[-1][0])
+        return True
+
+
+def _game(key: str, *payouts: tuple) -> GameResult:
+    return GameResult(key, key.split(":")[0], [Payout(*payout) for payout in payouts])
+
+
+def test_next_batch_takes_batch_size_games_and_merges_recipients() -> None:
+    queue = SettlementQueue(_FakeClient(), MemoryBackend(), batch_size=2)
+    queue._queued.extend(
+        [
+            _game("r1:g1", ("alice", ALICE, FEE)),
+            _game("r2:g1", ("alice2", ALICE, FEE), ("bob", BOB, FEE // 2)),
+            _game("r3:g1", ("bob", BOB, FEE)),
+        ]
+    )
+    record = queue._next_batch()
+    assert record["batchId"] == "0x" + batch_id_for(["r1:g1", "r2:g1"]).hex()
+    assert record["recipients"] == [ALICE, BOB]
+    assert record["amounts"] == [str(2 * FEE), str(FEE // 2)]
+    assert [game.key for game in queue._queued] == ["r3:g1"]
+    assert record["batchId"] in queue._open
+
+
+def test_batch_id_depends_only_on_the_games_it_settles() -> None:
+    assert batch_id_for(["a:1", "b:1"]) == batch_id_for(["b:1", "a:1"])
+    assert batch_id_for(["a:1", "b:1"]) != batch_id_for(["a:1"])
+
+
+def test_stuck_batch_is_replaced_at_the_same_nonce_with_higher_fees(monkeypatch) -> None:
+    monkeypatch.setattr(settlement, "SETTLEMENT_RETRY_SECONDS", 0)
+
+    async def scenario() -> None:
+        client = _FakeClient(stuck_receipts=1)
+        store = MemoryBackend()
+        queue = SettlementQueue(client, store)
+        queue._queued.append(_game("r1:g1", ("alice", ALICE, FEE)))
+        record = queue._next_batch()
+        await queue._settle(record)
+
+        assert [(nonce, attempt) for *_, nonce, attempt in client.sends] == [(None, 0), (7, 1)]
+        assert client.sends[0][0] == client.sends[1][0]
+        assert queue.stats()["retries"] == 1
+        assert queue.stats()["batchesSettled"] == 1
+        assert queue._open == {}
+        assert (await queue.reward("alice"))["status"] == settlement.STATUS_SETTLED
+
+    asyncio.run(scenario())
+    first = bump_fees({"maxFeePerGas": 1000, "maxPriorityFeePerGas": 100}, 0)
+    retry = bump_fees({"maxFeePerGas": 1000, "maxPriorityFeePerGas": 100}, 2)
+    assert retry["maxFeePerGas"] > first["maxFeePerGas"]
+    assert retry["maxPriorityFeePerGas"] > first["maxPriorityFeePerGas"]
+
+
+def test_restart_resumes_open_batches_without_paying_twice() -> None:
+    async def scenario() -> None:
+        store = MemoryBackend()
+        client = _FakeClient()
+        before = SettlementQueue(client, store)
+        before._queued.append(_game("r1:g1", ("alice", ALICE, FEE)))
+        submitted = before._next_batch()
+        submitted.update(status=settlement.STATUS_SUBMITTED, nonce=7, txHash="0x01")
+        # The transaction landed but the process died before recording it.
+        client.settled.add(bytes.fromhex(submitted["batchId"][2:]))
+        before._queued.append(_game("r2:g1", ("bob", BOB, FEE)))
+        await before._save_open()
+
+        after = SettlementQueue(client, store, flush_seconds=0.01)
+        await after.start()
+        for _ in range(100):
+            if after.stats()["batchesSettled"] == 2:
+                break
+            await asyncio.sleep(0.01)
+        await after.stop()
+
+        assert after.stats()["batchesSettled"] == 2
+        # Only the batch that never reached the chain was sent.
+        assert [send[0].hex() for send in client.sends] == [batch_id_for(["r2:g1"]).hex()]
+        assert (await after.reward("alice"))["status"] == settlement.STATUS_SETTLED
+        assert (await after.reward("bob"))["status"] == settlement.STATUS_SETTLED
+
+    asyncio.run(scenario())
+
+
+def test_settlement_never_keeps_records_in_the_memory_cache(monkeypatch) -> None:
+    monkeypatch.setattr(settlement, "SETTLEMENT_ENABLED", True)
+    assert settlement.create_settlement_store(MemoryBackend()).name == "sqlite"
+    durable = SqliteBackend(":memory:")
+    assert settlement.create_settlement_store(durable) is durable
+
+
+def test_non_owner_shards_forward_games_to_the_single_sender() -> None:
+    async def scenario() -> None:
+        owner_client = _FakeClient()
+        owner = SettlementQueue(owner_client, MemoryBackend(), private_key="0xkey")
+        shard = SettlementQueue(_FakeClient(), MemoryBackend(), private_key="0xkey")
+        shard.forward_to("http://owner/settlement/games")
+        posts: list[bytes] = []
+
+        async def post(body: bytes) -> bool:
+            posts.append(body)
+            assert owner.accepts(body, shard.sign(body))
+            assert not owner.accepts(body, "0" * 64)
+            await owner.accept_forwarded(json.loads(body))
+            return True
+
+        shard._post = post
+        await shard.submit(_game("r1:g1", ("alice", ALICE, FEE)))
+        await shard._forward_queued()
+        # A forward retried after a lost reply is not queued twice.
+        await owner.accept_forwarded(json.loads(posts[0]))
+
+        assert shard._queued == deque() and shard.stats()["forwarded"] == 1
+        assert [game.key for game in owner._queued] == ["r1:g1"]
+        # Forwarders never sign transactions themselves.
+        assert not shard.accepts(posts[0], shard.sign(posts[0]))
+
+    asyncio.run(scenario())
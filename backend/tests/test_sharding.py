@@ -0,0 +1,73 @@
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.sharding import LocalCoordinator
+
+
+def _ring() -> LocalCoordinator:
+    ring = LocalCoordinator("shard-a")
+    ring.register("shard-a", "http://shard-a:8000")
+    ring.register("shard-b", "http://shard-b:8000/")
+    return ring
+
+
+def test_local_coordinator_views_share_one_ring() -> None:
+    ring = _ring()
+    owner = ring.owner("arena")
+    assert owner is not None
+    other = "shard-b" if owner.shard_id == "shard-a" else "shard-a"
+    assert ring.view_for(owner.shard_id).is_local("arena")
+    assert not ring.view_for(other).is_local("arena")
+    assert ring.ws_url("arena") == f"{owner.ws_base_url}/ws/arena"
+
+    ring.unregister(other)
+    assert ring.view_for(other).owner("arena").shard_id == owner.shard_id
+
+
+def test_match_redirects_to_owning_shard(monkeypatch) -> None:
+    ring = _ring()
+    owner = ring.owner("arena")
+    other = "shard-b" if owner.shard_id == "shard-a" else "shard-a"
+    client = TestClient(main.app, follow_redirects=False)
+
+    monkeypatch.setattr(main, "get_coordinator", lambda: ring.view_for(other))
+    response = client.post("/match", params={"player_id": "p1"})
+    assert response.status_code == 307
+    assert response.headers["location"] == f"{owner.base_url}/match?player_id=p1"
+
+    monkeypatch.setattr(main, "get_coordinator", lambda: ring.view_for(owner.shard_id))
+    response = client.post("/match", params={"player_id": "p1"})
+    assert response.status_code == 200
+    assert response.json()["room_id"] == "arena"
+    assert "p1" in response.json()["players"]
+    main.ROOMS["arena"].reset()
+
+
+def test_per_room_and_per_player_endpoints_follow_the_ring(monkeypatch) -> None:
+    ring = _ring()
+    client = TestClient(main.app, follow_redirects=False)
+
+    def remote(key: str) -> str:
+        owner = ring.owner(key)
+        other = "shard-b" if owner.shard_id == "shard-a" else "shard-a"
+        monkeypatch.setattr(main, "get_coordinator", lambda: ring.view_for(other))
+        return owner.base_url
+
+    base = remote("room-7")
+    response = client.get("/report/r_1", params={"room_id": "room-7"})
+    assert response.status_code == 307
+    assert response.headers["location"] == f"{base}/report/r_1?room_id=room-7"
+    response = client.post("/report", json={"wrong_words": ["a"], "room_id": "room-7"})
+    assert response.status_code == 307
+    assert response.headers["location"] == f"{base}/report"
+
+    base = remote("player:p9")
+    response = client.get("/summary/p9")
+    assert response.status_code == 307
+    assert response.headers["location"] == f"{base}/summary/p9"
+
+    # Without settlement, rewards stay on the shard that ran the game.
+    base = remote("room-7")
+    response = client.get("/reward", params={"player_id": "p9", "room_id": "room-7"})
+    assert response.status_code == 307
+    assert response.headers["location"].startswith(f"{base}/reward?")
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from app.storage import RedisBackend, RespError, SqliteBackend, WriteBehindBackend
+
+
+class _BlockingBackend(WriteBehindBackend):
+    name = "blocking"
+
+    def __init__(self) -> None:
+        super().__init__(flush_interval=60, batch_size=2)
+        self.written: dict = {}
+        self.release = asyncio.Event()
+
+    async def _write_batch(self, batch) -> None:
+        await self.release.wait()
+        self.written.update(batch)
+
+
+def test_cancelled_flush_requeues_the_batch() -> None:
+    async def scenario() -> None:
+        backend = _BlockingBackend()
+        await backend.put("room", "a", {"v": 1})
+        await backend.put("room", "b", {"v": 1})
+        flush = asyncio.create_task(backend.flush())
+        await asyncio.sleep(0)
+        # A newer write for the in-flight key must win over the requeued one.
+        await backend.put("room", "a", {"v": 2})
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        assert backend._pending[("room", "a")] == {"v": 2}
+        assert backend._pending[("room", "b")] == {"v": 1}
+
+        backend.release.set()
+        await backend.flush()
+        assert backend.written[("room", "a")] == {"v": 2}
+        assert not backend._pending
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_round_trip_and_close(tmp_path) -> None:
+    async def scenario() -> None:
+        backend = SqliteBackend(path=str(tmp_path / "state.db"))
+        await backend.start()
+        await backend.put("room", "a", {"v": 1})
+        await backend.close()
+
+        reopened = SqliteBackend(path=str(tmp_path / "state.db"))
+        await reopened.start()
+        assert await reopened.get("room", "a") == {"v": 1}
+        await reopened.close()
+        assert await reopened._read("room", "a") is None
+
+    asyncio.run(scenario())
+
+
+def test_redis_pipeline_drains_replies_after_an_error() -> None:
+    async def scenario() -> None:
+        replies = [b"-ERR wrong type\r\n+OK\r\n", b"$5\r\nhello\r\n"]
+
+        async def handle(reader, writer) -> None:
+            for reply in replies:
+                await reader.read(65536)
+                writer.write(reply)
+                await writer.drain()
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        backend = RedisBackend(url=f"redis://127.0.0.1:{port}/0")
+        await backend._ensure_connection()
+        with pytest.raises(RespError):
+            await backend._pipeline([("SET", "k", "v"), ("SET", "k2", "v")])
+        # The +OK for the second command was consumed, so the next reply
+        # lines up with its command.
+        assert await backend._pipeline([("GET", "k")]) == ["hello"]
+        await backend._close()
+        server.close()
+        await server.wait_closed()
+
+    asyncio.run(scenario())
@@ -6,9 +6,13 @@ contract GamePool {
     uint256 public totalPot;
 
     mapping(address => uint256) public deposits;
+    mapping(bytes32 => bool) public settledBatches;
+    mapping(address => uint256) public unclaimed;
 
     event Deposited(address indexed player, uint256 amount);
     event Payout(address indexed to, uint256 amount);
+    event BatchSettled(bytes32 indexed batchId, uint256 count, uint256 total);
+    event PayoutDeferred(address indexed to, uint256 amount);
 
     modifier onlyOwner() {
         require(msg.sender == owner, "not owner");
@@ -33,4 +37,45 @@ contract GamePool {
         require(ok, "transfer failed");
         emit Payout(to, amount);
     }
+
+    // Pays many winners in one transaction. batchId is the caller's
+    // idempotency key: replaying a settled batch reverts instead of paying
+    // twice. A recipient that rejects the transfer does not block the rest;
+    // its amount is kept for it to withdraw.
+    function batchPayout(
+        bytes32 batchId,
+        address[] calldata recipients,
+        uint256[] calldata amounts
+    ) external onlyOwner {
+        require(!settledBatches[batchId], "batch settled");
+        require(recipients.length == amounts.length, "length mismatch");
+        settledBatches[batchId] = true;
+
+        uint256 total;
+        for (uint256 i = 0; i < amounts.length; i++) {
+            total += amounts[i];
+        }
+        require(total <= address(this).balance, "insufficient");
+        totalPot -= total;
+
+        for (uint256 i = 0; i < recipients.length; i++) {
+            (bool ok, ) = recipients[i].call{value: amounts[i], gas: 10000}("");
+            if (ok) {
+                emit Payout(recipients[i], amounts[i]);
+            } else {
+                unclaimed[recipients[i]] += amounts[i];
+                emit PayoutDeferred(recipients[i], amounts[i]);
+            }
+        }
+        emit BatchSettled(batchId, recipients.length, total);
+    }
+
+    function withdraw() external {
+        uint256 amount = unclaimed[msg.sender];
+        require(amount > 0, "nothing owed");
+        unclaimed[msg.sender] = 0;
+        (bool ok, ) = msg.sender.call{value: amount}("");
+        require(ok, "transfer failed");
+        emit Payout(msg.sender, amount);
+    }
 }
@@ -3,6 +3,7 @@
 import { useCallback, useEffect, useRef, useState } from "react";
 import Link from "next/link";
 import { useRouter, useSearchParams } from "next/navigation";
+import { formatEther } from "viem";
 import {
   GunEliminationOverlay,
   GunEliminationOverlayHandle
@@ -34,6 +35,7 @@ export default function ArenaPage() {
     sessionStorage.setItem("playerId", id);
     return id;
   });
+  const { address, signMessage, getTotalPot } = useLocalWallet();
   const {
     question,
     score,
@@ -50,9 +52,7 @@ export default function ArenaPage() {
     gameOver,
     winnerId,
     notices
-  } = useArenaClient(playerId, roomId);
-  const { address, isConnected: walletConnected, payout, getTotalPot } =
-    useLocalWallet();
+  } = useArenaClient(playerId, roomId, address, signMessage);
   const [answer, setAnswer] = useState("");
   const overlayRef = useRef<GunEliminationOverlayHandle>(null);
   const victoryRef = useRef<VictoryTrophyOverlayHandle>(null);
@@ -185,15 +185,25 @@ export default function ArenaPage() {
       setVictoryPlayed(true);
       (async () => {
         try {
+          // The server settles prizes on-chain from the entries collected;
+          // the client only shows what it was awarded.
           let amount = "0.0";
           try {
-            amount = await getTotalPot();
-            const payoutAmount = Number(amount);
-            if (walletConnected && address && payoutAmount > 0) {
-              await payout(address, amount);
+            const response = await fetch(
+              `http://127.0.0.1:8000/reward?player_id=${encodeURIComponent(
+                playerId
+              )}&room_id=${encodeURIComponent(roomId)}`
+            );
+            // amountWei is the raw value; the server's "amount" is display text.
+            const reward = (await response.json()) as {
+              roomId?: string;
+              amountWei?: string;
+            };
+            if (reward.roomId === roomId && reward.amountWei) {
+              amount = formatEther(BigInt(reward.amountWei));
             }
           } catch {
-            // keep amount as-is for display if payout fails
+            // no reward recorded yet: show zero
           }
           await victoryRef.current?.play({
             amount: `${Number(amount).toFixed(4)} ETH`
@@ -212,7 +222,7 @@ export default function ArenaPage() {
       await postSummary(true);
       router.push("/summary");
     })();
-  }, [gameOver, winnerId, playerId, router, postSummary, getTotalPot, payout, walletConnected, address]);
+  }, [gameOver, winnerId, playerId, roomId, router, postSummary]);
 
   return (
     <main className="page">
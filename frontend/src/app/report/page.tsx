@@ -2,18 +2,26 @@
 
 import { useEffect, useState } from "react";
 import Link from "next/link";
+import type { ReportJob } from "../../lib/types";
 
-type ReportResponse = {
-  text: string;
-};
+const API_BASE = "http://127.0.0.1:8000";
+const POLL_INTERVAL_MS = 1000;
+const POLL_TIMEOUT_MS = 30000;
 
 export default function ReportPage() {
   const [text, setText] = useState<string>("正在生成评价...");
 
   useEffect(() => {
+    let cancelled = false;
+    let timer: ReturnType<typeof setTimeout> | undefined;
+
+    const show = (job: ReportJob) => {
+      setText(job.text || "暂无评价内容。");
+    };
+
     const run = async () => {
       try {
-        const response = await fetch("http://127.0.0.1:8000/report", {
+        const response = await fetch(`${API_BASE}/report`, {
           method: "POST",
           headers: { "Content-Type": "application/json" },
           body: JSON.stringify({
@@ -21,13 +29,47 @@ export default function ReportPage() {
             score: 60
           })
         });
-        const data = (await response.json()) as ReportResponse;
-        setText(data.text || "暂无评价内容。");
+        const job = (await response.json()) as ReportJob;
+        if (job.status === "done") {
+          show(job);
+          return;
+        }
+        const deadline = Date.now() + POLL_TIMEOUT_MS;
+        const poll = async () => {
+          if (cancelled) return;
+          try {
+            // Jobs live on the shard that owns the room; the room id routes the poll.
+            const room = job.roomId
+              ? `?room_id=${encodeURIComponent(job.roomId)}`
+              : "";
+            const statusResponse = await fetch(
+              `${API_BASE}/report/${job.jobId}${room}`
+            );
+            const current = (await statusResponse.json()) as Partial<ReportJob>;
+            if (cancelled) return;
+            if (current.status === "done") {
+              show(current as ReportJob);
+              return;
+            }
+          } catch {
+            // Transient failure: keep polling until the deadline.
+          }
+          if (Date.now() > deadline) {
+            setText("暂时无法获取评价内容，请稍后重试。");
+            return;
+          }
+          timer = setTimeout(poll, POLL_INTERVAL_MS);
+        };
+        timer = setTimeout(poll, POLL_INTERVAL_MS);
       } catch {
         setText("暂时无法获取评价内容，请稍后重试。");
       }
     };
     run();
+    return () => {
+      cancelled = true;
+      if (timer) clearTimeout(timer);
+    };
   }, []);
 
   return (
@@ -17,7 +17,54 @@ const mockQuestions: Question[] = [
 
 const nextQuestion = (idx: number) => mockQuestions[idx % mockQuestions.length];
 
-export function useArenaClient(playerId: string, roomId: string = "arena") {
+// The server only trusts an address (for entry fees and payouts) when the
+// join carries the wallet's signature over a fresh server challenge.
+async function signedJoinPayload(
+  playerId: string,
+  address?: string,
+  signMessage?: (message: string) => Promise<string | undefined>
+): Promise<{
+  playerId: string;
+  address?: string;
+  signature?: string;
+  nonce?: string;
+}> {
+  if (!address || !signMessage) {
+    return { playerId };
+  }
+  try {
+    const response = await fetch(
+      `http://127.0.0.1:8000/pool/challenge/${address}`,
+      { method: "POST" }
+    );
+    const challenge = (await response.json()) as {
+      ok: boolean;
+      nonce?: string;
+      message?: string;
+    };
+    if (!challenge.ok || !challenge.message || !challenge.nonce) {
+      return { playerId };
+    }
+    const signature = await signMessage(challenge.message);
+    return signature
+      ? { playerId, address, signature, nonce: challenge.nonce }
+      : { playerId };
+  } catch {
+    return { playerId };
+  }
+}
+
+export function useArenaClient(
+  playerId: string,
+  roomId: string = "arena",
+  payoutAddress?: string,
+  signMessage?: (message: string) => Promise<string | undefined>
+) {
+  // Read at join time; a wallet connecting later must not reopen the socket.
+  const payoutAddressRef = useRef(payoutAddress);
+  payoutAddressRef.current = payoutAddress;
+  const signMessageRef = useRef(signMessage);
+  signMessageRef.current = signMessage;
   const [question, setQuestion] = useState<Question>(() => mockQuestions[0]);
   const [score, setScore] = useState(0);
   const [isConnected, setIsConnected] = useState(false);
@@ -44,6 +91,7 @@ export function useArenaClient(playerId: string, roomId: string = "arena") {
   >(null);
   const [notices, setNotices] = useState<string[]>([]);
   const socketRef = useRef<WebSocket | null>(null);
+  const roomSeqRef = useRef<number | null>(null);
 
   const wsUrl = useMemo(() => {
     const base =
@@ -73,21 +121,34 @@ export function useArenaClient(playerId: string, roomId: string = "arena") {
         if (canceled) {
           return;
         }
-        const socket = new WebSocket(wsUrl);
+        const openSocket = (url: string) => {
+        const socket = new WebSocket(url);
         socketRef.current = socket;
-        socket.onopen = () => {
+        socket.onopen = async () => {
           if (canceled) {
             return;
           }
           setIsConnected(true);
           const joinEvent: ClientEvent = {
             type: "join",
-            payload: { playerId }
+            payload: await signedJoinPayload(
+              playerId,
+              payoutAddressRef.current,
+              signMessageRef.current
+            )
           };
-          socket.send(JSON.stringify(joinEvent));
+          if (!canceled && socket.readyState === WebSocket.OPEN) {
+            socket.send(JSON.stringify(joinEvent));
+          }
         };
         socket.onmessage = (evt) => {
         const parsed = JSON.parse(evt.data) as ServerEvent;
+        if (parsed.type === "redirect") {
+          socket.onclose = null;
+          socket.close();
+          openSocket(parsed.payload.url);
+          return;
+        }
         if (parsed.type === "question") {
           setQuestion(parsed.payload);
         }
@@ -115,6 +176,7 @@ export function useArenaClient(playerId: string, roomId: string = "arena") {
           });
         }
         if (parsed.type === "room") {
+          roomSeqRef.current = parsed.payload.seq;
           setRoomPlayers(parsed.payload.players);
           setAliveCount(parsed.payload.aliveCount);
           setDeadCount(parsed.payload.deadCount);
@@ -123,6 +185,38 @@ export function useArenaClient(playerId: string, roomId: string = "arena") {
           setServerOffsetMs(parsed.payload.serverNowMs - Date.now());
           setStartedAtMs(parsed.payload.startedAtMs);
         }
+        if (parsed.type === "room_delta") {
+          const lastSeq = roomSeqRef.current;
+          if (lastSeq === null || parsed.payload.seq <= lastSeq) {
+            return;
+          }
+          if (parsed.payload.seq !== lastSeq + 1) {
+            roomSeqRef.current = null;
+            const resyncEvent: ClientEvent = { type: "resync" };
+            socket.send(JSON.stringify(resyncEvent));
+            return;
+          }
+          roomSeqRef.current = parsed.payload.seq;
+          const changed = parsed.payload.players;
+          setRoomPlayers((prev) => {
+            const next = [...prev];
+            for (const entry of changed) {
+              const idx = next.findIndex((player) => player.id === entry.id);
+              if (idx === -1) {
+                next.push(entry);
+              } else {
+                next[idx] = entry;
+              }
+            }
+            return next;
+          });
+          setAliveCount(parsed.payload.aliveCount);
+          setDeadCount(parsed.payload.deadCount);
+          setTimeLeft(parsed.payload.timeLeft);
+          setDurationSeconds(parsed.payload.durationSeconds);
+          setServerOffsetMs(parsed.payload.serverNowMs - Date.now());
+          setStartedAtMs(parsed.payload.startedAtMs);
+        }
         if (parsed.type === "game_over") {
           setRoomPlayers(parsed.payload.players);
           setAliveCount(parsed.payload.aliveCount);
@@ -137,6 +231,8 @@ export function useArenaClient(playerId: string, roomId: string = "arena") {
         }
         };
         socket.onclose = () => setIsConnected(false);
+        };
+        openSocket(wsUrl);
       })();
     } catch {
       setIsConnected(false);
@@ -4,7 +4,41 @@ export const gamePoolAddress =
   (process.env.NEXT_PUBLIC_GAMEPOOL_ADDRESS as `0x${string}` | undefined) ??
   ("0x5FbDB2315678afecb367f032d93F642f64180aa3" as `0x${string}`);
 
+// Mirrors chain/contracts/GamePool.sol; keep in sync when the contract changes.
 export const gamePoolAbi = [
+  {
+    type: "event",
+    name: "Deposited",
+    inputs: [
+      { name: "player", type: "address", indexed: true },
+      { name: "amount", type: "uint256", indexed: false }
+    ]
+  },
+  {
+    type: "event",
+    name: "Payout",
+    inputs: [
+      { name: "to", type: "address", indexed: true },
+      { name: "amount", type: "uint256", indexed: false }
+    ]
+  },
+  {
+    type: "event",
+    name: "BatchSettled",
+    inputs: [
+      { name: "batchId", type: "bytes32", indexed: true },
+      { name: "count", type: "uint256", indexed: false },
+      { name: "total", type: "uint256", indexed: false }
+    ]
+  },
+  {
+    type: "event",
+    name: "PayoutDeferred",
+    inputs: [
+      { name: "to", type: "address", indexed: true },
+      { name: "amount", type: "uint256", indexed: false }
+    ]
+  },
   {
     type: "function",
     name: "deposit",
@@ -19,6 +53,52 @@ export const gamePoolAbi = [
     inputs: [{ name: "to", type: "address" }, { name: "amount", type: "uint256" }],
     outputs: []
   },
+  {
+    type: "function",
+    name: "batchPayout",
+    stateMutability: "nonpayable",
+    inputs: [
+      { name: "batchId", type: "bytes32" },
+      { name: "recipients", type: "address[]" },
+      { name: "amounts", type: "uint256[]" }
+    ],
+    outputs: []
+  },
+  {
+    type: "function",
+    name: "withdraw",
+    stateMutability: "nonpayable",
+    inputs: [],
+    outputs: []
+  },
+  {
+    type: "function",
+    name: "owner",
+    stateMutability: "view",
+    inputs: [],
+    outputs: [{ type: "address" }]
+  },
+  {
+    type: "function",
+    name: "deposits",
+    stateMutability: "view",
+    inputs: [{ name: "player", type: "address" }],
+    outputs: [{ type: "uint256" }]
+  },
+  {
+    type: "function",
+    name: "settledBatches",
+    stateMutability: "view",
+    inputs: [{ name: "batchId", type: "bytes32" }],
+    outputs: [{ type: "bool" }]
+  },
+  {
+    type: "function",
+    name: "unclaimed",
+    stateMutability: "view",
+    inputs: [{ name: "player", type: "address" }],
+    outputs: [{ type: "uint256" }]
+  },
   {
     type: "function",
     name: "totalPot",
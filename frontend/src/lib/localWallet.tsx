@@ -31,7 +31,7 @@ type LocalWalletContextValue = {
   connect: () => void;
   disconnect: () => void;
   deposit: (amountEth: string) => Promise<void>;
-  payout: (to: `0x${string}`, amountEth: string) => Promise<void>;
+  signMessage: (message: string) => Promise<`0x${string}` | undefined>;
   getTotalPot: () => Promise<string>;
 };
 
@@ -51,7 +51,6 @@ export function LocalWalletProvider({ children }: { children: ReactNode }) {
   const [isPending, setIsPending] = useState(false);
   const [accountIndex, setAccountIndex] = useState(0);
   const account = hardhatAccounts[accountIndex] ?? hardhatAccounts[0];
-  const ownerAccount = hardhatAccounts[0];
 
   const publicClient = useMemo(
     () =>
@@ -117,30 +116,14 @@ export function LocalWalletProvider({ children }: { children: ReactNode }) {
     [account, isConnected, publicClient, refreshBalance, walletClient]
   );
 
-  const payout = useCallback(
-    async (to: `0x${string}`, amountEth: string) => {
+  const signMessage = useCallback(
+    async (message: string) => {
       if (!isConnected) {
-        return;
-      }
-      if (!amountEth || Number(amountEth) <= 0) {
-        return;
-      }
-      setIsPending(true);
-      try {
-        const hash = await walletClient.writeContract({
-          address: gamePoolAddress,
-          abi: gamePoolAbi,
-          functionName: "payout",
-          args: [to, parseEther(amountEth)],
-          account: ownerAccount
-        });
-        await publicClient.waitForTransactionReceipt({ hash });
-        await refreshBalance();
-      } finally {
-        setIsPending(false);
+        return undefined;
       }
+      return account.signMessage({ message });
     },
-    [isConnected, ownerAccount, publicClient, refreshBalance, walletClient]
+    [account, isConnected]
   );
 
   const getTotalPot = useCallback(async () => {
@@ -165,7 +148,7 @@ export function LocalWalletProvider({ children }: { children: ReactNode }) {
         connect,
         disconnect,
         deposit,
-        payout,
+        signMessage,
         getTotalPot
       }}
     >
@@ -12,6 +12,22 @@ export type RoomPlayer = {
   alive: boolean;
 };
 
+export type PoolSummary = {
+  enabled: boolean;
+  totalDepositedWei: string;
+  totalPaidWei: string;
+  potWei: string;
+  depositors: number;
+  lastBlock: number;
+};
+
+export type ReportJob = {
+  jobId: string;
+  roomId?: string | null;
+  status: "pending" | "done";
+  text: string | null;
+};
+
 export type ServerEvent =
   | { type: "question"; payload: Question }
   | {
@@ -20,10 +36,14 @@ export type ServerEvent =
     }
   | { type: "trigger"; payload: { outcome: "alive" | "dead"; message: string } }
   | { type: "notice"; payload: { message: string } }
+  | { type: "redirect"; payload: { url: string } }
+  | { type: "error"; payload: { code: string; message: string } }
+  | { type: "report"; payload: ReportJob }
   | {
       type: "room";
       payload: {
         roomId: string;
+        seq: number;
         players: RoomPlayer[];
         aliveCount: number;
         deadCount: number;
@@ -31,8 +51,23 @@ export type ServerEvent =
         durationSeconds: number;
         serverNowMs: number;
         startedAtMs: number | null;
+        pool?: PoolSummary;
       };
     };
+  | {
+      type: "room_delta";
+      payload: {
+        roomId: string;
+        seq: number;
+        players: RoomPlayer[];
+        aliveCount: number;
+        deadCount: number;
+        timeLeft: number;
+        durationSeconds: number;
+        serverNowMs: number;
+        startedAtMs: number | null;
+      };
+    }
   | {
       type: "game_over";
       payload: {
@@ -46,9 +81,20 @@ export type ServerEvent =
         durationSeconds: number;
         serverNowMs: number;
         startedAtMs: number | null;
+        pool?: PoolSummary;
       };
     };
 
 export type ClientEvent =
   | { type: "submit"; payload: { answer: string; questionId: string } }
-  | { type: "join"; payload: { playerId: string } };
+  | {
+      type: "join";
+      payload: {
+        playerId: string;
+        address?: string;
+        signature?: string;
+        nonce?: string;
+      };
+    }
+  | { type: "resync" }
+  | { type: "report"; payload: { wrongWords: string[]; score: number | null } };